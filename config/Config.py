@@ -15,6 +15,79 @@ save_path = os.path.join(PROJECT_ROOT, 'resources', 'save_data')
 # 使用的模型路径
 model_path = os.path.join(PROJECT_ROOT, 'resources', 'models', 'best.pt')
 
+# 推理后端: 'pytorch' / 'onnx' / 'openvino'
+# onnx/openvino 首次使用时由 model_path 的 .pt 权重自动导出并缓存在同目录
+inference_backend = 'pytorch'
+
+# 推理精度: 'fp32' / 'int8'（int8 仅支持 onnx/openvino，需先运行 config/quantize.py）
+inference_precision = 'fp32'
+
+# 推理输入尺寸（导出ONNX/OpenVINO模型时使用）
+imgsz = 640
+
+# 批量推理每次前向传播的图片数量（文件夹模式与命令行批处理共用）
+batch_size = 8
+
+# 视频流水线（解码/推理/绘制）各阶段之间的队列长度
+video_queue_size = 4
+
+# 文件夹浏览检测结果缓存：内存上限（MB）、缓存的结果缩略图最长边（像素）、
+# 内存淘汰条目的磁盘目录（None 表示不落盘，例如设为 os.path.join(save_path, 'result_cache')）
+result_cache_mb = 256
+result_cache_thumbnail_size = 1280
+result_cache_dir = None
+
+# 文件夹模式后台预取：当前图片前后各预解码并预检测多少张（0 表示关闭）
+prefetch_radius = 4
+
+# 多进程检测池（多路摄像头/批处理）：进程数、每进程线程数（0 表示按CPU核数平分）、单帧最大尺寸
+pool_workers = 4
+pool_threads_per_worker = 0
+pool_frame_shape = (1080, 1920, 3)
+
+# 摄像头实时模式：始终处理最新帧并丢弃积压帧（延迟优先）
+camera_realtime = True
+
+# 视频文件按源帧率播放；False 时全速处理（离线分析）。保存标注视频时总是全速处理
+video_paced = True
+
+# 视频统计目标跟踪：IoU 不低于该值直接匹配；IoU 不足时中心点距离（相对框对角线）小于该值也可匹配；
+# 连续多少帧未匹配视为目标离开并记录一次统计；至少出现多少帧才计入（过滤闪现的误检）
+tracker_iou_threshold = 0.3
+tracker_centroid_distance = 0.5
+tracker_max_age = 15
+tracker_min_hits = 3
+
+# 统计存储后端：'journal'（追加写入的JSONL日志）或 'sqlite'（WAL模式数据库，历史量大时查询更快）
+statistics_backend = 'journal'
+
+# 统计日志：每写入多少条记录 fsync 一次；失效行（被清空的记录）达到多少时压缩重写
+statistics_fsync_batch = 20
+statistics_compact_threshold = 1000
+
+# 统计记录后台写入：队列容量、每批最多写入条数、记录最长等待写入时间（秒）
+statistics_queue_size = 10000
+statistics_flush_batch = 200
+statistics_flush_interval = 0.5
+# 批次写入失败后的最多重试次数（每隔 statistics_flush_interval 秒重试，超过后放弃并计入 failed）
+statistics_write_retries = 5
+# 读入其他实例新写入记录的间隔（秒），由后台写入线程执行
+statistics_poll_interval = 1.0
+
+# 统计数据保留：原始记录保留天数（更早的汇总为小时/天计数桶后删除）、小时桶保留天数，<=0 表示不清理；
+# 汇总维护的执行间隔（秒）。原始记录汇总后无法再逐条导出（CSV/检测项导出只读取原始记录），
+# 默认不汇总，需要限制数据量时再设置（如 30），并在汇总前完成导出
+statistics_raw_retention_days = 0
+statistics_hourly_retention_days = 180
+statistics_maintenance_interval = 3600
+
+# 统计导出每块读取的记录数
+statistics_export_chunk = 1000
+
+# 检测框标签字体：None 表示自动使用 resources/Font 下的第一个字体（中文类别名需中文字体）
+font_path = None
+font_size = 18
+
 # 类别数量
 NUM_CLASSES = 29
 
@@ -0,0 +1,59 @@
+# coding:utf-8
+"""
+基于YOLOv8的垃圾目标检测算法 - 模型导出与一致性检查脚本
+
+用法:
+    python config/export.py --backend onnx
+    python config/export.py --backend openvino --images resources/TestFiles --limit 50
+
+导出ONNX/OpenVINO模型（缓存在 .pt 同目录），并在样例图片上与PyTorch输出比对。
+"""
+import os
+import sys
+import argparse
+from itertools import islice
+
+# 添加项目根目录到路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+from config import Config
+from core.detection_service import DetectionService, check_backend_parity
+from core.file_handler import FileHandler
+
+# 默认比对图片目录
+VAL_IMAGES_DIR = os.path.join(PROJECT_ROOT, 'resources', 'datasets', 'processed', 'images', 'val')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='导出推理模型并检查与PyTorch输出的一致性')
+    parser.add_argument('--model', type=str, default=Config.model_path, help='.pt 模型路径')
+    parser.add_argument('--backend', type=str, default='onnx', help='目标后端: onnx / openvino')
+    parser.add_argument('--images', type=str, default=VAL_IMAGES_DIR, help='比对图片目录')
+    parser.add_argument('--limit', type=int, default=100, help='比对图片数量')
+    parser.add_argument('--iou', type=float, default=0.5, help='检测框匹配IoU阈值')
+    args = parser.parse_args()
+
+    reference = DetectionService(args.model, backend='pytorch', precision='fp32')
+    candidate = DetectionService(args.model, backend=args.backend)
+
+    images = list(islice(FileHandler.get_images_from_directory(args.images), args.limit))
+    if not images:
+        print(f"[WARNING] 未找到比对图片: {args.images}")
+        sys.exit(0)
+
+    report = check_backend_parity(reference, candidate, images, iou_threshold=args.iou)
+
+    print("\n" + "="*50)
+    print(f"一致性检查: pytorch vs {args.backend}")
+    print("="*50)
+    print(f"图片数量: {report['images']}")
+    print(f"检测框: {report['reference_boxes']} / {report['candidate_boxes']} (匹配 {report['matched_boxes']})")
+    print(f"召回率: {report['recall']:.4f}  精确率: {report['precision']:.4f}")
+    print(f"最大置信度差: {report['max_conf_diff']:.4f}")
+    print(f"平均耗时: {report['reference_time'] / report['images'] * 1000:.1f}ms -> "
+          f"{report['candidate_time'] / report['images'] * 1000:.1f}ms")
+    print(f"\n模型已导出: {candidate.weights_path}")
+    print(f"在 config/Config.py 中设置 inference_backend = '{args.backend}' 即可启用")
@@ -0,0 +1,234 @@
+# coding:utf-8
+"""
+基于YOLOv8的垃圾目标检测算法 - INT8训练后量化脚本
+
+用法:
+    python config/quantize.py --backend openvino
+    python config/quantize.py --backend onnx --samples 300 --latency-images 100
+
+从验证集抽样校准，生成 DetectionService 可加载的INT8模型
+（best_int8.onnx / best_int8_openvino_model），
+并输出FP32与INT8的 mAP50 及单张图片CPU耗时对比报告。
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import shutil
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+# 添加项目根目录到路径
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+
+from config import Config
+from core.detection_service import DetectionService, get_backend
+from core.file_handler import FileHandler
+
+# 资源路径
+PROCESSED_DIR = os.path.join(PROJECT_ROOT, 'resources', 'datasets', 'processed')
+VAL_IMAGES_DIR = os.path.join(PROCESSED_DIR, 'images', 'val')
+DATA_YAML = os.path.join(PROCESSED_DIR, 'data.yaml')
+
+# 随机种子
+RANDOM_SEED = 42
+
+
+def sample_images(images_dir, count):
+    """从验证集中按固定种子抽样"""
+    images = FileHandler.get_images_from_directory(images_dir)
+    random.seed(RANDOM_SEED)
+    if len(images) > count:
+        images = random.sample(images, count)
+    return images
+
+
+def write_calibration_yaml(images, work_dir):
+    """生成只包含校准图片的数据集配置（val 指向图片列表文件）"""
+    os.makedirs(work_dir, exist_ok=True)
+    list_path = os.path.join(work_dir, 'calibration.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(os.path.abspath(p) for p in images) + '\n')
+
+    yaml_path = os.path.join(work_dir, 'calibration.yaml')
+    with open(yaml_path, 'w', encoding='utf-8') as f:
+        f.write(f"path: {os.path.abspath(work_dir)}\n")
+        f.write("train: calibration.txt\n")
+        f.write("val: calibration.txt\n")
+        f.write(f"nc: {Config.NUM_CLASSES}\n")
+        f.write("names:\n")
+        for class_id, name in Config.names.items():
+            f.write(f"  {class_id}: {name}\n")
+    return yaml_path
+
+
+def letterbox(image, size):
+    """与ultralytics预处理一致的等比缩放+灰边填充，输出NCHW float32"""
+    h, w = image.shape[:2]
+    scale = min(size / h, size / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - new_h) // 2, (size - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    blob = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)
+    return np.ascontiguousarray(blob[None], dtype=np.float32) / 255.0
+
+
+def quantize_onnx(model_path, images, output_path):
+    """使用 onnxruntime 静态量化（QDQ格式）生成INT8 ONNX模型"""
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    )
+
+    fp32_path = get_backend('onnx', model_path).resolve_weights()
+    input_name = InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class ImageReader(CalibrationDataReader):
+        """逐张提供校准输入"""
+        def __init__(self):
+            self._paths = iter(images)
+
+        def get_next(self):
+            for path in self._paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: letterbox(image, Config.imgsz)}
+            return None
+
+    quantize_static(
+        fp32_path, output_path, ImageReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    _copy_onnx_metadata(fp32_path, output_path)
+    return output_path
+
+
+def _copy_onnx_metadata(src_path, dst_path):
+    """复制ultralytics写入的模型元数据（类别名、输入尺寸等）"""
+    import onnx
+    src, dst = onnx.load(src_path), onnx.load(dst_path)
+    existing = {prop.key for prop in dst.metadata_props}
+    for prop in src.metadata_props:
+        if prop.key not in existing:
+            dst.metadata_props.add(key=prop.key, value=prop.value)
+    onnx.save(dst, dst_path)
+
+
+def quantize_openvino(model_path, calibration_yaml, output_path):
+    """使用 ultralytics + NNCF 导出INT8 OpenVINO模型（动态批次，与 ExportedBackend.export 一致）"""
+    exported = YOLO(model_path, task='detect').export(
+        format='openvino', int8=True, data=calibration_yaml, imgsz=Config.imgsz,
+        dynamic=True, batch=Config.batch_size
+    )
+    # ultralytics 已按 <stem>_int8_openvino_model 命名，与 DetectionService 约定一致
+    if os.path.abspath(exported) != os.path.abspath(output_path):
+        shutil.rmtree(output_path, ignore_errors=True)
+        shutil.move(exported, output_path)
+    return output_path
+
+
+def check_batch_inference(service, images):
+    """以 Config.batch_size 张图片批量推理一次，确认模型接受批次大于1的输入"""
+    batch = [image for image in (cv2.imread(path) for path in images[:Config.batch_size]) if image is not None]
+    if len(batch) < 2:
+        batch = (batch * 2)[:2]
+    results = service.detect_batch(batch, batch_size=len(batch))
+    if len(results) != len(batch):
+        raise RuntimeError(f"批量推理返回 {len(results)} 个结果，应为 {len(batch)} 个")
+
+
+def evaluate(service, data_yaml, latency_images):
+    """评估 mAP50 与单张图片CPU耗时"""
+    metrics = YOLO(service.weights_path, task='detect').val(
+        data=data_yaml, imgsz=Config.imgsz, batch=1, device='cpu', plots=False, verbose=False
+    )
+    latencies = []
+    for path in latency_images:
+        image = cv2.imread(path)
+        if image is not None:
+            latencies.append(service.detect(image).elapsed_time * 1000)
+    latencies = np.asarray(latencies) if latencies else np.zeros(1)
+    return {
+        'weights': service.weights_path,
+        'map50': round(float(metrics.box.map50), 4),
+        'map50_95': round(float(metrics.box.map), 4),
+        'latency_mean_ms': round(float(latencies.mean()), 2),
+        'latency_p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'latency_p95_ms': round(float(np.percentile(latencies, 95)), 2),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='INT8训练后量化与精度/速度对比')
+    parser.add_argument('--model', type=str, default=Config.model_path, help='.pt 模型路径')
+    parser.add_argument('--backend', type=str, default='openvino', help='量化后端: openvino / onnx')
+    parser.add_argument('--data', type=str, default=DATA_YAML, help='评估mAP使用的数据集配置')
+    parser.add_argument('--images', type=str, default=VAL_IMAGES_DIR, help='校准图片目录')
+    parser.add_argument('--samples', type=int, default=300, help='校准图片数量')
+    parser.add_argument('--latency-images', type=int, default=100, help='测速图片数量')
+    args = parser.parse_args()
+
+    calibration_images = sample_images(args.images, args.samples)
+    if not calibration_images:
+        print(f"[ERROR] 未找到校准图片: {args.images}")
+        sys.exit(1)
+    print(f"[INFO] 校准图片: {len(calibration_images)} 张")
+
+    # 1. 生成INT8模型
+    int8_path = get_backend(args.backend, args.model, 'int8').exported_path()
+    work_dir = os.path.join(os.path.dirname(os.path.abspath(args.model)), 'quantize')
+    if args.backend == 'onnx':
+        quantize_onnx(args.model, calibration_images, int8_path)
+    elif args.backend == 'openvino':
+        calibration_yaml = write_calibration_yaml(calibration_images, work_dir)
+        quantize_openvino(args.model, calibration_yaml, int8_path)
+    else:
+        print(f"[ERROR] 不支持的量化后端: {args.backend}")
+        sys.exit(1)
+    print(f"[INFO] INT8模型已生成: {int8_path}")
+
+    # 2. 对比FP32与INT8
+    latency_images = calibration_images[:args.latency_images]
+    variants = [
+        ('pytorch-fp32', DetectionService(args.model, backend='pytorch', precision='fp32')),
+        (f'{args.backend}-fp32', DetectionService(args.model, backend=args.backend, precision='fp32')),
+        (f'{args.backend}-int8', DetectionService(args.model, backend=args.backend, precision='int8')),
+    ]
+    int8_service = variants[-1][1]
+    try:
+        check_batch_inference(int8_service, calibration_images)
+    except Exception as e:
+        print(f"[ERROR] INT8模型不支持批量推理（批次 {Config.batch_size}）: {e}")
+        sys.exit(1)
+    print(f"[INFO] INT8模型批量推理检查通过（批次 {Config.batch_size}）")
+    report = {name: evaluate(service, args.data, latency_images) for name, service in variants}
+
+    print("\n" + "="*70)
+    print("量化对比报告")
+    print("="*70)
+    print(f"{'模型':<18}{'mAP50':>10}{'mAP50-95':>10}{'平均(ms)':>12}{'P50(ms)':>10}{'P95(ms)':>10}")
+    for name, row in report.items():
+        print(f"{name:<18}{row['map50']:>10.4f}{row['map50_95']:>10.4f}"
+              f"{row['latency_mean_ms']:>12.1f}{row['latency_p50_ms']:>10.1f}{row['latency_p95_ms']:>10.1f}")
+
+    fp32, int8 = report[f'{args.backend}-fp32'], report[f'{args.backend}-int8']
+    speedup = fp32['latency_mean_ms'] / int8['latency_mean_ms'] if int8['latency_mean_ms'] else 0
+    print(f"\nINT8 加速比: {speedup:.2f}x, mAP50 变化: {int8['map50'] - fp32['map50']:+.4f}")
+
+    report_path = os.path.join(work_dir, f'quantization_report_{args.backend}.json')
+    os.makedirs(work_dir, exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[INFO] 报告已保存: {report_path}")
+    print(f"在 config/Config.py 中设置 inference_backend = '{args.backend}', inference_precision = 'int8' 即可启用")
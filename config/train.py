@@ -57,7 +57,7 @@ if __name__ == '__main__':
     print(f"mAP50-95: {metrics.box.map:.4f}")
     
     # 导出模型（可选）
-    # model.export(format='onnx')
+    # 复制 best.pt 后运行 python config/export.py --backend onnx 导出并检查一致性
     
     print("\n训练完成！")
     print(f"最佳模型保存在: runs/detect/kitchen_garbage_5cls/weights/best.pt")
@@ -8,6 +8,17 @@
 - ui_manager: UI管理
 - file_handler: 文件处理
 - statistics_manager: 统计管理
+- statistics_store: 统计存储后端
+- statistics_writer: 统计记录后台写入
+- statistics_export: 统计数据导出
+- batch: 无界面批量检测
+- video_pipeline: 视频流水线
+- detection_pool: 多进程检测池
+- frame_ring: 共享内存帧环形缓冲
+- renderer: 检测框绘制
+- tracker: 视频目标跟踪
+- result_cache: 图片检测结果缓存
+- prefetcher: 文件夹图片预取
 """
 
 __all__ = [
@@ -15,4 +26,15 @@ __all__ = [
     'ui_manager',
     'file_handler',
     'statistics_manager',
+    'statistics_store',
+    'statistics_writer',
+    'statistics_export',
+    'batch',
+    'video_pipeline',
+    'detection_pool',
+    'frame_ring',
+    'renderer',
+    'tracker',
+    'result_cache',
+    'prefetcher',
 ]
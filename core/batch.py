@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+基于YOLOv8的垃圾目标检测算法 - 无界面批量检测
+
+用法:
+    python -m core.batch resources/TestFiles --output resources/save_data/batch
+    python -m core.batch "dumps/**/*.jpg" --workers 8 --save-images
+
+逐张输出JSONL检测结果（可选保存标注图片），全程不导入PyQt5。
+图片路径按需惰性枚举，读取与写出在线程池中进行且在途数量有上限，
+目录中有十万张以上图片时内存占用也保持平稳。
+"""
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+import cv2
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from core.detection_service import DetectionService
+from core.file_handler import FileHandler
+from config import Config
+
+
+def iter_image_paths(source: str, recursive: bool = False) -> Iterator[str]:
+    """惰性枚举目录或glob模式下的图片路径"""
+    if os.path.isdir(source):
+        yield from _scan_directory(source, recursive)
+    else:
+        for path in glob.iglob(source, recursive=True):
+            if os.path.isfile(path) and FileHandler.is_image_file(path):
+                yield path
+
+
+def source_root(source: str) -> str:
+    """标注图片相对路径的起点：目录本身，或glob模式中第一个通配符之前的目录"""
+    if os.path.isdir(source):
+        return source
+    parts = []
+    for part in source.replace('\\', '/').split('/'):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    else:
+        parts = parts[:-1]  # 不含通配符的单个文件
+    return '/'.join(parts) or '.'
+
+
+def _scan_directory(directory: str, recursive: bool) -> Iterator[str]:
+    """使用 os.scandir 逐项遍历目录，不一次性构建文件列表"""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and FileHandler.is_image_file(entry.name):
+                yield entry.path
+            elif recursive and entry.is_dir(follow_symlinks=False):
+                yield from _scan_directory(entry.path, recursive)
+
+
+def result_to_dict(image_path: str, result) -> dict:
+    """将检测结果转换为可写入JSONL的字典"""
+    detections = []
+    for i, cls_id in enumerate(result.classes):
+        guide = Config.classification_guide.get(cls_id, {})
+        detections.append({
+            'class_id': cls_id,
+            'name': Config.CH_names[cls_id] if cls_id < len(Config.CH_names) else f'类别{cls_id}',
+            'category': guide.get('category', '未知'),
+            'confidence': round(result.confidences[i], 4),
+            'box': result.locations[i],
+        })
+    return {
+        'path': image_path,
+        'count': result.count,
+        'elapsed_ms': round(result.elapsed_time * 1000, 2),
+        'detections': detections,
+    }
+
+
+class BatchRunner:
+    """批量检测执行器：线程池读图 → 批量推理 → 线程池写出标注图片
+
+    detection_service 可以是 DetectionService 或 DetectionPool。
+    """
+
+    def __init__(self, detection_service, output_dir: str,
+                 workers: int = 4, batch_size: int = None,
+                 save_images: bool = False, statistics_manager=None):
+        self.detection_service = detection_service
+        self.output_dir = output_dir
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size or Config.batch_size)
+        self.save_images = save_images
+        self.statistics_manager = statistics_manager
+        self.image_dir = os.path.join(output_dir, 'annotated')
+        self.results_path = os.path.join(output_dir, 'results.jsonl')
+        # 在途读图任务上限，决定内存中最多同时存在的解码图像数量
+        self.max_pending = self.batch_size * 2 + self.workers
+        self.stats = {'images': 0, 'failed': 0, 'detections': 0}
+        self._saved_paths = set()  # 按文件名分配的标注图片路径，用于避免重名覆盖
+
+    def run(self, paths: Iterator[str], root: Optional[str] = None) -> dict:
+        """执行批量检测，返回汇总信息"""
+        FileHandler.ensure_directory(self.output_dir)
+        if self.save_images:
+            FileHandler.ensure_directory(self.image_dir)
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool, \
+                open(self.results_path, 'w', encoding='utf-8') as out:
+            pending = deque()
+            writes = deque()
+            batch = []
+            for path in paths:
+                pending.append((path, pool.submit(cv2.imread, path)))
+                if len(pending) >= self.max_pending:
+                    self._collect(pending, batch, out, pool, writes, root)
+            while pending:
+                self._collect(pending, batch, out, pool, writes, root)
+            self._flush_batch(batch, out, pool, writes, root)
+            for future in writes:
+                future.result()
+
+        summary = dict(self.stats)
+        summary['seconds'] = round(time.time() - start_time, 2)
+        summary['results'] = self.results_path
+        return summary
+
+    def _collect(self, pending, batch, out, pool, writes, root):
+        """取出最早提交的读图任务，凑满一批后推理"""
+        path, future = pending.popleft()
+        image = future.result()
+        if image is None:
+            self.stats['failed'] += 1
+            out.write(json.dumps({'path': path, 'error': '无法读取图片'}, ensure_ascii=False) + '\n')
+            return
+        batch.append((path, image))
+        if len(batch) >= self.batch_size:
+            self._flush_batch(batch, out, pool, writes, root)
+
+    def _flush_batch(self, batch, out, pool, writes, root):
+        """对当前批次执行推理并写出结果"""
+        if not batch:
+            return
+        results = self.detection_service.detect_batch(
+            [image for _, image in batch], batch_size=self.batch_size
+        )
+        for (path, _), result in zip(batch, results):
+            out.write(json.dumps(result_to_dict(path, result), ensure_ascii=False) + '\n')
+            self.stats['images'] += 1
+            self.stats['detections'] += result.count
+            if self.statistics_manager is not None:
+                self.statistics_manager.add_record(result)
+            if self.save_images:
+                writes.append(pool.submit(cv2.imwrite, self._annotated_path(path, root),
+                                          result.get_plotted_image()))
+        batch.clear()
+        out.flush()
+        # 只保留未完成的写出任务，防止队列随图片数量增长
+        while writes and writes[0].done():
+            writes.popleft().result()
+        while len(writes) > self.max_pending:
+            writes.popleft().result()
+
+    def _annotated_path(self, image_path: str, root: Optional[str]) -> str:
+        """
+        标注图片保存路径，保留相对 root 的路径结构
+        未指定 root（或图片不在 root 下）时使用文件名，重名的依次加 _1、_2 … 后缀
+        """
+        try:
+            rel_path = os.path.relpath(image_path, root) if root else None
+        except ValueError:
+            rel_path = None  # Windows 下不在同一盘符
+        if rel_path is None or rel_path == os.pardir or rel_path.startswith(os.pardir + os.sep):
+            stem, ext = os.path.splitext(os.path.basename(image_path))
+            rel_path, n = stem + ext, 0
+            while rel_path in self._saved_paths:
+                n += 1
+                rel_path = f'{stem}_{n}{ext}'
+            self._saved_paths.add(rel_path)
+        save_path = os.path.join(self.image_dir, rel_path)
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        return save_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='无界面批量垃圾检测')
+    parser.add_argument('source', type=str, help='图片目录或glob模式（如 "dumps/**/*.jpg"）')
+    parser.add_argument('--output', type=str,
+                        default=os.path.join(Config.save_path, 'batch'), help='输出目录')
+    parser.add_argument('--model', type=str, default=None, help='模型路径，默认 Config.model_path')
+    parser.add_argument('--workers', type=int, default=4, help='读图/写图线程数')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='推理进程数，>0 时使用多进程检测池（每个进程一个模型副本）')
+    parser.add_argument('--batch-size', type=int, default=Config.batch_size, help='每次前向传播的图片数')
+    parser.add_argument('--recursive', action='store_true', help='递归遍历子目录')
+    parser.add_argument('--save-images', action='store_true', help='保存绘制检测框后的图片')
+    parser.add_argument('--record-stats', action='store_true', help='同时写入检测统计记录')
+    args = parser.parse_args(argv)
+
+    statistics_manager = None
+    if args.record_stats:
+        from core.statistics_manager import StatisticsManager
+        statistics_manager = StatisticsManager()
+
+    if args.processes > 0:
+        from core.detection_pool import DetectionPool
+        detector = DetectionPool(num_workers=args.processes, model_path=args.model)
+    else:
+        detector = DetectionService(args.model)
+
+    runner = BatchRunner(
+        detector,
+        args.output,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        save_images=args.save_images,
+        statistics_manager=statistics_manager,
+    )
+    root = source_root(args.source)
+    try:
+        summary = runner.run(iter_image_paths(args.source, args.recursive), root)
+    finally:
+        if args.processes > 0:
+            detector.close()
+        if statistics_manager is not None:
+            statistics_manager.close()
+
+    print(f"[INFO] 处理图片: {summary['images']} 张, 失败: {summary['failed']} 张, "
+          f"检测目标: {summary['detections']} 个, 耗时: {summary['seconds']}s")
+    print(f"[INFO] 结果已写入: {summary['results']}")
+
+
+if __name__ == '__main__':
+    main()
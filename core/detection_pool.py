@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+基于YOLOv8的垃圾目标检测算法 - 多进程检测池
+
+每个工作进程持有一个独立的模型副本，绑定到各自的CPU核心并限制
+torch线程数，多路摄像头共享一台主机时互不争抢核心、不受GIL限制。
+帧数据通过每个进程各自的共享内存帧环形缓冲（SharedFrameRing）传递，
+工作进程按序列号读取就绪帧，返回的是紧凑的检测框数组。
+分发线程定期检查工作进程是否存活：进程意外退出（内存不足、推理库崩溃）时，
+其未完成的 Future 以异常结束，之后的帧不再分配给该进程。
+
+用法:
+    pool = DetectionPool(num_workers=4)
+    result = pool.detect(frame)            # 阻塞调用
+    future = pool.submit(frame)            # 异步调用，返回 Future
+
+    # 零拷贝：直接把帧解码进共享内存槽位
+    worker_id, slot, view = pool.acquire_frame(h, w)
+    cap.read(view)
+    future = pool.submit_frame(worker_id, slot)
+    pool.close()
+"""
+import os
+import time
+import queue
+import threading
+import multiprocessing as mp
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import List, Iterable, Tuple
+
+import numpy as np
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from core.frame_ring import SharedFrameRing
+
+
+def plan_cpu_sets(num_workers: int, threads_per_worker: int = 0) -> List[List[int]]:
+    """为每个工作进程划分CPU核心集合，核心数足够时互不重叠"""
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    per_worker = threads_per_worker or max(1, len(cpus) // num_workers)
+    return [
+        [cpus[(i * per_worker + j) % len(cpus)] for j in range(per_worker)]
+        for i in range(num_workers)
+    ]
+
+
+@contextmanager
+def _thread_env(threads: int):
+    """临时设置数学库线程数环境变量"""
+    keys = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+    saved = {key: os.environ.get(key) for key in keys}
+    os.environ.update({key: str(threads) for key in keys})
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def _worker_main(worker_id, cpu_set, model_path, backend, precision,
+                 ring_handle, response_queue):
+    """工作进程入口：绑定核心、限制线程数后加载模型，循环读取帧缓冲中的就绪帧"""
+    # OMP_NUM_THREADS 等环境变量已由父进程在启动前设置
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpu_set)
+
+    ring = None
+    try:
+        import torch
+        torch.set_num_threads(len(cpu_set))
+        from core.detection_service import DetectionService
+        service = DetectionService(model_path, backend=backend, precision=precision)
+        ring = SharedFrameRing.attach(ring_handle)
+        response_queue.put(('ready', worker_id, None, None))
+    except Exception as e:
+        response_queue.put(('ready', worker_id, None, str(e)))
+        if ring is not None:
+            ring.close()
+        return
+
+    try:
+        while True:
+            frame = ring.acquire_read()
+            if frame is None:
+                break
+            slot, seq, _, view = frame
+            try:
+                result = service.detect(view)
+                xyxy, cls_ids, conf = result.to_arrays()
+                response_queue.put(('result', worker_id, seq, (xyxy, cls_ids, conf, result.elapsed_time)))
+            except Exception as e:
+                response_queue.put(('error', worker_id, seq, str(e)))
+            finally:
+                ring.release(slot)
+    finally:
+        ring.close()
+
+
+class _Worker:
+    """父进程侧的工作进程句柄"""
+
+    def __init__(self, worker_id, slots, frame_shape):
+        self.worker_id = worker_id
+        self.ring = SharedFrameRing(slots=slots, frame_shape=frame_shape)
+        self.process = None
+        self.alive = True
+        self.exit_seen = False  # 上次检查时已发现进程退出
+
+
+class DetectionPool:
+    """多进程检测池，接口与 DetectionService 的 detect/detect_batch 一致"""
+
+    # 检查工作进程存活的间隔（秒）
+    LIVENESS_INTERVAL = 1.0
+
+    def __init__(self, num_workers: int = None, threads_per_worker: int = None,
+                 model_path: str = None, backend: str = None, precision: str = None,
+                 frame_shape: Tuple[int, int, int] = None, slots_per_worker: int = 2,
+                 start_timeout: float = 300):
+        """
+        :param num_workers: 工作进程数，默认 Config.pool_workers
+        :param threads_per_worker: 每个进程的torch线程数（即绑定核心数），0 表示按核心数平分
+        :param frame_shape: 单帧最大尺寸 (h, w, c)，决定共享内存槽位大小
+        :param slots_per_worker: 每个进程的槽位数，允许一帧推理时下一帧已在写入
+        """
+        self.num_workers = num_workers or Config.pool_workers
+        threads_per_worker = Config.pool_threads_per_worker if threads_per_worker is None else threads_per_worker
+        self.frame_shape = tuple(frame_shape or Config.pool_frame_shape)
+        self.cpu_sets = plan_cpu_sets(self.num_workers, threads_per_worker)
+
+        ctx = mp.get_context('spawn')
+        self._response_queue = ctx.Queue()
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._closed = False
+        self._workers = []
+
+        for worker_id, cpu_set in enumerate(self.cpu_sets):
+            worker = _Worker(worker_id, slots_per_worker, self.frame_shape)
+            worker.process = ctx.Process(
+                target=_worker_main,
+                args=(worker_id, cpu_set, model_path or Config.model_path,
+                      backend, precision,  # 未指定时由 DetectionService 按配置确定
+                      worker.ring.handle(), self._response_queue),
+                name=f'detection-worker-{worker_id}',
+                daemon=True,
+            )
+            # spawn 子进程继承启动时的环境变量，须在子进程导入 torch 之前限定线程数
+            with _thread_env(len(cpu_set)):
+                worker.process.start()
+            self._workers.append(worker)
+
+        # 等待所有进程加载模型，进程意外退出或超时均视为启动失败
+        errors = []
+        pending = {worker.worker_id for worker in self._workers}
+        deadline = time.time() + start_timeout
+        while pending and not errors:
+            try:
+                _, worker_id, _, error = self._response_queue.get(timeout=1)
+            except queue.Empty:
+                dead = [w_id for w_id in pending if not self._workers[w_id].process.is_alive()]
+                errors.extend(f"worker {w_id}: 进程意外退出" for w_id in dead)
+                if time.time() > deadline:
+                    errors.append("等待模型加载超时")
+                continue
+            pending.discard(worker_id)
+            if error:
+                errors.append(f"worker {worker_id}: {error}")
+        if errors:
+            self.close()
+            raise RuntimeError(f"检测进程启动失败: {'; '.join(errors)}")
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name='detection-pool-dispatch', daemon=True)
+        self._dispatcher.start()
+        print(f"[INFO] 检测池已启动: {self.num_workers} 个进程, CPU分配: {self.cpu_sets}")
+
+    def acquire_frame(self, h: int, w: int, c: int = 3) -> Tuple[int, int, np.ndarray]:
+        """
+        在负载最低的进程的帧缓冲中申请槽位，用于直接把帧解码进共享内存（零拷贝）
+        :return: (worker_id, slot, view)，写入 view 后调用 submit_frame
+        """
+        if self._closed:
+            raise RuntimeError("检测池已关闭")
+        workers = [candidate for candidate in self._workers if candidate.alive]
+        if not workers:
+            raise RuntimeError("检测进程均已退出")
+        worker = max(workers, key=lambda candidate: candidate.ring.free_count())
+        slot, view = worker.ring.acquire_write(h, w, c)
+        return worker.worker_id, slot, view
+
+    def submit_frame(self, worker_id: int, slot: int, image: np.ndarray = None) -> Future:
+        """
+        提交已写入槽位的帧
+        :param image: 结果中保留的原图引用（用于绘制），槽位在推理后即被复用
+        """
+        future = Future()
+        worker = self._workers[worker_id]
+        # 持锁提交并登记，保证结果返回时 Future 已存在；进程已退出时直接以异常结束
+        with self._lock:
+            if not worker.alive:
+                future.set_exception(RuntimeError(f"检测进程 {worker_id} 已退出"))
+                return future
+            seq = worker.ring.commit(slot)
+            self._futures[(worker_id, seq)] = (future, image)
+        return future
+
+    def submit(self, frame: np.ndarray) -> Future:
+        """提交一帧（复制进共享内存），返回结果为 DetectionResult 的 Future；槽位占满时等待"""
+        if frame.ndim != 3:
+            raise ValueError(f"不支持的帧尺寸: {frame.shape}")
+        worker_id, slot, view = self.acquire_frame(*frame.shape)
+        view[...] = frame
+        return self.submit_frame(worker_id, slot, image=frame)
+
+    def detect(self, frame: np.ndarray) -> 'DetectionResult':
+        """同步检测一帧"""
+        return self.submit(frame).result()
+
+    def detect_batch(self, sources: Iterable, batch_size: int = None) -> List['DetectionResult']:
+        """并行检测多帧，按输入顺序返回结果（batch_size 仅为接口兼容）"""
+        futures = [self.submit(frame) for frame in sources]
+        return [future.result() for future in futures]
+
+    def _dispatch(self):
+        """接收工作进程返回的结果并完成对应的 Future，定期检查工作进程是否存活"""
+        from core.detection_service import DetectionResult
+        next_check = time.monotonic() + self.LIVENESS_INTERVAL
+        while True:
+            try:
+                message = self._response_queue.get(timeout=self.LIVENESS_INTERVAL)
+            except queue.Empty:
+                message = ()
+            if message is None:
+                break
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + self.LIVENESS_INTERVAL
+            if not message:
+                continue
+            kind, worker_id, seq, payload = message
+            with self._lock:
+                future, image = self._futures.pop((worker_id, seq), (None, None))
+            if future is None:
+                continue  # 所属进程已被判定退出，Future 已以异常结束
+            if kind == 'result':
+                xyxy, cls_ids, conf, elapsed_time = payload
+                future.set_result(DetectionResult.from_arrays(xyxy, cls_ids, conf, elapsed_time, image=image))
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _check_workers(self):
+        """
+        连续两次检查都已退出的进程判定为意外退出：其未完成的 Future 以异常结束并不再分配新帧
+        （间隔一次检查，让进程退出前已放入队列的结果先被取走）
+        """
+        if self._closed:
+            return
+        for worker in self._workers:
+            if not worker.alive or worker.process.is_alive():
+                continue
+            if not worker.exit_seen:
+                worker.exit_seen = True
+                continue
+            error = RuntimeError(f"检测进程 {worker.worker_id} 意外退出（exitcode={worker.process.exitcode}）")
+            with self._lock:
+                worker.alive = False
+                keys = [key for key in self._futures if key[0] == worker.worker_id]
+                pending = [self._futures.pop(key)[0] for key in keys]
+            # 释放槽位，唤醒在该进程帧缓冲上等待的写入方（其提交会直接以异常结束）
+            worker.ring.reset()
+            for future in pending:
+                future.set_exception(error)
+            print(f"[ERROR] {error}，{len(pending)} 个未完成的检测已取消")
+
+    def close(self):
+        """停止所有工作进程并释放共享内存，未完成的 Future 以异常结束"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for worker in self._workers:
+            worker.ring.close_writer()
+        for worker in self._workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        self._response_queue.put(None)
+        with self._lock:
+            pending = [future for future, _ in self._futures.values()]
+            self._futures.clear()
+        for future in pending:
+            future.set_exception(RuntimeError("检测池已关闭"))
+        for worker in self._workers:
+            worker.ring.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -4,48 +4,138 @@
 基于YOLOv8的垃圾目标检测算法 - 检测服务模块
 """
 import time
+import threading
+import cv2
 import numpy as np
 from ultralytics import YOLO
-from typing import List
+from typing import List, Iterable, Dict
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from core.renderer import get_renderer
+
+
+# 垃圾分类名称及类别ID → 分类索引查找表，用于向量化统计
+CATEGORIES = ['厨余垃圾', '可回收物', '有害垃圾', '其他垃圾']
+CATEGORY_INDEX = np.array([
+    CATEGORIES.index(Config.classification_guide.get(cls_id, {}).get('category', '其他垃圾'))
+    for cls_id in range(Config.NUM_CLASSES)
+], dtype=np.intp)
+
+_EMPTY_BOXES = np.zeros((0, 4), dtype=np.float32)
+_EMPTY_CLASSES = np.zeros(0, dtype=np.int32)
+_EMPTY_CONFS = np.zeros(0, dtype=np.float32)
 
 
 class DetectionResult:
-    """检测结果数据类"""
+    """
+    检测结果数据类
+    
+    检测框以连续numpy数组保存（xyxy[N,4] float32、cls[N] int32、conf[N] float32），
+    locations/classes/confidences/confidence_strings 等列表视图在首次访问时生成并缓存，
+    视频中未被显示或记录的帧不会产生这些Python对象。
+    """
+    __slots__ = ('raw_results', 'elapsed_time', 'image', 'xyxy', 'cls', 'conf',
+                 '_locations', '_classes', '_confidences', '_confidence_strings')
+    
     def __init__(self, results, elapsed_time: float):
         self.raw_results = results
         self.elapsed_time = elapsed_time
-        self.locations = []
-        self.classes = []
-        self.confidences = []
-        self.confidence_strings = []
-        self._parse_results()
+        self.image = None
+        self.xyxy = _EMPTY_BOXES
+        self.cls = _EMPTY_CLASSES
+        self.conf = _EMPTY_CONFS
+        self._locations = None
+        self._classes = None
+        self._confidences = None
+        self._confidence_strings = None
+        if results is not None:
+            self._parse_results()
+    
+    @classmethod
+    def from_arrays(cls, xyxy: np.ndarray, cls_ids: np.ndarray, conf: np.ndarray,
+                    elapsed_time: float, image: np.ndarray = None) -> 'DetectionResult':
+        """由检测框数组构建结果（用于跨进程传输，不含 ultralytics Results）"""
+        result = cls(None, elapsed_time)
+        result.image = image
+        result.xyxy = np.ascontiguousarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        result.cls = np.ascontiguousarray(cls_ids, dtype=np.int32)
+        result.conf = np.ascontiguousarray(conf, dtype=np.float32)
+        return result
+    
+    def to_arrays(self):
+        """导出紧凑的检测框数组 (xyxy[N,4] float32, cls[N] int32, conf[N] float32)"""
+        return self.xyxy, self.cls, self.conf
     
     def _parse_results(self):
-        """解析YOLO检测结果"""
-        if self.raw_results.boxes is not None and len(self.raw_results.boxes) > 0:
-            location_list = self.raw_results.boxes.xyxy.tolist()
-            self.locations = [list(map(int, bbox)) for bbox in location_list]
-            cls_list = self.raw_results.boxes.cls.tolist()
-            self.classes = [int(cls) for cls in cls_list]
-            conf_list = self.raw_results.boxes.conf.tolist()
-            self.confidences = conf_list
-            self.confidence_strings = [f'{conf * 100:.2f} %' for conf in conf_list]
+        """解析YOLO检测结果为numpy数组"""
+        boxes = self.raw_results.boxes
+        if boxes is not None and len(boxes) > 0:
+            self.xyxy = np.ascontiguousarray(boxes.xyxy.cpu().numpy(), dtype=np.float32)
+            self.cls = boxes.cls.cpu().numpy().astype(np.int32)
+            self.conf = np.ascontiguousarray(boxes.conf.cpu().numpy(), dtype=np.float32)
+    
+    @property
+    def locations(self) -> List[List[int]]:
+        """检测框整数坐标列表 [[x1, y1, x2, y2], ...]"""
+        if self._locations is None:
+            self._locations = self.xyxy.astype(np.int32).tolist()
+        return self._locations
+    
+    @property
+    def classes(self) -> List[int]:
+        if self._classes is None:
+            self._classes = self.cls.tolist()
+        return self._classes
+    
+    @property
+    def confidences(self) -> List[float]:
+        if self._confidences is None:
+            self._confidences = self.conf.tolist()
+        return self._confidences
+    
+    @property
+    def confidence_strings(self) -> List[str]:
+        if self._confidence_strings is None:
+            self._confidence_strings = [f'{conf * 100:.2f} %' for conf in self.confidences]
+        return self._confidence_strings
     
     @property
     def count(self) -> int:
-        return len(self.classes)
+        return len(self.cls)
+    
+    def class_counts(self, minlength: int = None) -> np.ndarray:
+        """各类别检测数量，下标为类别ID"""
+        return np.bincount(self.cls, minlength=minlength or Config.NUM_CLASSES)
+    
+    def category_counts(self) -> Dict[str, int]:
+        """各垃圾分类的检测数量，未知类别计入其他垃圾"""
+        known = self.cls < len(CATEGORY_INDEX)
+        indices = np.full(self.count, CATEGORIES.index('其他垃圾'), dtype=np.intp)
+        indices[known] = CATEGORY_INDEX[self.cls[known]]
+        counts = np.bincount(indices, minlength=len(CATEGORIES))
+        return {category: int(n) for category, n in zip(CATEGORIES, counts) if n}
     
     @property
     def has_detections(self) -> bool:
         return self.count > 0
     
-    def get_plotted_image(self) -> np.ndarray:
-        """获取绘制了检测框的图像"""
-        return self.raw_results.plot()
+    @property
+    def orig_image(self) -> np.ndarray:
+        """检测所用的原图"""
+        if self.image is None and self.raw_results is not None:
+            return self.raw_results.orig_img
+        return self.image
+    
+    def get_plotted_image(self, inplace: bool = False, out: np.ndarray = None) -> np.ndarray:
+        """
+        获取绘制了检测框的图像
+        :param inplace: 直接在原图上绘制（视频流水线中原帧不再使用时避免复制）
+        :param out: 复用的目标缓冲，与原图同尺寸
+        """
+        image = self.orig_image
+        return get_renderer().render(image, self, out=image if inplace else out)
     
     def get_classification_guide(self) -> List[dict]:
         """获取分类指导信息"""
@@ -62,32 +152,258 @@ class DetectionResult:
         return guides
 
 
+class InferenceBackend:
+    """推理后端基类：PyTorch直接加载 .pt 权重"""
+    name = 'pytorch'
+    precisions = ('fp32',)
+    
+    def __init__(self, model_path: str, precision: str = 'fp32'):
+        if precision not in self.precisions:
+            raise ValueError(f"{self.name}后端不支持精度: {precision}，可选: {', '.join(self.precisions)}")
+        self.model_path = model_path
+        self.precision = precision
+    
+    def resolve_weights(self) -> str:
+        """返回实际加载的权重路径，各后端均由 ultralytics.YOLO 加载并输出相同的 Results"""
+        return self.model_path
+
+
+class ExportedBackend(InferenceBackend):
+    """导出型后端：首次使用时从 .pt 导出并缓存，.pt 更新后重新导出"""
+    precisions = ('fp32', 'int8')
+    export_format = None
+    export_suffix = None
+    
+    def exported_path(self) -> str:
+        stem, _ = os.path.splitext(self.model_path)
+        if self.precision == 'int8':
+            stem += '_int8'
+        return stem + self.export_suffix
+    
+    def resolve_weights(self) -> str:
+        # 已是导出格式的模型直接使用
+        if not self.model_path.endswith('.pt'):
+            return self.model_path
+        
+        exported_path = self.exported_path()
+        if os.path.exists(exported_path) and \
+                os.path.getmtime(exported_path) >= os.path.getmtime(self.model_path):
+            return exported_path
+        
+        # INT8模型需要校准数据，不能在加载时自动生成
+        if self.precision == 'int8':
+            raise FileNotFoundError(
+                f"未找到INT8模型或已过期: {exported_path}，请先运行 python config/quantize.py --backend {self.name}"
+            )
+        
+        print(f"[INFO] 导出{self.name}模型: {self.model_path}")
+        return self.export()
+    
+    def export(self) -> str:
+        """导出模型，返回导出文件路径"""
+        return YOLO(self.model_path, task='detect').export(
+            format=self.export_format, imgsz=Config.imgsz, dynamic=True
+        )
+
+
+class OnnxBackend(ExportedBackend):
+    """ONNX Runtime CPU推理"""
+    name = 'onnx'
+    export_format = 'onnx'
+    export_suffix = '.onnx'
+
+
+class OpenVINOBackend(ExportedBackend):
+    """OpenVINO IR CPU推理"""
+    name = 'openvino'
+    export_format = 'openvino'
+    export_suffix = '_openvino_model'
+
+
+# 可用推理后端，键对应 Config.inference_backend
+BACKENDS = {
+    InferenceBackend.name: InferenceBackend,
+    OnnxBackend.name: OnnxBackend,
+    OpenVINOBackend.name: OpenVINOBackend,
+}
+
+
+def get_backend(name: str, model_path: str, precision: str = 'fp32') -> InferenceBackend:
+    """按名称创建推理后端"""
+    if name not in BACKENDS:
+        raise ValueError(f"未知推理后端: {name}，可选: {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_path, precision)
+
+
 class DetectionService:
     """目标检测服务类"""
     
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, backend: str = None, precision: str = None):
+        """
+        :param backend: 推理后端，默认 Config.inference_backend
+        :param precision: 推理精度；未指定时，后端取自配置则使用 Config.inference_precision，
+                          显式指定后端（如导出/量化脚本的PyTorch参照模型）则为 fp32
+        """
         self.model_path = model_path or Config.model_path
+        if precision is None:
+            precision = Config.inference_precision if backend is None else 'fp32'
+        self.backend = get_backend(backend or Config.inference_backend, self.model_path, precision)
+        self.weights_path = None
         self.model = None
+        # 界面线程、文件夹预取线程与视频流水线可能同时调用，模型推理逐个进行
+        self._lock = threading.Lock()
         self._load_model()
     
     def _load_model(self):
         """加载YOLO模型"""
         try:
-            self.model = YOLO(self.model_path, task='detect')
+            self.weights_path = self.backend.resolve_weights()
+            self.model = YOLO(self.weights_path, task='detect')
             # 预热模型
             self.model(np.zeros((48, 48, 3), dtype=np.uint8))
-            print(f"[INFO] 模型加载成功: {self.model_path}")
+            print(f"[INFO] 模型加载成功: {self.weights_path} ({self.backend.name}/{self.backend.precision})")
         except Exception as e:
             print(f"[ERROR] 模型加载失败: {e}")
             raise
     
+    @property
+    def model_identity(self) -> str:
+        """模型标识：权重文件（路径、大小、修改时间）、后端/精度与推理参数，任一变化时不同"""
+        try:
+            stat = os.stat(self.weights_path)
+            weights = f'{self.weights_path}:{stat.st_size}:{stat.st_mtime_ns}'
+        except (OSError, TypeError):
+            weights = str(self.weights_path)
+        overrides = getattr(self.model, 'overrides', {}) or {}
+        params = ','.join(f'{k}={overrides[k]}' for k in sorted(overrides))
+        return f'{weights}|{self.backend.name}/{self.backend.precision}|{params}'
+    
     def detect(self, source) -> DetectionResult:
         """执行目标检测"""
-        start_time = time.time()
-        results = self.model(source)[0]
-        elapsed_time = time.time() - start_time
+        with self._lock:
+            start_time = time.time()
+            results = self.model(source)[0]
+            elapsed_time = time.time() - start_time
         return DetectionResult(results, elapsed_time)
     
+    def detect_batch(self, sources: Iterable, batch_size: int = None) -> List[DetectionResult]:
+        """
+        批量检测，每 batch_size 张图片合并为一次前向传播
+        :param sources: 图片路径或BGR图像数组
+        :param batch_size: 每批图片数量，默认 Config.batch_size
+        :return: 与输入顺序一致的 DetectionResult 列表
+        """
+        batch_size = max(1, batch_size or Config.batch_size)
+        results = []
+        batch = []
+        for source in sources:
+            batch.append(self._load_image(source))
+            if len(batch) >= batch_size:
+                results.extend(self._detect_stacked(batch))
+                batch = []
+        if batch:
+            results.extend(self._detect_stacked(batch))
+        return results
+    
+    def _detect_stacked(self, images: List[np.ndarray]) -> List[DetectionResult]:
+        """对一批图像执行一次前向传播，耗时按图片数均摊"""
+        with self._lock:
+            start_time = time.time()
+            batch_results = self.model(images)
+            elapsed_time = (time.time() - start_time) / len(images)
+        return [DetectionResult(results, elapsed_time) for results in batch_results]
+    
+    @staticmethod
+    def _load_image(source) -> np.ndarray:
+        """读取图片路径，数组直接返回"""
+        if isinstance(source, np.ndarray):
+            return source
+        image = cv2.imread(str(source))
+        if image is None:
+            raise IOError(f"无法读取图片: {source}")
+        return image
+    
     def detect_video_frame(self, frame) -> DetectionResult:
         """检测视频帧"""
         return self.detect(frame)
+
+
+def _box_iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """计算两组 xyxy 框的IoU矩阵"""
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def compare_results(reference: DetectionResult, candidate: DetectionResult,
+                    iou_threshold: float = 0.5) -> Dict:
+    """
+    比较两个检测结果，按IoU贪心匹配同类别检测框
+    :return: {'reference': n, 'candidate': m, 'matched': k, 'max_conf_diff': d, 'mean_iou': v}
+    """
+    ref_boxes = reference.xyxy
+    cand_boxes = candidate.xyxy
+    report = {
+        'reference': reference.count,
+        'candidate': candidate.count,
+        'matched': 0,
+        'max_conf_diff': 0.0,
+        'mean_iou': 1.0 if reference.count == candidate.count == 0 else 0.0,
+    }
+    if reference.count == 0 or candidate.count == 0:
+        return report
+    
+    iou = _box_iou(ref_boxes, cand_boxes)
+    same_class = reference.cls[:, None] == candidate.cls[None, :]
+    iou[~same_class] = 0
+    
+    ious = []
+    for _ in range(min(reference.count, candidate.count)):
+        i, j = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[i, j] < iou_threshold:
+            break
+        ious.append(float(iou[i, j]))
+        conf_diff = abs(float(reference.conf[i]) - float(candidate.conf[j]))
+        report['max_conf_diff'] = max(report['max_conf_diff'], conf_diff)
+        iou[i, :] = 0
+        iou[:, j] = 0
+    
+    report['matched'] = len(ious)
+    report['mean_iou'] = float(np.mean(ious)) if ious else 0.0
+    return report
+
+
+def check_backend_parity(reference: DetectionService, candidate: DetectionService,
+                         sources: Iterable, iou_threshold: float = 0.5) -> Dict:
+    """
+    在一组图片上比较两个检测服务（如PyTorch与ONNX后端）的输出一致性
+    :return: 汇总报告，recall 为参考结果中被候选结果匹配到的比例
+    """
+    summary = {
+        'images': 0,
+        'reference_boxes': 0,
+        'candidate_boxes': 0,
+        'matched_boxes': 0,
+        'max_conf_diff': 0.0,
+        'reference_time': 0.0,
+        'candidate_time': 0.0,
+    }
+    for source in sources:
+        image = DetectionService._load_image(source)
+        ref_result = reference.detect(image)
+        cand_result = candidate.detect(image)
+        report = compare_results(ref_result, cand_result, iou_threshold)
+        summary['images'] += 1
+        summary['reference_boxes'] += report['reference']
+        summary['candidate_boxes'] += report['candidate']
+        summary['matched_boxes'] += report['matched']
+        summary['max_conf_diff'] = max(summary['max_conf_diff'], report['max_conf_diff'])
+        summary['reference_time'] += ref_result.elapsed_time
+        summary['candidate_time'] += cand_result.elapsed_time
+    
+    summary['recall'] = summary['matched_boxes'] / summary['reference_boxes'] if summary['reference_boxes'] else 1.0
+    summary['precision'] = summary['matched_boxes'] / summary['candidate_boxes'] if summary['candidate_boxes'] else 1.0
+    return summary
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+基于YOLOv8的垃圾目标检测算法 - 共享内存帧环形缓冲
+
+在 multiprocessing.shared_memory 中预分配固定数量的帧槽位，
+采集进程直接把帧解码进槽位，推理进程直接读取槽位视图，
+帧数据既不经过pickle也不复制。每个槽位带状态和递增的序列号：
+
+    FREE → WRITING → READY → READING → FREE
+
+写入方在槽位占满时可以等待，也可以覆盖最旧的未读帧（实时摄像头）。
+读取方总是按序列号从小到大取帧。
+
+用法（父进程创建，子进程通过 handle 连接）:
+    ring = SharedFrameRing(slots=8, frame_shape=(1080, 1920, 3))
+    Process(target=run_capture, args=(0, ring.handle(), stop_event)).start()
+
+    frame = ring.acquire_read(timeout=1)   # (slot, seq, timestamp_ns, view) 或 None（已关闭）
+    ...
+    ring.release(frame[0])
+"""
+import time
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+# 槽位状态
+FREE, WRITING, READY, READING = 0, 1, 2, 3
+
+# 槽位头字段：状态、序列号、高、宽、通道、采集时间戳(ns)
+_STATE, _SEQ, _HEIGHT, _WIDTH, _CHANNELS, _TIMESTAMP = range(6)
+_SLOT_FIELDS = 6
+
+# 全局头字段：下一个序列号、写入方已关闭、覆盖丢弃的帧数
+_NEXT_SEQ, _CLOSED, _DROPPED = range(3)
+_GLOBAL_FIELDS = 3
+
+
+class SharedFrameRing:
+    """跨进程共享的帧环形缓冲，支持槽位复用与序列号"""
+
+    def __init__(self, slots: int = 8, frame_shape: Tuple[int, int, int] = (1080, 1920, 3),
+                 overwrite: bool = False, name: str = None, condition=None):
+        """
+        :param slots: 槽位数量
+        :param frame_shape: 单帧最大尺寸 (h, w, c)
+        :param overwrite: 槽位占满时覆盖最旧的未读帧（True）或等待空闲槽位（False）
+        :param name: 连接已有共享内存时的名称，None 表示新建
+        :param condition: 连接已有缓冲时使用的跨进程条件变量
+        """
+        self.slots = slots
+        self.frame_shape = tuple(frame_shape)
+        self.overwrite = overwrite
+        self.slot_bytes = int(np.prod(self.frame_shape))
+        self._owner = name is None
+        self._cond = condition if condition is not None else mp.get_context('spawn').Condition()
+
+        header_bytes = (_GLOBAL_FIELDS + slots * _SLOT_FIELDS) * 8
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=header_bytes + slots * self.slot_bytes)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+
+        self._global = np.ndarray((_GLOBAL_FIELDS,), dtype=np.int64, buffer=self._shm.buf)
+        self._header = np.ndarray((slots, _SLOT_FIELDS), dtype=np.int64, buffer=self._shm.buf,
+                                  offset=_GLOBAL_FIELDS * 8)
+        self._frames = np.ndarray((slots, self.slot_bytes), dtype=np.uint8, buffer=self._shm.buf,
+                                  offset=header_bytes)
+        if self._owner:
+            self._global[:] = 0
+            self._header[:] = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def handle(self) -> tuple:
+        """可传给子进程（Process 参数）的连接信息"""
+        return (self.name, self.slots, self.frame_shape, self.overwrite, self._cond)
+
+    @classmethod
+    def attach(cls, handle: tuple) -> 'SharedFrameRing':
+        """在子进程中通过 handle 连接已有缓冲"""
+        name, slots, frame_shape, overwrite, condition = handle
+        return cls(slots, frame_shape, overwrite, name=name, condition=condition)
+
+    @property
+    def dropped(self) -> int:
+        """覆盖模式下被丢弃的未读帧数"""
+        return int(self._global[_DROPPED])
+
+    @property
+    def closed(self) -> bool:
+        return bool(self._global[_CLOSED])
+
+    def free_count(self) -> int:
+        """当前空闲槽位数"""
+        with self._cond:
+            return int(np.count_nonzero(self._header[:, _STATE] == FREE))
+
+    def _view(self, slot: int, h: int, w: int, c: int) -> np.ndarray:
+        """槽位前 h*w*c 字节的连续视图，可直接作为 cap.read 的输出缓冲"""
+        return self._frames[slot, :h * w * c].reshape(h, w, c)
+
+    def acquire_write(self, h: int, w: int, c: int = 3, timeout: float = None) -> Tuple[int, np.ndarray]:
+        """
+        申请一个可写槽位
+        :return: (slot, view)，写完后调用 commit(slot)
+        """
+        if h * w * c > self.slot_bytes:
+            raise ValueError(f"帧尺寸 {(h, w, c)} 超出槽位尺寸 {self.frame_shape}")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                states = self._header[:, _STATE]
+                free = np.flatnonzero(states == FREE)
+                if len(free):
+                    slot = int(free[0])
+                    break
+                ready = np.flatnonzero(states == READY)
+                if self.overwrite and len(ready):
+                    # 覆盖序列号最小（最旧）的未读帧
+                    slot = int(ready[np.argmin(self._header[ready, _SEQ])])
+                    self._global[_DROPPED] += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Full
+                self._cond.wait(remaining)
+            self._header[slot, _STATE] = WRITING
+            self._header[slot, _HEIGHT:_CHANNELS + 1] = (h, w, c)
+        return slot, self._view(slot, h, w, c)
+
+    def commit(self, slot: int, timestamp_ns: int = None) -> int:
+        """提交已写好的槽位，返回分配的序列号"""
+        with self._cond:
+            seq = int(self._global[_NEXT_SEQ])
+            self._global[_NEXT_SEQ] = seq + 1
+            self._header[slot, _SEQ] = seq
+            self._header[slot, _TIMESTAMP] = time.monotonic_ns() if timestamp_ns is None else timestamp_ns
+            self._header[slot, _STATE] = READY
+            self._cond.notify_all()
+        return seq
+
+    def abort(self, slot: int):
+        """放弃已申请但未提交的槽位"""
+        self.release(slot)
+
+    def acquire_read(self, timeout: float = None) -> Optional[Tuple[int, int, int, np.ndarray]]:
+        """
+        取出序列号最小的就绪帧
+        :return: (slot, seq, timestamp_ns, view)；写入方已关闭且无剩余帧时返回 None；超时抛出 queue.Empty
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                ready = np.flatnonzero(self._header[:, _STATE] == READY)
+                if len(ready):
+                    slot = int(ready[np.argmin(self._header[ready, _SEQ])])
+                    break
+                if self._global[_CLOSED]:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._cond.wait(remaining)
+            self._header[slot, _STATE] = READING
+            seq, h, w, c, timestamp_ns = (int(v) for v in self._header[slot, _SEQ:_TIMESTAMP + 1])
+        return slot, seq, timestamp_ns, self._view(slot, h, w, c)
+
+    def release(self, slot: int):
+        """读取完毕，槽位回到空闲状态"""
+        with self._cond:
+            self._header[slot, _STATE] = FREE
+            self._cond.notify_all()
+
+    def reset(self):
+        """读取方异常退出后释放全部槽位，唤醒等待空闲槽位的写入方"""
+        with self._cond:
+            self._header[:, _STATE] = FREE
+            self._cond.notify_all()
+
+    def close_writer(self):
+        """写入方结束，读取方取完剩余帧后 acquire_read 返回 None"""
+        with self._cond:
+            self._global[_CLOSED] = 1
+            self._cond.notify_all()
+
+    def close(self):
+        """断开共享内存，创建方同时释放"""
+        del self._global, self._header, self._frames
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+
+def run_capture(source, ring_handle: tuple, stop_event):
+    """
+    采集进程入口：把视频帧直接解码进共享内存槽位
+    :param source: 视频文件路径或摄像头编号
+    :param ring_handle: SharedFrameRing.handle()
+    :param stop_event: multiprocessing.Event，置位后停止采集
+    """
+    import cv2
+    ring = SharedFrameRing.attach(ring_handle)
+    cap = cv2.VideoCapture(source)
+    try:
+        # 很多摄像头和网络流的 CAP_PROP_FRAME_HEIGHT/WIDTH 为 0，帧尺寸以首帧为准
+        ret, first = cap.read()
+        if not ret or first is None or first.size == 0:
+            raise RuntimeError(f"无法从视频源读取首帧: {source}")
+        timestamp_ns = time.monotonic_ns()
+        h, w = first.shape[:2]
+        c = first.shape[2] if first.ndim == 3 else 1
+        while cap.isOpened() and not stop_event.is_set():
+            try:
+                slot, view = ring.acquire_write(h, w, c, timeout=0.5)
+            except queue.Full:
+                continue
+            if first is not None:
+                view[...] = first.reshape(view.shape)
+                first = None
+            else:
+                if not cap.grab():
+                    ring.abort(slot)
+                    break
+                timestamp_ns = time.monotonic_ns()
+                # 形状一致时 OpenCV 直接写入传入的缓冲区
+                ret, frame = cap.retrieve(view)
+                if not ret:
+                    ring.abort(slot)
+                    break
+                if frame is not view:
+                    view[...] = frame.reshape(view.shape)
+            ring.commit(slot, timestamp_ns)
+    finally:
+        cap.release()
+        ring.close_writer()
+        ring.close()
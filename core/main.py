@@ -5,6 +5,7 @@
 """
 import sys
 import os
+import time
 import cv2
 import numpy as np
 from PyQt5.QtWidgets import QApplication, QMainWindow, QFileDialog, QMessageBox
@@ -16,10 +17,14 @@ PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
 from UIProgram.UiMain import Ui_MainWindow
-from core.detection_service import DetectionService
+from core.detection_service import DetectionService, DetectionResult
+from core.video_pipeline import VideoPipeline
 from core.ui_manager import UIManager
 from core.file_handler import FileHandler
 from core.statistics_manager import StatisticsManager
+from core.tracker import ObjectTracker, tracks_to_arrays
+from core.result_cache import ResultCache
+from core.prefetcher import FolderPrefetcher
 from config import Config
 
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
@@ -27,7 +32,7 @@ os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
 class VideoThread(QThread):
     """视频/摄像头处理线程"""
-    frame_signal = pyqtSignal(np.ndarray, object)  # 发送帧和检测结果
+    frame_signal = pyqtSignal(np.ndarray, object, dict)  # 发送帧、检测结果和帧信息
     finished_signal = pyqtSignal()
     error_signal = pyqtSignal(str)
     
@@ -37,50 +42,24 @@ class VideoThread(QThread):
         self.detection_service = detection_service
         self.running = True
         self.save_video = False
-        self.video_writer = None
         self.save_path = None
+        self.paced = Config.video_paced  # True 按源帧率播放，False 全速离线处理
+        # 摄像头默认使用实时模式：只处理最新帧，丢弃积压帧
+        self.realtime = isinstance(source, int) and Config.camera_realtime
+        self.pipeline = None
     
     def run(self):
         try:
-            cap = cv2.VideoCapture(self.source)
-            if not cap.isOpened():
-                self.error_signal.emit(f"无法打开视频源: {self.source}")
-                return
-            
-            # 获取视频信息
-            fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            
-            # 初始化视频写入器
-            if self.save_video and self.save_path:
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                self.video_writer = cv2.VideoWriter(self.save_path, fourcc, fps, (width, height))
-            
-            while self.running:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # 执行检测
-                result = self.detection_service.detect(frame)
-                
-                # 获取绘制后的图像
-                plotted_frame = result.get_plotted_image()
-                
-                # 保存视频帧
-                if self.video_writer is not None:
-                    self.video_writer.write(plotted_frame)
-                
-                # 发送信号
-                self.frame_signal.emit(plotted_frame, result)
-                
-                # 控制帧率
-                self.msleep(int(1000 / fps))
-            
-            cap.release()
-            if self.video_writer is not None:
-                self.video_writer.release()
+            self.pipeline = VideoPipeline(
+                self.source,
+                self.detection_service,
+                on_frame=self.frame_signal.emit,
+                paced=self.paced,
+                save_path=self.save_path if self.save_video else None,
+                latest_only=self.realtime,
+            )
+            if self.running:
+                self.pipeline.run()
             
         except Exception as e:
             self.error_signal.emit(str(e))
@@ -89,10 +68,40 @@ class VideoThread(QThread):
     
     def stop(self):
         self.running = False
+        if self.pipeline is not None:
+            self.pipeline.stop()
     
     def enable_save(self, save_path):
+        """保存标注视频；视频文件此时全速处理，不按源帧率等待"""
         self.save_video = True
         self.save_path = save_path
+        if not isinstance(self.source, int):
+            self.paced = False
+
+
+class ExportThread(QThread):
+    """统计导出线程，分块导出期间界面保持响应"""
+    progress_signal = pyqtSignal(int)
+    finished_signal = pyqtSignal(str)
+    
+    def __init__(self, statistics_manager, export_path=None, start_date=None, end_date=None):
+        super().__init__()
+        self.statistics_manager = statistics_manager
+        self.export_path = export_path
+        self.start_date = start_date
+        self.end_date = end_date
+    
+    def run(self):
+        export_path = None
+        try:
+            export_path = self.statistics_manager.export_to_csv(
+                self.export_path, self.start_date, self.end_date,
+                progress=self.progress_signal.emit,
+            )
+        except Exception as e:
+            print(f"[ERROR] 导出统计失败: {e}")
+        finally:
+            self.finished_signal.emit(export_path or '')
 
 
 class MainWindow(QMainWindow):
@@ -108,10 +117,15 @@ class MainWindow(QMainWindow):
         self.ui_manager = UIManager(self.ui)
         self.statistics_manager = StatisticsManager()
         self.video_thread = None
+        self.video_tracker = ObjectTracker()  # 视频统计按跟踪目标计数
+        self.export_thread = None
         self.current_image = None
         self.current_result = None
+        self.current_image_path = None  # 当前显示的图片文件（保存时按原图重新绘制）
         self.image_list = []
         self.current_image_index = 0
+        self.result_cache = None  # 图片检测结果缓存，模型加载后创建
+        self.prefetcher = None    # 文件夹邻近图片预取
         
         # 加载模型
         self._init_model()
@@ -145,6 +159,8 @@ class MainWindow(QMainWindow):
                     Config.model_path = 'yolov8n.pt'
             
             self.detection_service = DetectionService(Config.model_path)
+            self.result_cache = ResultCache(self.detection_service.model_identity)
+            self.prefetcher = FolderPrefetcher(self.detection_service, self.result_cache)
             self.ui.statusLabel.setText(f"模型加载成功: {Config.model_path}")
         except Exception as e:
             QMessageBox.critical(self, "错误", f"模型加载失败: {e}")
@@ -190,9 +206,11 @@ class MainWindow(QMainWindow):
         
         if folder_path:
             self.image_list = FileHandler.get_images_from_directory(folder_path)
+            if self.prefetcher is not None:
+                self.prefetcher.set_folder(self.image_list)
             if self.image_list:
                 self.current_image_index = 0
-                self._detect_image(self.image_list[0])
+                self._detect_folder_image(0)
                 self.ui.statusLabel.setText(f"已加载 {len(self.image_list)} 张图片")
             else:
                 QMessageBox.information(self, "提示", "文件夹中没有找到图片")
@@ -218,7 +236,14 @@ class MainWindow(QMainWindow):
         """保存检测结果"""
         if self.current_image is not None:
             save_path = FileHandler.generate_save_path("detected_result.jpg")
-            cv2.imwrite(save_path, self.current_image)
+            image = self.current_image
+            if self.current_image_path is not None:
+                # 界面显示的是缓存缩略图，保存时在原图上重新绘制
+                original = cv2.imread(self.current_image_path)
+                if original is not None:
+                    self.current_result.image = original
+                    image = self.current_result.get_plotted_image()
+            cv2.imwrite(save_path, image)
             self.ui.statusLabel.setText(f"已保存: {save_path}")
             QMessageBox.information(self, "保存成功", f"结果已保存到:\n{save_path}")
     
@@ -228,6 +253,7 @@ class MainWindow(QMainWindow):
             self.video_thread.stop()
             self.video_thread.wait()
             self.video_thread = None
+        self._record_tracks(self.video_tracker.flush())
         
         self.ui.CapBtn.setText("📹 开启摄像头")
         self.ui.StopBtn.setEnabled(False)
@@ -253,40 +279,121 @@ class MainWindow(QMainWindow):
             return
         
         try:
-            # 读取图片
-            image = cv2.imread(image_path)
-            if image is None:
-                QMessageBox.warning(self, "警告", f"无法读取图片: {image_path}")
-                return
-            
-            # 执行检测
-            result = self.detection_service.detect(image)
-            
-            # 获取绘制后的图像
-            plotted_image = result.get_plotted_image()
-            self.current_image = plotted_image
-            self.current_result = result
-            
-            # 更新显示
-            self.ui_manager.display_image(plotted_image, self.ui.imageLabel)
-            self.ui_manager.update_result_table(result, self.ui.resultTable)
-            self.ui_manager.update_detection_info(result, self.ui.detectInfoLabel)
-            
-            # 显示分类指导
-            guides = result.get_classification_guide()
-            self.ui_manager.show_classification_guide(guides, self.ui.guideLabel)
+            key, data = self.result_cache.key_for(image_path)
+            entry = self.result_cache.get(key)
+            if entry is None:
+                # 读取图片
+                image = self._decode_image(image_path, data) if key is not None else None
+                if image is None:
+                    QMessageBox.warning(self, "警告", f"无法读取图片: {image_path}")
+                    return
+                
+                # 执行检测
+                result = self.detection_service.detect(image)
+                entry = self.result_cache.put(key, result, result.get_plotted_image())
+            self._show_image_result(image_path, entry)
             
-            # 记录统计
-            self.statistics_manager.add_record(result)
-            self._update_statistics_display()
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"检测失败: {e}")
+    
+    def _detect_folder_image(self, index, step=1):
+        """
+        检测文件夹中的图片并预取前后的图片
+        未命中缓存时：开启预取则只检测当前图片，否则沿浏览方向批量检测一批
+        """
+        if not self.detection_service:
+            QMessageBox.warning(self, "警告", "模型未加载")
+            return
+        
+        image_path = self.image_list[index]
+        try:
+            key, _ = self.result_cache.key_for(image_path)
+            entry = self.result_cache.get(key)
+            if entry is None:
+                # 尚未开始推理的预取直接取消；正在推理的批次包含本图时等待其完成，不重复推理
+                self.prefetcher.cancel()
+                if self.prefetcher.wait_for(key):
+                    entry = self.result_cache.get(key, count=False)
+            if entry is None:
+                count = 1 if self.prefetcher.radius > 0 else None
+                entry = self._detect_folder_batch(index, step, count).get(index)
+            self.prefetcher.schedule(index, step)
             
-            # 更新状态
-            self.ui.statusLabel.setText(f"检测完成: {os.path.basename(image_path)}")
-            self.ui.SaveBtn.setEnabled(True)
+            if entry is None:
+                QMessageBox.warning(self, "警告", f"无法读取图片: {image_path}")
+                return
+            self._show_image_result(image_path, entry)
             
+            metrics = self.prefetcher.metrics()
+            self.ui.statusLabel.setText(
+                f"检测完成: {os.path.basename(image_path)} ({index + 1}/{len(self.image_list)}) | "
+                f"预取命中率: {metrics['hit_rate']:.0%} | 预取队列: {metrics['queue_depth']}"
+            )
+        
         except Exception as e:
             QMessageBox.critical(self, "错误", f"检测失败: {e}")
     
+    def _detect_folder_batch(self, index, step=1, count=None):
+        """
+        沿浏览方向循环取 count（默认 Config.batch_size）张图片，未缓存的合并为一次批量推理
+        :return: {索引: CachedResult}，无法读取的图片不在其中
+        """
+        count = min(count or Config.batch_size, len(self.image_list))
+        indices = [(index + i * step) % len(self.image_list) for i in range(count)]
+        
+        entries = {}
+        pending = []
+        for i in indices:
+            key, data = self.result_cache.key_for(self.image_list[i])
+            if key is None:
+                continue
+            entry = self.result_cache.get(key, count=False)
+            if entry is not None:
+                entries[i] = entry
+                continue
+            image = self._decode_image(self.image_list[i], data)
+            if image is not None:
+                pending.append((i, key, image))
+        
+        if pending:
+            results = self.detection_service.detect_batch([image for _, _, image in pending], batch_size=count)
+            for (i, key, _), result in zip(pending, results):
+                entries[i] = self.result_cache.put(key, result, result.get_plotted_image())
+        return entries
+    
+    @staticmethod
+    def _decode_image(image_path, data=None):
+        """解码已读入的文件内容，未读入时从路径读取"""
+        if data is None:
+            return cv2.imread(image_path)
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    
+    def _show_image_result(self, image_path, entry):
+        """显示缓存的图片检测结果，同一图片内容只记录一次统计"""
+        result = entry.to_result()
+        plotted_image = entry.thumbnail
+        self.current_image = plotted_image
+        self.current_result = result
+        self.current_image_path = image_path
+        
+        # 更新显示
+        self.ui_manager.display_image(plotted_image, self.ui.imageLabel)
+        self.ui_manager.update_result_table(result, self.ui.resultTable)
+        self.ui_manager.update_detection_info(result, self.ui.detectInfoLabel)
+        
+        # 显示分类指导
+        guides = result.get_classification_guide()
+        self.ui_manager.show_classification_guide(guides, self.ui.guideLabel)
+        
+        # 记录统计
+        if self.result_cache.mark_recorded(entry.key):
+            self.statistics_manager.add_record(result)
+            self._update_statistics_display()
+        
+        # 更新状态
+        self.ui.statusLabel.setText(f"检测完成: {os.path.basename(image_path)}")
+        self.ui.SaveBtn.setEnabled(True)
+    
     def _start_video(self, source):
         """启动视频处理"""
         if not self.detection_service:
@@ -295,6 +402,8 @@ class MainWindow(QMainWindow):
         
         # 停止之前的线程
         self.on_stop()
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
         
         # 创建新线程
         self.video_thread = VideoThread(source, self.detection_service)
@@ -314,10 +423,11 @@ class MainWindow(QMainWindow):
         
         self.ui.StopBtn.setEnabled(True)
     
-    def _on_video_frame(self, frame, result):
+    def _on_video_frame(self, frame, result, info):
         """处理视频帧"""
         self.current_image = frame
         self.current_result = result
+        self.current_image_path = None
         
         # 更新显示
         self.ui_manager.display_image(frame, self.ui.imageLabel)
@@ -328,18 +438,30 @@ class MainWindow(QMainWindow):
         guides = result.get_classification_guide()
         self.ui_manager.show_classification_guide(guides, self.ui.guideLabel)
         
-        # 视频帧统计（每30帧记录一次避免过多记录）
-        if not hasattr(self, '_video_frame_count'):
-            self._video_frame_count = 0
-        self._video_frame_count += 1
-        if self._video_frame_count % 30 == 0 and result.has_detections:
-            self.statistics_manager.add_record(result)
-            self._update_statistics_display()
+        # 视频帧统计：每个跟踪目标在离开画面时记录一次
+        self._record_tracks(self.video_tracker.update(result.xyxy, result.cls, result.conf,
+                                                      result.elapsed_time))
+        
+        # 实时模式显示采集到显示的端到端延迟和丢帧数
+        if info.get('realtime'):
+            latency_ms = (time.perf_counter() - info['capture_time']) * 1000
+            self.ui.statusLabel.setText(
+                f"摄像头实时检测 | 延迟: {latency_ms:.0f}ms | 丢帧: {info['dropped_frames']}"
+            )
         
         self.ui.SaveBtn.setEnabled(True)
     
+    def _record_tracks(self, tracks):
+        """将结束的跟踪目标合并为一条统计记录"""
+        if not tracks:
+            return
+        xyxy, cls, conf, elapsed_time = tracks_to_arrays(tracks)
+        self.statistics_manager.add_record(DetectionResult.from_arrays(xyxy, cls, conf, elapsed_time))
+        self._update_statistics_display()
+    
     def _on_video_finished(self):
         """视频处理完成"""
+        self._record_tracks(self.video_tracker.flush())
         self.ui.CapBtn.setText("📹 开启摄像头")
         self.ui.StopBtn.setEnabled(False)
         self.ui.statusLabel.setText("视频播放完成")
@@ -352,6 +474,11 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         """关闭事件"""
         self.on_stop()
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        if self.export_thread is not None:
+            self.export_thread.wait()
+        self.statistics_manager.close()
         event.accept()
     
     def keyPressEvent(self, event):
@@ -361,11 +488,11 @@ class MainWindow(QMainWindow):
         elif event.key() == Qt.Key_Right and self.image_list:
             # 下一张图片
             self.current_image_index = (self.current_image_index + 1) % len(self.image_list)
-            self._detect_image(self.image_list[self.current_image_index])
+            self._detect_folder_image(self.current_image_index)
         elif event.key() == Qt.Key_Left and self.image_list:
             # 上一张图片
             self.current_image_index = (self.current_image_index - 1) % len(self.image_list)
-            self._detect_image(self.image_list[self.current_image_index])
+            self._detect_folder_image(self.current_image_index, step=-1)
     
     def _update_statistics_display(self):
         """更新统计显示"""
@@ -387,16 +514,25 @@ class MainWindow(QMainWindow):
             print(f"[WARNING] 更新统计显示失败: {e}")
     
     def on_export_statistics(self):
-        """导出统计数据"""
-        try:
-            export_path = self.statistics_manager.export_to_csv()
-            if export_path:
-                self.ui.statusLabel.setText(f"统计已导出: {export_path}")
-                QMessageBox.information(self, "导出成功", f"统计数据已导出到:\n{export_path}")
-            else:
-                QMessageBox.warning(self, "导出失败", "无法导出统计数据")
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"导出失败: {e}")
+        """在后台线程中导出统计数据"""
+        if self.export_thread is not None and self.export_thread.isRunning():
+            return
+        self.ui.exportStatsBtn.setEnabled(False)
+        self.ui.statusLabel.setText("正在导出统计...")
+        self.export_thread = ExportThread(self.statistics_manager)
+        self.export_thread.progress_signal.connect(
+            lambda rows: self.ui.statusLabel.setText(f"正在导出统计: {rows} 条"))
+        self.export_thread.finished_signal.connect(self._on_export_finished)
+        self.export_thread.start()
+    
+    def _on_export_finished(self, export_path):
+        """导出完成"""
+        self.ui.exportStatsBtn.setEnabled(True)
+        if export_path:
+            self.ui.statusLabel.setText(f"统计已导出: {export_path}")
+            QMessageBox.information(self, "导出成功", f"统计数据已导出到:\n{export_path}")
+        else:
+            QMessageBox.warning(self, "导出失败", "无法导出统计数据")
     
     def on_clear_statistics(self):
         """清空统计记录"""
@@ -407,7 +543,11 @@ class MainWindow(QMainWindow):
             QMessageBox.No
         )
         if reply == QMessageBox.Yes:
-            self.statistics_manager.clear_records()
+            if not self.statistics_manager.clear_records():
+                QMessageBox.warning(self, "清空失败", "统计记录正在写入，请稍后重试")
+                return
+            if self.result_cache is not None:
+                self.result_cache.reset_recorded()
             self._update_statistics_display()
             self.ui.statusLabel.setText("统计记录已清空")
 
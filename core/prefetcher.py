@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+基于YOLOv8的垃圾目标检测算法 - 文件夹邻近图片预取模块
+
+文件夹模式下，后台线程预先解码并检测当前图片前后各 Config.prefetch_radius 张图片，
+结果放入 ResultCache，方向键切换时直接命中缓存。浏览方向上的图片优先，
+每个方向合并为一次批量推理。
+
+每次切换图片都会重新安排预取：代数加一并替换待处理队列，后台线程在解码
+和推理之间检查代数，用户跳转后旧位置附近尚未开始的工作直接丢弃。
+正在推理的图片登记为进行中，界面切换到这些图片时用 wait_for 等待结果，
+不再对同一张图片重复推理。
+"""
+import threading
+from collections import deque
+from typing import Dict, List
+
+import cv2
+import numpy as np
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+
+class FolderPrefetcher:
+    """邻近图片的后台预解码与预检测"""
+
+    def __init__(self, detection_service, result_cache, radius: int = None):
+        """
+        :param detection_service: DetectionService
+        :param result_cache: core.result_cache.ResultCache
+        :param radius: 当前图片前后各预取多少张，默认 Config.prefetch_radius，0 表示关闭
+        """
+        self.detection_service = detection_service
+        self.result_cache = result_cache
+        self.radius = radius if radius is not None else Config.prefetch_radius
+        self._image_list: List[str] = []
+        self._generation = 0
+        self._pending = deque()  # 待处理批次，每批为图片索引列表
+        self._inflight: Dict[str, threading.Event] = {}  # 正在推理的缓存键
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        self._metrics = {'prefetched': 0, 'cancelled': 0, 'failed': 0}
+
+    def set_folder(self, image_list: List[str]):
+        """切换文件夹，丢弃此前的预取任务"""
+        with self._condition:
+            self._image_list = list(image_list)
+            self._cancel_locked()
+
+    def cancel(self):
+        """丢弃尚未开始的预取任务（如开始播放视频时）"""
+        with self._condition:
+            self._cancel_locked()
+
+    def _cancel_locked(self):
+        self._generation += 1
+        self._metrics['cancelled'] += sum(len(batch) for batch in self._pending)
+        self._pending.clear()
+
+    def schedule(self, index: int, step: int = 1):
+        """
+        围绕当前图片重新安排预取
+        :param index: 当前图片索引
+        :param step: 浏览方向（1 向后，-1 向前），该方向的图片先预取
+        """
+        if self.radius <= 0:
+            return
+        with self._condition:
+            count = len(self._image_list)
+            if count <= 1:
+                return
+            self._cancel_locked()
+            radius = min(self.radius, (count - 1) // 2 or 1)
+            for direction in (step, -step):
+                batch = [(index + direction * i) % count for i in range(1, radius + 1)]
+                batch = [i for i in batch if i != index]
+                if batch:
+                    self._pending.append(batch)
+            self._ensure_thread()
+            self._condition.notify()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='folder-prefetch', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """停止后台线程（当前批次推理完成后退出）"""
+        with self._condition:
+            self._stopped = True
+            self._cancel_locked()
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def wait_for(self, key: str, timeout: float = None) -> bool:
+        """
+        等待正在预取的图片推理完成并放入缓存
+        :return: 该图片是否正在预取且已在超时前完成
+        """
+        with self._condition:
+            done = self._inflight.get(key)
+        return done is not None and done.wait(timeout)
+
+    def queue_depth(self) -> int:
+        """尚未预取的图片数"""
+        with self._condition:
+            return sum(len(batch) for batch in self._pending)
+
+    def metrics(self) -> Dict[str, float]:
+        """预取数量、队列深度与缓存命中率"""
+        with self._condition:
+            metrics = dict(self._metrics)
+            metrics['queue_depth'] = sum(len(batch) for batch in self._pending)
+        metrics['hit_rate'] = self.result_cache.metrics()['hit_rate']
+        return metrics
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                batch = self._pending.popleft()
+                generation = self._generation
+                paths = [self._image_list[i] for i in batch]
+            try:
+                self._prefetch(paths, generation)
+            except Exception as e:
+                self._metrics['failed'] += len(paths)
+                print(f"[WARNING] 图片预取失败: {e}")
+
+    def _is_current(self, generation: int) -> bool:
+        return generation == self._generation and not self._stopped
+
+    def _prefetch(self, paths: List[str], generation: int):
+        """解码未缓存的图片并合并为一次批量推理"""
+        pending = []
+        for path in paths:
+            if not self._is_current(generation):
+                self._metrics['cancelled'] += len(paths) - len(pending)
+                return
+            key, data = self.result_cache.key_for(path)
+            if key is None or self.result_cache.get(key, count=False) is not None:
+                continue
+            if data is None:
+                image = cv2.imread(path)
+            else:
+                image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                self._metrics['failed'] += 1
+                continue
+            pending.append((key, image))
+
+        if not pending:
+            return
+        with self._condition:
+            if not self._is_current(generation):
+                self._metrics['cancelled'] += len(pending)
+                return
+            done = threading.Event()
+            keys = [key for key, _ in pending]
+            self._inflight.update((key, done) for key in keys)
+        try:
+            results = self.detection_service.detect_batch([image for _, image in pending],
+                                                          batch_size=len(pending))
+            # 已完成的推理即使用户已跳转也放入缓存
+            for (key, _), result in zip(pending, results):
+                self.result_cache.put(key, result, result.get_plotted_image())
+            self._metrics['prefetched'] += len(pending)
+        finally:
+            with self._condition:
+                for key in keys:
+                    if self._inflight.get(key) is done:
+                        del self._inflight[key]
+            done.set()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+基于YOLOv8的垃圾目标检测算法 - 检测框绘制模块
+
+替代 ultralytics Results.plot()：检测框用 cv2.rectangle 直接画在目标缓冲上，
+标签（中文类别名、置信度数字）在初始化时用 resources/Font 中的字体预渲染为
+带分类底色的小图块，绘制时只做切片拷贝。
+resources/Font 中没有字体或未安装Pillow时退化为OpenCV绘制的英文类别名。
+"""
+import os
+import glob
+from typing import Dict, Tuple, Optional
+
+import cv2
+import numpy as np
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+# 分类颜色（BGR），与界面配色一致
+PLOT_COLORS = {
+    'green': (80, 175, 76),
+    'blue': (243, 150, 33),
+    'red': (54, 67, 244),
+    'gray': (158, 158, 158),
+}
+
+# 字体文件目录及支持的格式
+FONT_DIR = os.path.join(Config.PROJECT_ROOT, 'resources', 'Font')
+FONT_EXTENSIONS = ('*.ttf', '*.ttc', '*.otf')
+
+# 置信度字符
+CONF_CHARS = '0123456789.'
+
+# 标签文字颜色与内边距
+TEXT_COLOR = (255, 255, 255)
+LABEL_PADDING = 2
+
+
+def find_font(font_path: str = None) -> Optional[str]:
+    """返回指定字体或 resources/Font 下的第一个字体文件"""
+    if font_path and os.path.exists(font_path):
+        return font_path
+    for pattern in FONT_EXTENSIONS:
+        fonts = sorted(glob.glob(os.path.join(FONT_DIR, pattern)))
+        if fonts:
+            return fonts[0]
+    return None
+
+
+class BoxRenderer:
+    """检测框渲染器，标签图块预渲染一次后重复使用"""
+
+    def __init__(self, font_path: str = None, font_size: int = None):
+        self.font_size = font_size or Config.font_size
+        self.font_path = find_font(font_path or Config.font_path)
+        self._font = self._load_font()
+        self.class_colors = [self._class_color(cls_id) for cls_id in range(Config.NUM_CLASSES)]
+        self.label_height = self._text_mask('0').shape[0] + 2 * LABEL_PADDING
+        # 预渲染：类别名图块（含右侧空格）与各分类颜色下的置信度字符图块
+        self._name_patches = [self._make_patch(self._class_name(cls_id) + ' ', color)
+                              for cls_id, color in enumerate(self.class_colors)]
+        self._char_patches: Dict[Tuple[tuple, str], np.ndarray] = {
+            (color, char): self._make_patch(char, color, pad_x=0)
+            for color in set(self.class_colors) for char in CONF_CHARS
+        }
+
+    def _load_font(self):
+        """加载TrueType字体，失败时返回 None 使用OpenCV字体"""
+        if not self.font_path:
+            return None
+        try:
+            from PIL import ImageFont
+            return ImageFont.truetype(self.font_path, self.font_size)
+        except (ImportError, OSError) as e:
+            print(f"[WARNING] 字体加载失败，使用英文标签: {e}")
+            return None
+
+    def _class_name(self, cls_id: int) -> str:
+        """有中文字体时使用中文名，否则使用英文名"""
+        if self._font is not None and cls_id < len(Config.CH_names):
+            return Config.CH_names[cls_id]
+        return Config.names.get(cls_id, f'class{cls_id}')
+
+    @staticmethod
+    def _class_color(cls_id: int) -> tuple:
+        color_name = Config.classification_guide.get(cls_id, {}).get('color', 'gray')
+        return PLOT_COLORS.get(color_name, PLOT_COLORS['gray'])
+
+    def _text_mask(self, text: str) -> np.ndarray:
+        """渲染文字灰度蒙版，同一字体下所有文字高度一致"""
+        if self._font is not None:
+            from PIL import Image, ImageDraw
+            ascent, descent = self._font.getmetrics()
+            width = max(1, int(np.ceil(self._font.getlength(text))))
+            canvas = Image.new('L', (width, ascent + descent), 0)
+            ImageDraw.Draw(canvas).text((0, 0), text, fill=255, font=self._font)
+            return np.asarray(canvas)
+
+        scale = self.font_size / 30
+        (width, height), baseline = cv2.getTextSize('0', cv2.FONT_HERSHEY_SIMPLEX, scale, 1)
+        text_width = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, 1)[0][0]
+        mask = np.zeros((height + baseline, max(1, text_width)), dtype=np.uint8)
+        cv2.putText(mask, text, (0, height), cv2.FONT_HERSHEY_SIMPLEX, scale, 255, 1, cv2.LINE_AA)
+        return mask
+
+    def _make_patch(self, text: str, color: tuple, pad_x: int = LABEL_PADDING) -> np.ndarray:
+        """生成分类底色+白字的BGR标签图块"""
+        alpha = self._text_mask(text).astype(np.float32)[..., None] / 255.0
+        h, w = alpha.shape[:2]
+        patch = np.empty((h + 2 * LABEL_PADDING, w + 2 * pad_x, 3), dtype=np.uint8)
+        patch[:] = color
+        text_area = np.asarray(color, np.float32) * (1 - alpha) + np.asarray(TEXT_COLOR, np.float32) * alpha
+        patch[LABEL_PADDING:LABEL_PADDING + h, pad_x:pad_x + w] = text_area.astype(np.uint8)
+        return patch
+
+    def render(self, image: np.ndarray, result, out: np.ndarray = None) -> np.ndarray:
+        """
+        绘制检测框和标签
+        :param image: BGR原图
+        :param result: DetectionResult
+        :param out: 目标缓冲；None 时复制原图，传入 image 本身即原地绘制，
+                    传入同尺寸的复用缓冲则先拷贝原图再绘制
+        """
+        if out is None:
+            out = image.copy()
+        elif out is not image:
+            np.copyto(out, image)
+        if result.count == 0:
+            return out
+
+        h, w = out.shape[:2]
+        line_width = max(round((h + w) / 2 * 0.003), 2)
+        boxes = result.xyxy.astype(np.int32)
+        np.clip(boxes[:, 0::2], 0, w - 1, out=boxes[:, 0::2])
+        np.clip(boxes[:, 1::2], 0, h - 1, out=boxes[:, 1::2])
+
+        for (x1, y1, x2, y2), cls_id, conf in zip(boxes.tolist(), result.cls.tolist(), result.conf.tolist()):
+            known = 0 <= cls_id < len(self.class_colors)
+            color = self.class_colors[cls_id] if known else PLOT_COLORS['gray']
+            cv2.rectangle(out, (x1, y1), (x2, y2), color, line_width)
+            if known:
+                self._draw_label(out, x1, y1, cls_id, color, conf)
+        return out
+
+    def _draw_label(self, out: np.ndarray, x: int, y: int, cls_id: int, color: tuple, conf: float):
+        """在框左上角拼接类别名与置信度图块；上方空间不足时画在框内"""
+        top = y - self.label_height if y >= self.label_height else y
+        patches = [self._name_patches[cls_id]]
+        patches.extend(self._char_patches[(color, char)] for char in f'{conf:.2f}')
+        for patch in patches:
+            if x >= out.shape[1]:
+                break
+            ph, pw = patch.shape[:2]
+            region = out[top:top + ph, x:x + pw]
+            region[...] = patch[:region.shape[0], :region.shape[1]]
+            x += pw
+
+
+_renderer = None
+
+
+def get_renderer() -> BoxRenderer:
+    """进程内共享的渲染器（标签图块只预渲染一次）"""
+    global _renderer
+    if _renderer is None:
+        _renderer = BoxRenderer()
+    return _renderer
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+基于YOLOv8的垃圾目标检测算法 - 检测结果缓存模块
+
+文件夹浏览时来回切换图片不再重复解码和推理：检测结果以紧凑数组
+（xyxy/cls/conf）连同绘制好检测框的缩略图保存在按字节数限额的LRU缓存中。
+
+缓存键为图片文件内容哈希与模型标识（权重文件、后端/精度、推理参数）的组合，
+文件被修改或换了模型都不会命中旧结果。已哈希过的文件按 (路径, 大小, 修改时间)
+记住其键，再次访问只需一次 os.stat。
+内存超限时淘汰最久未访问的条目，配置了 Config.result_cache_dir 时淘汰的条目
+写入磁盘，之后命中时再读回内存。
+
+同一内容只计入一次统计：mark_recorded() 对每个键只返回一次 True。
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from core.detection_service import DetectionResult
+
+
+class CachedResult:
+    """一张图片的缓存检测结果"""
+    __slots__ = ('key', 'xyxy', 'cls', 'conf', 'elapsed_time', 'thumbnail', 'nbytes')
+
+    def __init__(self, key: str, xyxy: np.ndarray, cls: np.ndarray, conf: np.ndarray,
+                 elapsed_time: float, thumbnail: np.ndarray):
+        self.key = key
+        self.xyxy = xyxy
+        self.cls = cls
+        self.conf = conf
+        self.elapsed_time = elapsed_time
+        self.thumbnail = thumbnail
+        self.nbytes = xyxy.nbytes + cls.nbytes + conf.nbytes + thumbnail.nbytes
+
+    def to_result(self) -> DetectionResult:
+        """构建不含原图的检测结果（坐标为原图坐标）"""
+        return DetectionResult.from_arrays(self.xyxy, self.cls, self.conf, self.elapsed_time)
+
+
+class ResultCache:
+    """按内容哈希索引、内存限额的检测结果LRU缓存"""
+
+    def __init__(self, model_identity: str, max_mb: float = None, thumbnail_size: int = None,
+                 spill_dir: str = None):
+        """
+        :param model_identity: 模型与推理参数标识（DetectionService.model_identity）
+        :param max_mb: 内存上限（MB），默认 Config.result_cache_mb
+        :param thumbnail_size: 缩略图最长边（像素），默认 Config.result_cache_thumbnail_size
+        :param spill_dir: 淘汰条目的磁盘目录，默认 Config.result_cache_dir，None 表示不落盘
+        """
+        self.model_digest = hashlib.blake2b(model_identity.encode('utf-8'), digest_size=8).hexdigest()
+        self.max_bytes = int((max_mb if max_mb is not None else Config.result_cache_mb) * 1024 * 1024)
+        self.thumbnail_size = thumbnail_size or Config.result_cache_thumbnail_size
+        self.spill_dir = spill_dir if spill_dir is not None else Config.result_cache_dir
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+        self._entries: 'OrderedDict[str, CachedResult]' = OrderedDict()
+        self._path_keys: Dict[str, Tuple[int, int, str]] = {}
+        self._recorded = set()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+    # ---------- 缓存键 ----------
+
+    def key_for(self, path: str) -> Tuple[Optional[str], Optional[bytes]]:
+        """
+        计算图片的缓存键
+        :return: (键, 文件内容)；文件未变时直接返回记住的键，内容为 None；文件无法读取时键为 None
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None, None
+        with self._lock:
+            known = self._path_keys.get(path)
+        if known is not None and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            return known[2], None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None, None
+        key = hashlib.blake2b(data, digest_size=16).hexdigest() + self.model_digest
+        with self._lock:
+            self._path_keys[path] = (stat.st_size, stat.st_mtime_ns, key)
+        return key, data
+
+    # ---------- 读写 ----------
+
+    def get(self, key: str, count: bool = True) -> Optional[CachedResult]:
+        """
+        查找缓存，内存未命中时尝试读取磁盘
+        :param count: 计入命中率（批量检测前的预查询不计入）
+        """
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._metrics['hits'] += count
+                return entry
+        entry = self._load_spilled(key)
+        with self._lock:
+            if entry is None:
+                self._metrics['misses'] += count
+                return None
+            self._metrics['disk_hits'] += count
+        self._insert(entry)
+        return entry
+
+    def put(self, key: str, result: DetectionResult, plotted_image: np.ndarray) -> CachedResult:
+        """缓存检测结果，plotted_image 缩放为缩略图后保存"""
+        xyxy, cls, conf = result.to_arrays()
+        entry = CachedResult(key, xyxy, cls, conf, result.elapsed_time, self._thumbnail(plotted_image))
+        self._insert(entry)
+        return entry
+
+    def _thumbnail(self, image: np.ndarray) -> np.ndarray:
+        h, w = image.shape[:2]
+        scale = self.thumbnail_size / max(h, w)
+        if scale >= 1:
+            return image
+        return cv2.resize(image, (max(1, round(w * scale)), max(1, round(h * scale))),
+                          interpolation=cv2.INTER_AREA)
+
+    def _insert(self, entry: CachedResult):
+        evicted = []
+        with self._lock:
+            old = self._entries.pop(entry.key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[entry.key] = entry
+            self._bytes += entry.nbytes
+            # 至少保留刚放入的条目
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, victim = self._entries.popitem(last=False)
+                self._bytes -= victim.nbytes
+                self._metrics['evictions'] += 1
+                evicted.append(victim)
+        for victim in evicted:
+            self._spill(victim)
+
+    # ---------- 磁盘 ----------
+
+    def _spill_path(self, key: str) -> str:
+        return os.path.join(self.spill_dir, key[:2], key + '.npz')
+
+    def _spill(self, entry: CachedResult):
+        """淘汰的条目写入磁盘，缩略图以JPEG编码保存"""
+        if not self.spill_dir:
+            return
+        path = self._spill_path(entry.key)
+        if os.path.exists(path):
+            return
+        try:
+            ok, encoded = cv2.imencode('.jpg', entry.thumbnail, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            if not ok:
+                return
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_file = path + '.tmp'
+            with open(tmp_file, 'wb') as f:
+                np.savez(f, xyxy=entry.xyxy, cls=entry.cls, conf=entry.conf,
+                         elapsed_time=np.float64(entry.elapsed_time), thumbnail=encoded)
+            os.replace(tmp_file, path)
+        except OSError as e:
+            print(f"[WARNING] 检测结果缓存写入磁盘失败: {e}")
+
+    def _load_spilled(self, key: str) -> Optional[CachedResult]:
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                thumbnail = cv2.imdecode(data['thumbnail'], cv2.IMREAD_COLOR)
+                if thumbnail is None:
+                    return None
+                return CachedResult(key, data['xyxy'], data['cls'], data['conf'],
+                                    float(data['elapsed_time']), thumbnail)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARNING] 检测结果缓存读取失败，重新检测: {path} ({e})")
+            return None
+
+    # ---------- 统计去重 ----------
+
+    def mark_recorded(self, key: str) -> bool:
+        """标记该内容已计入统计，首次标记返回 True"""
+        with self._lock:
+            if key in self._recorded:
+                return False
+            self._recorded.add(key)
+            return True
+
+    def reset_recorded(self):
+        """统计清空后重新计数"""
+        with self._lock:
+            self._recorded.clear()
+
+    def metrics(self) -> Dict[str, float]:
+        """命中率与占用"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['entries'] = len(self._entries)
+            metrics['bytes'] = self._bytes
+        lookups = metrics['hits'] + metrics['disk_hits'] + metrics['misses']
+        metrics['hit_rate'] = (metrics['hits'] + metrics['disk_hits']) / lookups if lookups else 0.0
+        return metrics
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+基于YOLOv8的垃圾目标检测算法 - 统计数据导出
+
+从统计存储中按ID顺序分块读取原始记录，边读边写，内存中只保留一块：
+- CSV：每次检测一行，通过 csv 模块写出
+- 列式：每个检测项一行，安装了 pyarrow 时写 Parquet（无 parquet 支持时写 Arrow IPC），
+  否则写压缩的 NPZ；输出为目录，每块一个 part 文件
+
+支持日期范围过滤。每写完一块会在输出路径旁保存 .progress 断点，
+中断后以 resume 方式重新导出会从断点继续，不重复也不遗漏。
+超过 Config.statistics_raw_retention_days 的原始记录已汇总删除，导出范围与之重叠时
+给出警告（这些日期只能通过 StatisticsManager.get_period_statistics 按小时/天查询）。
+
+用法:
+    python -m core.statistics_export --start 2026-09-01 --end 2026-09-30 --output september.csv
+    python -m core.statistics_export --format parquet --output september_items --resume
+"""
+import os
+import csv
+import sys
+import json
+import glob
+import argparse
+from datetime import datetime
+from typing import Dict, List, Callable, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+CSV_HEADER = ['记录ID', '日期', '时间', '检测数量', '类别详情', '垃圾分类', '检测耗时(ms)']
+
+# 列式导出的列（每个检测项一行）
+ITEM_COLUMNS = ('record_id', 'date', 'time', 'class_id', 'name', 'category', 'confidence', 'elapsed_ms')
+
+# 列式格式对应的 part 文件扩展名
+COLUMNAR_FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+    'npz': '.npz',
+}
+
+
+def default_columnar_format() -> str:
+    """pyarrow 可用时优先 Parquet，其次 Arrow IPC，否则 NPZ"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return 'npz'
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return 'parquet'
+    except ImportError:
+        return 'arrow'
+
+
+class StatisticsExporter:
+    """分块流式导出统计记录"""
+
+    def __init__(self, store, start_date: str = None, end_date: str = None,
+                 chunk_size: int = None, progress: Callable[[int], None] = None):
+        """
+        :param store: core.statistics_store 中的存储对象
+        :param start_date: 起始日期 'YYYY-MM-DD'（含），默认不限
+        :param end_date: 结束日期（含），默认不限
+        :param chunk_size: 每块记录数，默认 Config.statistics_export_chunk
+        :param progress: 每写完一块后以已导出记录数调用
+        """
+        self.store = store
+        self.start_date = start_date or '0000-01-01'
+        self.end_date = end_date or '9999-12-31'
+        self.chunk_size = chunk_size or Config.statistics_export_chunk
+        self.progress = progress
+
+    # ---------- 断点 ----------
+
+    def _checkpoint_path(self, path: str) -> str:
+        return path.rstrip('/\\') + '.progress'
+
+    def _load_checkpoint(self, path: str, kind: str) -> Optional[Dict]:
+        """读取与本次导出参数一致的断点"""
+        checkpoint_path = self._checkpoint_path(path)
+        if not os.path.exists(checkpoint_path):
+            return None
+        try:
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (ValueError, IOError):
+            return None
+        if (state.get('kind'), state.get('start_date'), state.get('end_date')) != \
+                (kind, self.start_date, self.end_date):
+            print(f"[WARNING] 断点参数与本次导出不一致，重新导出: {checkpoint_path}")
+            return None
+        return state
+
+    def _save_checkpoint(self, path: str, state: Dict):
+        checkpoint_path = self._checkpoint_path(path)
+        tmp_file = checkpoint_path + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_file, checkpoint_path)
+
+    def _remove_checkpoint(self, path: str):
+        """导出完成后删除断点"""
+        checkpoint_path = self._checkpoint_path(path)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def _new_state(self, kind: str) -> Dict:
+        return {'kind': kind, 'start_date': self.start_date, 'end_date': self.end_date,
+                'last_id': 0, 'rows': 0}
+
+    def rolled_up_overlap(self) -> Optional[tuple]:
+        """导出范围内原始记录已被汇总删除的日期范围，没有时为 None"""
+        span = self.store.rollup_span()
+        if span is None:
+            return None
+        first, last = max(span[0], self.start_date), min(span[1], self.end_date)
+        return (first, last) if first <= last else None
+
+    def _warn_rolled_up(self) -> Optional[tuple]:
+        overlap = self.rolled_up_overlap()
+        if overlap is not None:
+            print(f"[WARNING] {overlap[0]} 至 {overlap[1]} 的原始记录已汇总删除，导出结果不含这些日期的逐条记录"
+                  f"（按天汇总数据可通过 get_period_statistics 查询）")
+        return overlap
+
+    def _chunks(self, state: Dict):
+        return self.store.iter_chunks(self.start_date, self.end_date,
+                                      after_id=state['last_id'], chunk_size=self.chunk_size)
+
+    def _advance(self, path: str, state: Dict, chunk: List[Dict]):
+        """一块写完后更新并保存断点"""
+        state['last_id'] = chunk[-1]['id']
+        state['rows'] += len(chunk)
+        self._save_checkpoint(path, state)
+        if self.progress is not None:
+            self.progress(state['rows'])
+
+    # ---------- CSV ----------
+
+    @staticmethod
+    def _csv_row(record: Dict) -> list:
+        items = record.get('items', [])
+        return [
+            record['id'], record['date'], record['time'], record['total_count'],
+            ';'.join(item['name'] for item in items),
+            ';'.join(item['category'] for item in items),
+            f"{record['elapsed_time'] * 1000:.1f}",
+        ]
+
+    def export_csv(self, path: str, resume: bool = False) -> Dict:
+        """
+        导出为CSV（每次检测一行）
+        :return: {'path', 'rows', 'resumed', 'rolled_up'}，rolled_up 为范围内已汇总删除的日期范围
+        """
+        rolled_up = self._warn_rolled_up()
+        state = self._load_checkpoint(path, 'csv') if resume else None
+        resumed = state is not None and os.path.exists(path)
+        if resumed:
+            # 截掉断点之后可能写了一半的内容，追加模式下不会再写BOM
+            os.truncate(path, state['offset'])
+            f = open(path, 'a', newline='', encoding='utf-8-sig')
+        else:
+            state = self._new_state('csv')
+            f = open(path, 'w', newline='', encoding='utf-8-sig')
+        with f:
+            writer = csv.writer(f)
+            if not resumed:
+                writer.writerow(CSV_HEADER)
+            for chunk in self._chunks(state):
+                writer.writerows(self._csv_row(record) for record in chunk)
+                f.flush()
+                state['offset'] = f.tell()
+                self._advance(path, state, chunk)
+        self._remove_checkpoint(path)
+        return {'path': path, 'rows': state['rows'], 'resumed': resumed, 'rolled_up': rolled_up}
+
+    # ---------- 列式 ----------
+
+    @staticmethod
+    def _item_columns(chunk: List[Dict]) -> Dict[str, np.ndarray]:
+        """将一块记录展开为每个检测项一行的列数组"""
+        rows = [
+            (record['id'], record['date'], record['time'], item['class_id'], item['name'],
+             item['category'], item['confidence'], record['elapsed_time'] * 1000)
+            for record in chunk for item in record.get('items', [])
+        ]
+        columns = list(zip(*rows)) if rows else [()] * len(ITEM_COLUMNS)
+        dtypes = (np.int64, str, str, np.int32, str, str, np.float32, np.float32)
+        return {name: np.asarray(values, dtype=dtype)
+                for name, values, dtype in zip(ITEM_COLUMNS, columns, dtypes)}
+
+    @staticmethod
+    def _write_part(part_path: str, columns: Dict[str, np.ndarray], fmt: str):
+        """写入一个 part 文件（先写临时文件再替换，中断时不会留下半个文件）"""
+        tmp_file = part_path + '.tmp'
+        if fmt == 'npz':
+            with open(tmp_file, 'wb') as f:
+                np.savez_compressed(f, **columns)
+        else:
+            import pyarrow as pa
+            table = pa.table({name: pa.array(values.tolist() if values.dtype.kind == 'U' else values)
+                              for name, values in columns.items()})
+            if fmt == 'parquet':
+                import pyarrow.parquet as pq
+                pq.write_table(table, tmp_file)
+            else:
+                with pa.OSFile(tmp_file, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as ipc_writer:
+                    ipc_writer.write_table(table)
+        os.replace(tmp_file, part_path)
+
+    def export_items(self, path: str, fmt: str = None, resume: bool = False) -> Dict:
+        """
+        导出为列式格式（每个检测项一行），path 为输出目录
+        :param fmt: 'parquet'、'arrow' 或 'npz'，默认按是否安装 pyarrow 选择
+        :return: {'path', 'rows', 'parts', 'format', 'resumed', 'rolled_up'}
+        """
+        fmt = fmt or default_columnar_format()
+        if fmt not in COLUMNAR_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}，可选: {', '.join(COLUMNAR_FORMATS)}")
+        rolled_up = self._warn_rolled_up()
+        suffix = COLUMNAR_FORMATS[fmt]
+        state = self._load_checkpoint(path, fmt) if resume else None
+        resumed = state is not None
+        os.makedirs(path, exist_ok=True)
+        if not resumed:
+            state = self._new_state(fmt)
+            state['parts'] = 0
+            for old_part in glob.glob(os.path.join(path, 'part-*')):
+                os.remove(old_part)
+
+        for chunk in self._chunks(state):
+            part_path = os.path.join(path, f"part-{state['parts']:05d}{suffix}")
+            self._write_part(part_path, self._item_columns(chunk), fmt)
+            state['parts'] += 1
+            self._advance(path, state, chunk)
+        self._remove_checkpoint(path)
+        return {'path': path, 'rows': state['rows'], 'parts': state['parts'],
+                'format': fmt, 'resumed': resumed, 'rolled_up': rolled_up}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='导出检测统计数据')
+    parser.add_argument('--start', type=str, default=None, help='起始日期 YYYY-MM-DD（含）')
+    parser.add_argument('--end', type=str, default=None, help='结束日期 YYYY-MM-DD（含）')
+    parser.add_argument('--format', type=str, default='csv', choices=['csv', 'auto'] + list(COLUMNAR_FORMATS),
+                        help='csv 为每次检测一行；parquet/arrow/npz 为每个检测项一行的列式目录，auto 按环境选择')
+    parser.add_argument('--output', type=str, default=None, help='输出路径，默认 Config.save_path 下按时间命名')
+    parser.add_argument('--backend', type=str, default=None, help='统计存储后端，默认 Config.statistics_backend')
+    parser.add_argument('--resume', action='store_true', help='从上次中断的断点继续导出')
+    args = parser.parse_args(argv)
+
+    from core.statistics_store import open_store
+    store = open_store(args.backend)
+    name = f'statistics_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+    exporter = StatisticsExporter(store, args.start, args.end,
+                                  progress=lambda rows: print(f"\r[INFO] 已导出 {rows} 条记录", end=''))
+    try:
+        if args.format == 'csv':
+            summary = exporter.export_csv(args.output or os.path.join(Config.save_path, name + '.csv'),
+                                          resume=args.resume)
+        else:
+            fmt = None if args.format == 'auto' else args.format
+            summary = exporter.export_items(args.output or os.path.join(Config.save_path, name),
+                                            fmt=fmt, resume=args.resume)
+    finally:
+        store.close()
+    print(f"\n[INFO] 导出完成: {summary['path']}（{summary['rows']} 条记录）")
+
+
+if __name__ == '__main__':
+    main()
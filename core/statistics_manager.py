@@ -4,53 +4,82 @@
 基于YOLOv8的垃圾目标检测算法 - 统计管理模块
 """
 import os
-import json
+from collections import deque
 from datetime import datetime
-from collections import defaultdict
 from typing import List, Dict, Any
 import sys
-import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from core.statistics_store import open_store, StatisticsCounters
+from core.statistics_writer import StatisticsWriter
+from core.statistics_export import StatisticsExporter
 
 
 class StatisticsManager:
-    """检测统计管理类"""
-    
-    def __init__(self, data_file: str = None):
-        self.data_file = data_file or os.path.join(Config.save_path, 'statistics.json')
-        self.records: List[Dict] = []
-        self._ensure_directory()
-        self._load_records()
-    
-    def _ensure_directory(self):
-        """确保保存目录存在"""
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-    
-    def _load_records(self):
-        """加载历史记录"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    self.records = json.load(f)
-            except (json.JSONDecodeError, IOError):
-                self.records = []
-        else:
-            self.records = []
-    
-    def _save_records(self):
-        """保存记录到文件"""
-        try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.records, f, ensure_ascii=False, indent=2)
-        except IOError as e:
-            print(f"[ERROR] 保存统计记录失败: {e}")
+    """
+    检测统计管理类
+    
+    持久化由 core.statistics_store 中的存储后端完成（Config.statistics_backend）：
+    journal 为追加写入的JSONL日志，sqlite 为WAL模式的SQLite数据库。
+    统计查询读取加载时构建一次、之后随增删记录增量更新的计数。
+    记录由后台线程（StatisticsWriter）批量写入存储，add_record 不等待磁盘。
+    多个检测实例可共享同一数据目录：写入线程定期读入其他实例新写入的记录，
+    其他实例清空记录后由写入线程重新从存储构建计数；查询统计时只合并写入线程
+    已准备好的结果，不访问存储，界面线程不会等待磁盘或文件锁。
+    """
+    
+    # 查询最近记录、导出前等待队列中记录写入的最长时间（秒）
+    RECENT_FLUSH_TIMEOUT = 1.0
+    EXPORT_FLUSH_TIMEOUT = 10.0
+    # 清空记录时等待写入队列空位的最长时间（秒）
+    CLEAR_TIMEOUT = 1.0
+    
+    def __init__(self, data_file: str = None, backend: str = None):
+        self.store = open_store(backend, data_file)
+        self.data_file = self.store.path
+        self.counters = self.store.load_counters()
+        self.writer = StatisticsWriter(self.store)
+        self._submitted = 0
+        self._queued = deque()  # (提交序号, 记录)：写入线程尚未取出的本实例记录
+    
+    def close(self):
+        """写完队列中的记录并关闭存储"""
+        self.writer.close()
+        self.store.close()
+        metrics = self.writer.metrics()
+        if metrics['written'] or metrics['dropped'] or metrics['failed']:
+            print(f"[INFO] 统计记录已写入 {metrics['written']} 条（{metrics['flushes']} 批，"
+                  f"平均 {metrics['avg_flush_ms']:.1f}ms/批），丢弃 {metrics['dropped']} 条，"
+                  f"写入失败 {metrics['failed']} 条")
+    
+    def get_writer_metrics(self) -> Dict[str, Any]:
+        """后台写入的队列深度、丢弃数与批量写入耗时"""
+        return self.writer.metrics()
+    
+    def _drop_dequeued(self, dequeued: int):
+        """丢弃写入线程已取出的记录"""
+        while self._queued and self._queued[0][0] <= dequeued:
+            self._queued.popleft()
+    
+    def _merge_foreign_records(self):
+        """合并写入线程读入的其他进程记录，或换用其重建的计数"""
+        records, rebuilt = self.writer.take_merged()
+        if rebuilt is not None:
+            counters, dequeued = rebuilt
+            # 重建之后才取出的本实例记录不在重建的计数中
+            self._drop_dequeued(dequeued)
+            for _, record in self._queued:
+                counters.add(record)
+            self.counters = counters
+        for record in records:
+            self.counters.add(record)
+        self._drop_dequeued(self.writer.dequeued)
     
     def add_record(self, detection_result) -> Dict:
         """
         添加检测记录
         :param detection_result: DetectionResult 对象
-        :return: 新添加的记录
+        :return: 新添加的记录（ID在写入存储时分配）；写入队列已满时返回 None
         """
         if not detection_result.has_detections:
             return None
@@ -67,7 +96,7 @@ class StatisticsManager:
             })
         
         record = {
-            'id': len(self.records) + 1,
+            'id': None,  # 由存储后端分配
             'timestamp': datetime.now().isoformat(),
             'date': datetime.now().strftime('%Y-%m-%d'),
             'time': datetime.now().strftime('%H:%M:%S'),
@@ -76,8 +105,13 @@ class StatisticsManager:
             'elapsed_time': detection_result.elapsed_time
         }
         
-        self.records.append(record)
-        self._save_records()
+        if not self.writer.submit(record):
+            print("[WARNING] 统计写入队列已满，本条记录未保存")
+            return None
+        self.counters.add(record)
+        self._submitted += 1
+        self._queued.append((self._submitted, record))
+        self._drop_dequeued(self.writer.dequeued)
         return record
     
     def get_category_statistics(self) -> Dict[str, int]:
@@ -85,95 +119,113 @@ class StatisticsManager:
         获取按垃圾分类的统计
         :return: {'厨余垃圾': 10, '可回收物': 5, ...}
         """
-        stats = defaultdict(int)
-        for record in self.records:
-            for item in record.get('items', []):
-                category = item.get('category', '其他垃圾')
-                stats[category] += 1
-        return dict(stats)
+        self._merge_foreign_records()
+        return dict(self.counters.category)
     
     def get_class_statistics(self) -> Dict[str, int]:
         """
         获取按具体类别的统计
         :return: {'果皮': 10, '易拉罐': 5, ...}
         """
-        stats = defaultdict(int)
-        for record in self.records:
-            for item in record.get('items', []):
-                name = item.get('name', '未知')
-                stats[name] += 1
-        return dict(stats)
+        self._merge_foreign_records()
+        return dict(self.counters.classes)
     
     def get_daily_statistics(self) -> Dict[str, int]:
         """
         获取每日检测次数统计
         :return: {'2024-01-01': 10, '2024-01-02': 15, ...}
         """
-        stats = defaultdict(int)
-        for record in self.records:
-            date = record.get('date', 'unknown')
-            stats[date] += record.get('total_count', 0)
-        return dict(stats)
+        self._merge_foreign_records()
+        return dict(self.counters.daily_items)
     
     def get_today_statistics(self) -> Dict[str, Any]:
         """
         获取今日统计摘要
         """
+        self._merge_foreign_records()
         today = datetime.now().strftime('%Y-%m-%d')
-        today_records = [r for r in self.records if r.get('date') == today]
-        
-        total_items = 0
-        category_counts = defaultdict(int)
-        
-        for record in today_records:
-            for item in record.get('items', []):
-                total_items += 1
-                category_counts[item.get('category', '其他垃圾')] += 1
-        
+        detection_count, total_items, category_counts = self.counters.day_summary(today)
         return {
             'date': today,
-            'detection_count': len(today_records),
+            'detection_count': detection_count,
             'total_items': total_items,
-            'category_breakdown': dict(category_counts)
+            'category_breakdown': category_counts
         }
     
     def get_total_statistics(self) -> Dict[str, Any]:
         """
         获取总体统计摘要
         """
-        total_items = sum(r.get('total_count', 0) for r in self.records)
+        self._merge_foreign_records()
         return {
-            'total_detections': len(self.records),
-            'total_items': total_items,
+            'total_detections': self.counters.total_detections,
+            'total_items': self.counters.total_items,
             'category_statistics': self.get_category_statistics(),
             'class_statistics': self.get_class_statistics()
         }
     
+    def get_period_statistics(self, start_date: str = None, end_date: str = None,
+                              period: str = 'day') -> Dict[str, Dict]:
+        """
+        获取时间段内按小时/天汇总的统计，超过保留期的数据来自汇总桶
+        :param start_date: 起始日期 'YYYY-MM-DD'（含），默认不限
+        :param end_date: 结束日期（含），默认不限
+        :param period: 'hour' 或 'day'
+        :return: {'2024-01-01': {'detections': 10, 'items': 25, 'categories': {...}, 'classes': {...}}, ...}
+        """
+        return self.store.query_range(start_date or '0000-01-01', end_date or '9999-12-31', period)
+    
     def get_recent_records(self, limit: int = 10) -> List[Dict]:
         """
-        获取最近的检测记录
+        获取最近的检测记录（最多等待 RECENT_FLUSH_TIMEOUT 秒让队列中的记录写入）
         """
-        return self.records[-limit:][::-1]
+        self.writer.flush(self.RECENT_FLUSH_TIMEOUT)
+        return self.store.recent(limit)
+    
+    def clear_records(self) -> bool:
+        """清空所有记录；写入队列已满、未能在 CLEAR_TIMEOUT 秒内提交清空时返回 False"""
+        if not self.writer.clear(self.CLEAR_TIMEOUT):
+            print("[WARNING] 统计写入队列已满，清空操作未执行")
+            return False
+        self.counters = StatisticsCounters()
+        self._queued.clear()
+        return True
     
-    def clear_records(self):
-        """清空所有记录"""
-        self.records = []
-        self._save_records()
+    def _flush_for_export(self):
+        """导出前等待队列中的记录写入"""
+        if not self.writer.flush(self.EXPORT_FLUSH_TIMEOUT):
+            print("[WARNING] 等待统计记录写入超时，队列中尚未写入的记录不在本次导出中")
     
-    def export_to_csv(self, export_path: str = None) -> str:
+    def export_to_csv(self, export_path: str = None, start_date: str = None, end_date: str = None,
+                      resume: bool = False, progress=None) -> str:
         """
-        导出统计数据为CSV
+        分块流式导出统计数据为CSV
+        :param start_date: 起始日期 'YYYY-MM-DD'（含），默认不限
+        :param end_date: 结束日期（含），默认不限
+        :param resume: 从上次中断的断点继续
+        :param progress: 每写完一块后以已导出记录数调用
         """
         export_path = export_path or os.path.join(Config.save_path, f'statistics_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv')
         
         try:
-            with open(export_path, 'w', encoding='utf-8-sig') as f:
-                f.write('记录ID,日期,时间,检测数量,类别详情,垃圾分类,检测耗时(ms)\n')
-                for record in self.records:
-                    items_str = ';'.join([item['name'] for item in record.get('items', [])])
-                    categories_str = ';'.join([item['category'] for item in record.get('items', [])])
-                    f.write(f"{record['id']},{record['date']},{record['time']},{record['total_count']},{items_str},{categories_str},{record['elapsed_time']*1000:.1f}\n")
-            return export_path
+            self._flush_for_export()
+            exporter = StatisticsExporter(self.store, start_date, end_date, progress=progress)
+            return exporter.export_csv(export_path, resume=resume)['path']
         except IOError as e:
             print(f"[ERROR] 导出CSV失败: {e}")
             return None
+    
+    def export_items(self, export_path: str = None, start_date: str = None, end_date: str = None,
+                     fmt: str = None, resume: bool = False, progress=None) -> str:
+        """
+        按检测项导出列式数据（Parquet/Arrow IPC，未安装pyarrow时为NPZ），export_path 为输出目录
+        """
+        export_path = export_path or os.path.join(Config.save_path, f'statistics_items_{datetime.now().strftime("%Y%m%d_%H%M%S")}')
+        
+        try:
+            self._flush_for_export()
+            exporter = StatisticsExporter(self.store, start_date, end_date, progress=progress)
+            return exporter.export_items(export_path, fmt=fmt, resume=resume)['path']
+        except IOError as e:
+            print(f"[ERROR] 导出检测项数据失败: {e}")
+            return None
@@ -0,0 +1,912 @@
+# -*- coding: utf-8 -*-
+"""
+基于YOLOv8的垃圾目标检测算法 - 统计存储模块
+
+StatisticsManager 的持久化后端，由 Config.statistics_backend 选择:
+- journal: 追加写入的JSONL日志（statistics.jsonl），记录常驻内存
+- sqlite:  标准库 sqlite3（WAL模式，statistics.db），检测项单独成表并按
+           日期/分类/类别建索引，启动时的统计由SQL聚合完成
+
+两种后端接口一致，首次运行时都会迁移旧版 statistics.json。
+
+超过 Config.statistics_raw_retention_days 天的原始记录会被汇总为按小时、按天的
+分类/类别计数桶后删除（小时桶保留 Config.statistics_hourly_retention_days 天，
+天桶永久保留），长时间运行时原始数据量保持有界，跨月查询直接读取汇总桶。
+"""
+import os
+import json
+import sqlite3
+import threading
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import List, Dict, Iterator, Optional, Tuple
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 各后端默认文件名
+STORE_FILES = {
+    'journal': 'statistics.jsonl',
+    'sqlite': 'statistics.db',
+}
+LEGACY_FILE = 'statistics.json'
+
+# 汇总粒度
+PERIODS = ('hour', 'day')
+
+
+def period_key(record: Dict, period: str) -> str:
+    """记录所属汇总桶的起始时间：小时桶 'YYYY-MM-DD HH'，天桶 'YYYY-MM-DD'"""
+    if period == 'hour':
+        return f"{record['date']} {record['time'][:2]}"
+    return record['date']
+
+
+def new_bucket() -> Dict:
+    """空汇总桶：检测次数、检测项目数、分类计数、类别计数"""
+    return {'detections': 0, 'items': 0, 'categories': {}, 'classes': {}}
+
+
+def add_to_bucket(bucket: Dict, record: Dict):
+    """将一条原始记录计入汇总桶"""
+    bucket['detections'] += 1
+    bucket['items'] += record.get('total_count', 0)
+    categories, classes = bucket['categories'], bucket['classes']
+    for item in record.get('items', []):
+        category = item.get('category', '其他垃圾')
+        name = item.get('name', '未知')
+        categories[category] = categories.get(category, 0) + 1
+        classes[name] = classes.get(name, 0) + 1
+
+
+def merge_bucket(target: Dict, bucket: Dict):
+    """将汇总桶累加到 target"""
+    target['detections'] += bucket['detections']
+    target['items'] += bucket['items']
+    for field in ('categories', 'classes'):
+        counts = target[field]
+        for key, count in bucket[field].items():
+            counts[key] = counts.get(key, 0) + count
+
+
+def retention_cutoffs() -> Tuple[str, str]:
+    """
+    返回 (原始记录保留起始日期, 小时桶保留起始日期)，早于该日期的数据被汇总/删除；
+    对应保留天数 <= 0 时为 None（不清理）
+    """
+    today = date.today()
+    raw_days = Config.statistics_raw_retention_days
+    hourly_days = Config.statistics_hourly_retention_days
+    raw_before = (today - timedelta(days=raw_days)).isoformat() if raw_days > 0 else None
+    hourly_before = (today - timedelta(days=hourly_days)).isoformat() if hourly_days > 0 else None
+    return raw_before, hourly_before
+
+
+def _read_entries(path: str, offset: int = 0) -> Tuple[List[Dict], int, int]:
+    """
+    从 offset 处开始读取完整的日志行
+    :return: (日志条目, 损坏行数, 读到的字节位置)；末行未写完整时不计入
+    """
+    entries = []
+    corrupt = 0
+    position = offset
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # 末行未写完整
+            position += len(line)
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # 中间行损坏则跳过，继续读取后续记录
+                print(f"[WARNING] 跳过损坏的统计记录行: {line[:80]!r}")
+                corrupt += 1
+    return entries, corrupt, position
+
+
+def read_journal(path: str) -> List[Dict]:
+    """读取JSONL日志中的有效记录"""
+    records = []
+    for entry in _read_entries(path)[0]:
+        op = entry.get('op')
+        if op == JournalStore.CLEAR_OP['op']:
+            records = []
+        elif op is None:
+            records.append(entry)
+    return records
+
+
+def read_legacy_records(path: str) -> List[Dict]:
+    """读取旧版整体序列化的 statistics.json"""
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            pass
+    return []
+
+
+def _retire(path: str):
+    """迁移完成后将旧文件改名保留"""
+    os.replace(path, path + '.bak')
+
+
+class StatisticsCounters:
+    """
+    增量维护的统计计数：按分类、按类别、按日期的累计值
+    
+    每条新记录只更新对应的几个计数，仪表盘刷新只读字典，开销与历史量无关。
+    今日统计按日期键查询，跨过零点后自然落到新日期下。
+    """
+
+    def __init__(self):
+        self.category = Counter()
+        self.classes = Counter()
+        self.daily_detections = Counter()
+        self.daily_items = Counter()
+        self.daily_category = defaultdict(Counter)
+        self.total_detections = 0
+        self.total_items = 0
+
+    def add(self, record: Dict):
+        """计入一条记录"""
+        date = record.get('date', 'unknown')
+        self.total_detections += 1
+        self.total_items += record.get('total_count', 0)
+        self.daily_detections[date] += 1
+        self.daily_items[date] += record.get('total_count', 0)
+        day_category = self.daily_category[date]
+        for item in record.get('items', []):
+            category = item.get('category', '其他垃圾')
+            self.category[category] += 1
+            self.classes[item.get('name', '未知')] += 1
+            day_category[category] += 1
+
+    def add_bucket(self, day: str, bucket: Dict):
+        """计入一个已汇总的天桶"""
+        self.total_detections += bucket['detections']
+        self.total_items += bucket['items']
+        self.daily_detections[day] += bucket['detections']
+        self.daily_items[day] += bucket['items']
+        self.category.update(bucket['categories'])
+        self.classes.update(bucket['classes'])
+        self.daily_category[day].update(bucket['categories'])
+
+    def day_summary(self, day: str) -> Tuple[int, int, Dict[str, int]]:
+        """返回指定日期的 (检测次数, 检测项目数, 分类明细)"""
+        category_counts = self.daily_category.get(day, {})
+        return self.daily_detections.get(day, 0), sum(category_counts.values()), dict(category_counts)
+
+
+class FileLock:
+    """
+    可重入的跨进程文件锁（POSIX 使用 fcntl.flock，Windows 使用 msvcrt.locking）
+
+    同一个锁对象只在持有存储线程锁时使用，嵌套进入时不重复加锁。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            self._file = open(self.path, 'a+b')
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            else:
+                self._file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue  # LK_LOCK 重试约10秒后仍未获得锁时抛出，继续等待
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+            self._file = None
+
+
+class JournalStore:
+    """
+    追加写入的JSONL日志存储
+
+    新增记录只写一行，按批次 fsync；清空操作写入一条 clear 标记，失效行累积到
+    阈值后压缩重写。进程崩溃导致的末行截断在下次加载时自动截掉。
+    汇总桶保存在旁边的 *_rollup.json 中，其中的 rolled_until_id（不超过它的ID均已汇总）
+    与 rolled_ids（ID不连续的已汇总记录）标记已汇总的记录，即使汇总后、压缩前进程退出，
+    重新加载时也不会重复计数。
+
+    多个进程（多个检测工位、批量检测任务）可以共享同一个数据目录：所有写操作都在
+    跨进程文件锁内进行，写入前先读入其他进程追加的日志尾部，ID在锁内分配，单调且
+    不重复；poll() 取出其他进程新写入的记录用于合并统计。日志被其他进程压缩替换
+    （inode 变化或文件变短）或清空时整体重新加载。
+    """
+
+    # 清空标记
+    CLEAR_OP = {'op': 'clear'}
+    # 压缩后写在日志首行的元信息（下一个ID），保证清空、压缩后ID也不回退
+    META_OP = 'meta'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rollup_path = os.path.splitext(path)[0] + '_rollup.json'
+        self.records: List[Dict] = []
+        self.rollups = self._empty_rollups()
+        self._lock = threading.Lock()  # 后台写入线程与查询线程共享记录和汇总桶
+        self._file_lock = FileLock(path + '.lock')
+        self._journal = None
+        self._dead_lines = 0  # 已失效（被clear覆盖或损坏）的日志行数
+        self._unsynced = 0    # 已写入但未fsync的行数
+        self._next_id = 1
+        self._offset = 0      # 已读入的日志字节数
+        self._inode = None
+        self._foreign: List[Dict] = []  # 其他进程写入、尚未被 poll 取走的记录
+        self._reset_pending = False     # 已整体重新加载、尚未通知 poll 调用方
+        with self._lock, self._file_lock:
+            self._load()
+
+    @staticmethod
+    def _empty_rollups(rolled_until_id: int = 0) -> Dict:
+        return {'rolled_until_id': rolled_until_id, 'hour': {}, 'day': {}}
+
+    def _read_rollups(self) -> Dict:
+        if os.path.exists(self.rollup_path):
+            with open(self.rollup_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return self._empty_rollups()
+
+    def _load(self):
+        """加载历史记录（调用方持有文件锁），首次运行时从旧版 statistics.json 迁移"""
+        self.rollups = self._read_rollups()
+        self.records = []
+        self._dead_lines = 0
+        self._next_id = 1
+        legacy_file = os.path.join(os.path.dirname(self.path), LEGACY_FILE)
+        if not os.path.exists(self.path):
+            self._apply(read_legacy_records(legacy_file))
+            self._rewrite_journal()
+            if self.records:
+                _retire(legacy_file)
+                print(f"[INFO] 已迁移 {len(self.records)} 条统计记录: {legacy_file}")
+        else:
+            entries, self._dead_lines, valid_size = _read_entries(self.path)
+            if valid_size < os.path.getsize(self.path):
+                # 持有文件锁时不会有其他进程正在写入，不完整的末行只可能是崩溃遗留
+                print(f"[WARNING] 统计日志末尾不完整，已截断: {self.path}")
+                with open(self.path, 'r+b') as f:
+                    f.truncate(valid_size)
+            self._apply(entries)
+            rolled_until_id = self.rollups['rolled_until_id']
+            rolled_ids = set(self.rollups.get('rolled_ids', ()))
+            if rolled_until_id or rolled_ids:
+                kept = [record for record in self.records
+                        if record.get('id', 0) > rolled_until_id and record.get('id') not in rolled_ids]
+                self._dead_lines += len(self.records) - len(kept)
+                self.records = kept
+            self._next_id = max(self._next_id, rolled_until_id + 1)
+            if self._dead_lines >= Config.statistics_compact_threshold:
+                self._rewrite_journal()
+            else:
+                self._open_journal()
+
+    def _apply(self, entries: List[Dict]) -> List[Dict]:
+        """将日志条目应用到内存中的记录，返回新增的记录"""
+        added = []
+        for entry in entries:
+            op = entry.get('op')
+            if op == self.CLEAR_OP['op']:
+                self._dead_lines += len(self.records) + 1
+                self.records = []
+                added = []
+            elif op == self.META_OP:
+                self._next_id = max(self._next_id, entry['next_id'])
+            else:
+                self.records.append(entry)
+                added.append(entry)
+                self._next_id = max(self._next_id, entry.get('id', 0) + 1)
+        return added
+
+    def _refresh(self):
+        """读入其他进程追加的日志尾部（调用方持有 self._lock）"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._reload()
+            return
+        if stat.st_size == self._offset:
+            return
+        entries, corrupt, self._offset = _read_entries(self.path, self._offset)
+        self._dead_lines += corrupt
+        if any(entry.get('op') == self.CLEAR_OP['op'] for entry in entries):
+            # 其他进程清空了记录和汇总桶
+            self._reload()
+            return
+        self._foreign.extend(self._apply(entries))
+
+    def _reload(self):
+        """日志被其他进程替换或清空时整体重新加载"""
+        with self._file_lock:
+            self._load()
+        self._foreign = []
+        self._reset_pending = True
+
+    def _open_journal(self):
+        """以追加模式（重新）打开日志，并记录当前的文件标识与长度"""
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = open(self.path, 'a', encoding='utf-8')
+        self._unsynced = 0
+        stat = os.fstat(self._journal.fileno())
+        self._inode, self._offset = stat.st_ino, stat.st_size
+
+    def _append_entries(self, entries: List[Dict]):
+        """
+        追加日志行（调用方持有文件锁），达到批次大小时 fsync
+        写入失败时截掉本次写入的部分行后抛出 OSError，日志保持写入前的状态
+        """
+        start = self._offset
+        try:
+            for entry in entries:
+                self._journal.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._journal.flush()
+            self._offset = os.fstat(self._journal.fileno()).st_size
+        except OSError:
+            self._rollback_to(start)
+            raise
+        self._unsynced += len(entries)
+        if self._unsynced >= Config.statistics_fsync_batch:
+            try:
+                self._sync()
+            except OSError as e:
+                print(f"[ERROR] 统计日志落盘失败: {e}")
+
+    def _rollback_to(self, offset: int):
+        """丢弃未写完的缓冲并把日志截回 offset（调用方持有文件锁）"""
+        try:
+            self._journal.close()
+        except OSError:
+            pass  # 缓冲中剩余的数据同样写不进去
+        self._journal = None
+        try:
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+        finally:
+            self._open_journal()
+
+    def _sync(self):
+        """将已写入的日志落盘"""
+        if self._journal is not None and self._unsynced:
+            os.fsync(self._journal.fileno())
+            self._unsynced = 0
+
+    def _rewrite_journal(self) -> bool:
+        """压缩（调用方持有文件锁）：只保留有效记录，写入临时文件后原子替换，返回是否成功"""
+        tmp_file = self.path + '.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'op': self.META_OP, 'next_id': self._next_id}) + '\n')
+                for record in self.records:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            os.replace(tmp_file, self.path)
+            self._dead_lines = 0
+            return True
+        except IOError as e:
+            print(f"[ERROR] 压缩统计日志失败: {e}")
+            return False
+        finally:
+            self._open_journal()
+
+    def _save_rollups(self, rollups: Dict = None):
+        """汇总桶（默认为当前的 self.rollups）写入临时文件后原子替换"""
+        tmp_file = self.rollup_path + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.rollups if rollups is None else rollups, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.rollup_path)
+
+    def append_many(self, records: List[Dict]):
+        """
+        批量保存记录，在文件锁内读入其他进程的新记录后分配ID并一次写入
+        写入失败时抛出 OSError，记录不计入内存也不占用ID，可整批重试
+        """
+        with self._lock, self._file_lock:
+            self._refresh()
+            first_id = self._next_id
+            for record in records:
+                record['id'] = self._next_id
+                self._next_id += 1
+            try:
+                self._append_entries(records)
+            except OSError:
+                self._next_id = first_id
+                for record in records:
+                    record['id'] = None
+                raise
+            self.records.extend(records)
+
+    def clear(self):
+        """清空所有记录和汇总桶（追加清空标记，失效行过多时压缩）"""
+        with self._lock, self._file_lock:
+            self._refresh()
+            # 先写磁盘再改内存，写入失败时内存与磁盘保持一致
+            rollups = self._empty_rollups(self.rollups['rolled_until_id'])
+            self._save_rollups(rollups)
+            self._append_entries([self.CLEAR_OP])
+            self._dead_lines += len(self.records) + 1
+            self.records = []
+            self._foreign = []
+            self.rollups = rollups
+            self._sync()
+            if self._dead_lines >= Config.statistics_compact_threshold:
+                self._rewrite_journal()
+
+    def maintain(self):
+        """将超过保留期的原始记录汇总进小时/天桶，并删除过期的小时桶"""
+        raw_before, hourly_before = retention_cutoffs()
+        with self._lock, self._file_lock:
+            self._refresh()
+            # 其他进程可能刚清理过小时桶，以文件中的汇总桶为准
+            self.rollups = self._read_rollups()
+            rolled = []
+            if raw_before:
+                # 按日期划分：迁移的旧数据、重试写入的批次或时钟不同步的工位会使ID与日期顺序不一致
+                rolled = [r for r in self.records if r.get('date', '') < raw_before]
+                for record in rolled:
+                    for period in PERIODS:
+                        add_to_bucket(self.rollups[period].setdefault(period_key(record, period), new_bucket()), record)
+                if rolled:
+                    rolled_ids = {r['id'] for r in rolled}
+                    self.records = [r for r in self.records if r['id'] not in rolled_ids]
+                    self._dead_lines += len(rolled)
+                    self._mark_rolled(rolled_ids)
+            expired = [key for key in self.rollups['hour'] if hourly_before and key[:10] < hourly_before]
+            for key in expired:
+                del self.rollups['hour'][key]
+            if not rolled and not expired:
+                return
+            # 先保存汇总桶（含汇总标记），再压缩日志
+            self._save_rollups()
+            if rolled:
+                if self._rewrite_journal() and self.rollups.get('rolled_ids'):
+                    # 日志中已没有这些记录，不再需要逐个标记
+                    self.rollups['rolled_ids'] = []
+                    self._save_rollups()
+                print(f"[INFO] 已将 {len(rolled)} 条早于 {raw_before} 的统计记录汇总")
+
+    def _mark_rolled(self, rolled_ids):
+        """
+        记录已汇总的ID：剩余记录最小ID之前的部分推进 rolled_until_id，
+        其余ID（比剩余的某条记录大）逐个记入 rolled_ids
+        """
+        remaining_min = min((r['id'] for r in self.records), default=None)
+        rolled_ids = rolled_ids | set(self.rollups.get('rolled_ids', ()))
+        prefix = [i for i in rolled_ids if remaining_min is None or i < remaining_min]
+        until = max([self.rollups['rolled_until_id']] + prefix)
+        self.rollups['rolled_until_id'] = until
+        self.rollups['rolled_ids'] = sorted(i for i in rolled_ids if i > until)
+
+    def poll(self) -> Tuple[List[Dict], bool]:
+        """
+        取出其他进程新写入的记录（由后台写入线程定期调用）
+        :return: (新记录, 是否需要重建统计计数)；查询线程正持锁时直接返回，留到下次
+        """
+        if not self._lock.acquire(blocking=False):
+            return [], False
+        try:
+            self._refresh()
+            foreign, self._foreign = self._foreign, []
+            reset, self._reset_pending = self._reset_pending, False
+            return ([] if reset else foreign), reset
+        finally:
+            self._lock.release()
+
+    def query_range(self, start_date: str, end_date: str, period: str = 'day') -> Dict[str, Dict]:
+        """按小时/天返回 [start_date, end_date] 内的汇总桶（汇总桶与保留期内的原始记录合并）"""
+        buckets = {}
+        with self._lock:
+            for key, bucket in self.rollups[period].items():
+                if start_date <= key[:10] <= end_date:
+                    merge_bucket(buckets.setdefault(key, new_bucket()), bucket)
+            for record in self.records:
+                if start_date <= record.get('date', '') <= end_date:
+                    add_to_bucket(buckets.setdefault(period_key(record, period), new_bucket()), record)
+        return dict(sorted(buckets.items()))
+
+    def rollup_span(self) -> Optional[Tuple[str, str]]:
+        """已汇总（原始记录已删除）的日期范围 (最早, 最晚)，没有时为 None"""
+        with self._lock:
+            days = list(self.rollups['day'])
+        return (min(days), max(days)) if days else None
+
+    def load_counters(self) -> StatisticsCounters:
+        """遍历一次内存中的记录和天桶构建统计计数，已读入的其他进程记录随之视为已合并"""
+        counters = StatisticsCounters()
+        with self._lock:
+            self._foreign = []
+            self._reset_pending = False
+            for record in self.records:
+                counters.add(record)
+            for day, bucket in self.rollups['day'].items():
+                counters.add_bucket(day, bucket)
+        return counters
+
+    def recent(self, limit: int) -> List[Dict]:
+        with self._lock:
+            return self.records[-limit:][::-1]
+
+    def iter_chunks(self, start_date: str = '0000-01-01', end_date: str = '9999-12-31',
+                    after_id: int = 0, chunk_size: int = 500) -> Iterator[List[Dict]]:
+        """按ID顺序分块遍历日期范围内、ID大于 after_id 的原始记录"""
+        with self._lock:
+            records = [r for r in self.records
+                       if r['id'] > after_id and start_date <= r.get('date', '') <= end_date]
+        for i in range(0, len(records), chunk_size):
+            yield records[i:i + chunk_size]
+
+    def close(self):
+        """落盘并关闭日志"""
+        with self._lock:
+            if self._journal is not None:
+                self._sync()
+                self._journal.close()
+                self._journal = None
+
+
+class SQLiteStore:
+    """
+    SQLite存储（WAL模式）
+
+    records 表保存每次检测，items 表每个检测项一行，
+    date/category/class_id 均有索引，统计查询直接在库内聚合。
+
+    多个进程可以共享同一个数据库：写入由SQLite的库级锁串行化（busy_timeout 等待），
+    ID由 AUTOINCREMENT 分配且不复用。每条记录带有写入实例的 source 标识，poll()
+    按ID取出其他实例新写入的记录；清空操作递增 meta 表中的 generation，
+    其他实例据此重建统计。查询使用单独的只读连接，不等待后台写入的事务。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            total_count INTEGER NOT NULL,
+            elapsed_time REAL NOT NULL,
+            source TEXT NOT NULL DEFAULT ''
+        );
+        CREATE TABLE IF NOT EXISTS items (
+            record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+            date TEXT NOT NULL,
+            class_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            confidence REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_records_date ON records(date);
+        CREATE INDEX IF NOT EXISTS idx_items_record ON items(record_id);
+        CREATE INDEX IF NOT EXISTS idx_items_date_category ON items(date, category);
+        CREATE INDEX IF NOT EXISTS idx_items_category ON items(category);
+        CREATE INDEX IF NOT EXISTS idx_items_class ON items(class_id);
+        CREATE TABLE IF NOT EXISTS rollups (
+            period TEXT NOT NULL,
+            start TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (period, start, dimension, key)
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+    """
+
+    # 查询原始记录的列
+    RECORD_COLUMNS = 'id, timestamp, date, time, total_count, elapsed_time'
+
+    # 等待其他进程释放数据库锁的时间（秒）
+    BUSY_TIMEOUT = 30
+
+    # 汇总桶起始时间表达式
+    PERIOD_EXPR = {
+        'hour': "r.date || ' ' || substr(r.time, 1, 2)",
+        'day': 'r.date',
+    }
+
+    # 各汇总维度的分组查询：(start, dimension, key, count)
+    BUCKET_SELECTS = (
+        "SELECT {start}, 'detections', '', COUNT(*) FROM records r WHERE {where} GROUP BY 1",
+        "SELECT {start}, 'items', '', SUM(r.total_count) FROM records r WHERE {where} GROUP BY 1",
+        "SELECT {start}, 'category', i.category, COUNT(*) FROM items i JOIN records r ON r.id = i.record_id "
+        "WHERE {where} GROUP BY 1, 3",
+        "SELECT {start}, 'class', i.name, COUNT(*) FROM items i JOIN records r ON r.id = i.record_id "
+        "WHERE {where} GROUP BY 1, 3",
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self.source = uuid.uuid4().hex[:12]  # 本实例写入的记录标识
+        self._lock = threading.Lock()        # 写连接（后台写入线程）
+        self._read_lock = threading.RLock()  # 读连接（查询、poll）
+        self._conn = sqlite3.connect(path, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA foreign_keys=ON')
+        self._conn.executescript(self.SCHEMA)
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(records)')]
+        if 'source' not in columns:
+            self._conn.execute("ALTER TABLE records ADD COLUMN source TEXT NOT NULL DEFAULT ''")
+            self._conn.commit()
+        self._migrate()
+        self._read_conn = sqlite3.connect(path, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+        self._seen_id = 0     # poll 已合并到的最大记录ID
+        self._generation = 0  # 已知的清空代数
+
+    def _migrate(self):
+        """
+        首次运行时导入JSONL日志或旧版 statistics.json（写锁内检查，多个进程同时启动只导入一次）
+        按文件中的顺序重新分配ID：旧版日志由多个实例同时写入时ID可能重复
+        """
+        directory = os.path.dirname(self.path)
+        journal_file = os.path.join(directory, STORE_FILES['journal'])
+        legacy_file = os.path.join(directory, LEGACY_FILE)
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            migrated = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone()
+            has_data = self._conn.execute(
+                'SELECT EXISTS (SELECT 1 FROM records) OR EXISTS (SELECT 1 FROM rollups)').fetchone()[0]
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated', 1)")
+            if migrated or has_data:
+                return
+            if os.path.exists(journal_file):
+                source, records = journal_file, read_journal(journal_file)
+            else:
+                source, records = legacy_file, read_legacy_records(legacy_file)
+            for record in records:
+                self._insert(record)
+        if records:
+            _retire(source)
+            print(f"[INFO] 已迁移 {len(records)} 条统计记录: {source}")
+
+    def _insert(self, record: Dict):
+        """写入一条记录及其检测项，ID由数据库分配（调用方持锁并管理事务）"""
+        record_id = self._conn.execute(
+            'INSERT INTO records (timestamp, date, time, total_count, elapsed_time, source) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (record['timestamp'], record['date'], record['time'],
+             record['total_count'], record['elapsed_time'], self.source)).lastrowid
+        self._conn.executemany(
+            'INSERT INTO items (record_id, date, class_id, name, category, confidence) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(record_id, record['date'], item['class_id'], item['name'],
+              item['category'], item['confidence']) for item in record.get('items', [])])
+        record['id'] = record_id
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with self._read_lock:
+            return self._read_conn.execute(sql, params).fetchall()
+
+    def _read_generation(self) -> int:
+        row = self._query("SELECT value FROM meta WHERE key = 'generation'")
+        return row[0][0] if row else 0
+
+    def append_many(self, records: List[Dict]):
+        """在一个事务中批量保存记录，ID由数据库自增分配；失败时整批回滚并抛出 sqlite3.Error"""
+        try:
+            with self._lock, self._conn:
+                for record in records:
+                    self._insert(record)
+        except sqlite3.Error:
+            for record in records:
+                record['id'] = None
+            raise
+
+    def clear(self):
+        """清空所有记录和汇总桶（AUTOINCREMENT 保证之后的ID不会复用）"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM items')
+            self._conn.execute('DELETE FROM records')
+            self._conn.execute('DELETE FROM rollups')
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('generation', 1) "
+                "ON CONFLICT (key) DO UPDATE SET value = value + 1")
+
+    def maintain(self):
+        """在一个事务中把超过保留期的原始记录汇总进小时/天桶后删除，并删除过期的小时桶"""
+        raw_before, hourly_before = retention_cutoffs()
+        rolled = 0
+        with self._lock, self._conn:
+            if raw_before:
+                rolled = self._conn.execute(
+                    'SELECT COUNT(*) FROM records WHERE date < ?', (raw_before,)).fetchone()[0]
+            if rolled:
+                for period, start in self.PERIOD_EXPR.items():
+                    for select in self.BUCKET_SELECTS:
+                        self._conn.execute(
+                            'INSERT INTO rollups (period, start, dimension, key, count) '
+                            f'SELECT ?, * FROM ({select.format(start=start, where="r.date < ?")}) WHERE true '
+                            'ON CONFLICT (period, start, dimension, key) DO UPDATE SET count = count + excluded.count',
+                            (period, raw_before))
+                self._conn.execute(
+                    'DELETE FROM items WHERE record_id IN (SELECT id FROM records WHERE date < ?)', (raw_before,))
+                self._conn.execute('DELETE FROM records WHERE date < ?', (raw_before,))
+            if hourly_before:
+                self._conn.execute("DELETE FROM rollups WHERE period = 'hour' AND start < ?", (hourly_before,))
+        if rolled:
+            print(f"[INFO] 已将 {rolled} 条早于 {raw_before} 的统计记录汇总")
+
+    @staticmethod
+    def _fill_buckets(buckets: Dict[str, Dict], rows: list):
+        """将 (start, dimension, key, count) 行累加到汇总桶"""
+        for start, dimension, key, count in rows:
+            bucket = buckets.setdefault(start, new_bucket())
+            if dimension == 'detections':
+                bucket['detections'] += count
+            elif dimension == 'items':
+                bucket['items'] += count
+            else:
+                field = bucket['categories'] if dimension == 'category' else bucket['classes']
+                field[key] = field.get(key, 0) + count
+
+    def query_range(self, start_date: str, end_date: str, period: str = 'day') -> Dict[str, Dict]:
+        """按小时/天返回 [start_date, end_date] 内的汇总桶（汇总桶与保留期内的原始记录合并）"""
+        buckets = {}
+        self._fill_buckets(buckets, self._query(
+            'SELECT start, dimension, key, count FROM rollups '
+            'WHERE period = ? AND substr(start, 1, 10) BETWEEN ? AND ?', (period, start_date, end_date)))
+        for select in self.BUCKET_SELECTS:
+            self._fill_buckets(buckets, self._query(
+                select.format(start=self.PERIOD_EXPR[period], where='r.date BETWEEN ? AND ?'),
+                (start_date, end_date)))
+        return dict(sorted(buckets.items()))
+
+    def rollup_span(self) -> Optional[Tuple[str, str]]:
+        """已汇总（原始记录已删除）的日期范围 (最早, 最晚)，没有时为 None"""
+        first, last = self._query("SELECT MIN(start), MAX(start) FROM rollups WHERE period = 'day'")[0]
+        return (first, last) if first else None
+
+    def poll(self) -> Tuple[List[Dict], bool]:
+        """
+        取出其他实例新写入的记录（由后台写入线程定期调用）
+        :return: (新记录, 是否需要重建统计计数)；读连接正被占用时直接返回，留到下次
+        """
+        if not self._read_lock.acquire(blocking=False):
+            return [], False
+        try:
+            if self._read_generation() != self._generation:
+                return [], True
+            # 先确定本次的ID上界：ID按提交顺序递增，之后提交的记录留到下次
+            max_id = self._query('SELECT MAX(id) FROM records')[0][0] or 0
+            if max_id <= self._seen_id:
+                return [], False
+            records = self._with_items(self._query(
+                f'SELECT {self.RECORD_COLUMNS} FROM records WHERE id > ? AND id <= ? AND source != ? ORDER BY id',
+                (self._seen_id, max_id, self.source)))
+            self._seen_id = max_id
+            return records, False
+        finally:
+            self._read_lock.release()
+
+    def load_counters(self) -> StatisticsCounters:
+        """由SQL分组聚合构建统计计数（同一读事务内），耗时与历史记录数基本无关"""
+        with self._read_lock:
+            self._read_conn.execute('BEGIN')
+            try:
+                counters = self._aggregate_counters()
+                self._seen_id = self._query('SELECT MAX(id) FROM records')[0][0] or 0
+                self._generation = self._read_generation()
+            finally:
+                self._read_conn.execute('COMMIT')
+        return counters
+
+    def _aggregate_counters(self) -> StatisticsCounters:
+        counters = StatisticsCounters()
+        counters.category.update(dict(self._query('SELECT category, COUNT(*) FROM items GROUP BY category')))
+        counters.classes.update(dict(self._query('SELECT name, COUNT(*) FROM items GROUP BY name')))
+        for day, detections, items in self._query(
+                'SELECT date, COUNT(*), SUM(total_count) FROM records GROUP BY date'):
+            counters.daily_detections[day] = detections
+            counters.daily_items[day] = items
+        for day, category, count in self._query(
+                'SELECT date, category, COUNT(*) FROM items GROUP BY date, category'):
+            counters.daily_category[day][category] = count
+        counters.total_detections = sum(counters.daily_detections.values())
+        counters.total_items = sum(counters.daily_items.values())
+        day_buckets = {}
+        self._fill_buckets(day_buckets, self._query(
+            "SELECT start, dimension, key, count FROM rollups WHERE period = 'day'"))
+        for day, bucket in day_buckets.items():
+            counters.add_bucket(day, bucket)
+        return counters
+
+    def _with_items(self, rows: list) -> List[Dict]:
+        """将 records 行组装为与JSONL日志相同结构的字典"""
+        records = [
+            {'id': row[0], 'timestamp': row[1], 'date': row[2], 'time': row[3],
+             'total_count': row[4], 'items': [], 'elapsed_time': row[5]}
+            for row in rows
+        ]
+        if records:
+            by_id = {record['id']: record for record in records}
+            placeholders = ','.join('?' * len(by_id))
+            for record_id, class_id, name, category, confidence in self._query(
+                    'SELECT record_id, class_id, name, category, confidence FROM items '
+                    f'WHERE record_id IN ({placeholders}) ORDER BY rowid', tuple(by_id)):
+                by_id[record_id]['items'].append(
+                    {'class_id': class_id, 'name': name, 'category': category, 'confidence': confidence})
+        return records
+
+    def recent(self, limit: int) -> List[Dict]:
+        return self._with_items(self._query(
+            f'SELECT {self.RECORD_COLUMNS} FROM records '
+            'ORDER BY id DESC LIMIT ?', (limit,)))
+
+    def iter_chunks(self, start_date: str = '0000-01-01', end_date: str = '9999-12-31',
+                    after_id: int = 0, chunk_size: int = 500) -> Iterator[List[Dict]]:
+        """按ID顺序分块查询日期范围内、ID大于 after_id 的原始记录，内存中只保留一块"""
+        last_id = after_id
+        while True:
+            chunk = self._with_items(self._query(
+                f'SELECT {self.RECORD_COLUMNS} FROM records '
+                'WHERE id > ? AND date BETWEEN ? AND ? ORDER BY id LIMIT ?',
+                (last_id, start_date, end_date, chunk_size)))
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1]['id']
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+        with self._read_lock:
+            self._read_conn.close()
+
+
+STORES = {
+    'journal': JournalStore,
+    'sqlite': SQLiteStore,
+}
+
+
+def open_store(backend: str = None, path: str = None):
+    """
+    按名称打开统计存储
+    :param backend: 'journal' 或 'sqlite'，默认 Config.statistics_backend
+    :param path: 数据文件路径，默认 Config.save_path 下的对应文件
+    """
+    backend = backend or Config.statistics_backend
+    if backend not in STORES:
+        raise ValueError(f"不支持的统计存储: {backend}，可选: {', '.join(STORES)}")
+    path = path or os.path.join(Config.save_path, STORE_FILES[backend])
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return STORES[backend](path)
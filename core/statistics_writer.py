@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+基于YOLOv8的垃圾目标检测算法 - 统计记录后台写入模块
+
+StatisticsManager.add_record 只把记录放入有界队列，由后台线程合并成批次
+写入存储：攒够 Config.statistics_flush_batch 条或距上次写入超过
+Config.statistics_flush_interval 秒时写一次。调用方（视频帧回调所在的
+Qt界面线程）不会等待磁盘；队列满时丢弃记录并计数，而不是阻塞调用方。
+清空等操作同样经由队列执行，与记录写入保持先后顺序。
+写入失败的批次保留在写入线程中，每隔 flush_interval 秒与新记录一起重试，
+重试 Config.statistics_write_retries 次仍失败的记录计入 failed 后放弃。
+写入线程同时每隔 Config.statistics_maintenance_interval 秒执行一次存储维护
+（原始记录汇总与过期数据清理），启动后先执行一次。
+其他实例写入的记录也由写入线程每隔 Config.statistics_poll_interval 秒读入，
+其他实例清空或压缩存储后的整体重新加载与计数重建同样在写入线程中完成；
+结果暂存在写入线程中，由 take_merged() 取走，界面线程查询统计时不访问存储。
+"""
+import time
+import queue
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+# 队列中的控制命令
+_CLEAR = 'clear'
+_FLUSH = 'flush'
+_STOP = 'stop'
+
+
+class StatisticsWriter:
+    """统计记录的后台批量写入线程"""
+
+    def __init__(self, store, queue_size: int = None, flush_batch: int = None,
+                 flush_interval: float = None):
+        """
+        :param store: core.statistics_store 中的存储对象
+        :param queue_size: 队列容量，默认 Config.statistics_queue_size
+        :param flush_batch: 每批最多写入的记录数
+        :param flush_interval: 记录在队列中最长等待时间（秒）
+        """
+        self.store = store
+        self.flush_batch = flush_batch or Config.statistics_flush_batch
+        self.flush_interval = flush_interval or Config.statistics_flush_interval
+        self.maintenance_interval = Config.statistics_maintenance_interval
+        self._next_maintenance = time.monotonic()
+        self.poll_interval = Config.statistics_poll_interval
+        self._next_poll = time.monotonic() + self.poll_interval
+        self.write_retries = Config.statistics_write_retries
+        self._queue = queue.Queue(maxsize=queue_size or Config.statistics_queue_size)
+        self._retry = []        # 写入失败、等待重试的 (记录, 已失败次数)
+        self._retry_at = None   # 下次重试的时间
+        self.dequeued = 0       # 已从队列取出的记录数，提交顺序即取出顺序
+        # 交给调用方的其他实例记录与重建的计数；清空请求之前读入的结果作废
+        self._merged_lock = threading.Lock()
+        self._foreign: List[Dict] = []
+        self._rebuilt = None    # (重建的计数, 重建时已取出的记录数)
+        self._clears = 0        # 已请求的清空次数
+        self._clears_done = 0   # 写入线程已执行的清空次数
+        self._metrics = {
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,        # 重试后仍未写入而放弃的记录数
+            'write_errors': 0,  # 写入失败的批次次数
+            'flushes': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+        self._thread = threading.Thread(target=self._run, name='statistics-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, record: Dict) -> bool:
+        """放入一条待写记录，队列已满时丢弃并返回 False"""
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self._metrics['dropped'] += 1
+            return False
+
+    def clear(self, timeout: float = None) -> bool:
+        """在已排队的记录写入后清空存储；队列在超时前一直满时不清空，返回 False"""
+        with self._merged_lock:
+            self._clears += 1
+            self._foreign, self._rebuilt = [], None
+        try:
+            self._queue.put(_CLEAR, timeout=timeout)
+            return True
+        except queue.Full:
+            with self._merged_lock:
+                self._clears -= 1
+            return False
+
+    def take_merged(self) -> Tuple[List[Dict], Optional[tuple]]:
+        """
+        取走写入线程读入的其他实例记录，只读内存，不等待磁盘
+        :return: (新记录, 重建结果)；重建结果为 (计数, 重建时已取出的记录数) 或 None，
+                 计数已包含这些记录及其他实例的记录，调用方需补上之后提交的记录
+        """
+        with self._merged_lock:
+            foreign, self._foreign = self._foreign, []
+            rebuilt, self._rebuilt = self._rebuilt, None
+        return foreign, rebuilt
+
+    def flush(self, timeout: float = None) -> bool:
+        """等待此前提交的记录全部写入，返回是否在超时前完成（超时包括等待队列空位的时间）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put((_FLUSH, done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def close(self, timeout: float = 10):
+        """写完剩余记录后停止线程"""
+        if self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                print(f"[WARNING] 统计写入队列已满，{self._queue.qsize()} 条记录未能写入")
+                return
+            self._thread.join(timeout)
+
+    def metrics(self) -> Dict[str, Any]:
+        """队列深度与写入耗时"""
+        metrics = dict(self._metrics)
+        flushes = metrics.pop('total_flush_ms')
+        metrics['avg_flush_ms'] = flushes / metrics['flushes'] if metrics['flushes'] else 0.0
+        metrics['queue_depth'] = self._queue.qsize()
+        metrics['retry_pending'] = len(self._retry)
+        return metrics
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            if time.monotonic() >= self._next_maintenance:
+                self._write(batch)
+                batch = []
+                deadline = None
+                self._guard(self.store.maintain)
+                self._next_maintenance = time.monotonic() + self.maintenance_interval
+            if time.monotonic() >= self._next_poll:
+                # 先写出当前批次，重建的计数才包含全部已取出的记录
+                self._write(batch)
+                batch = []
+                deadline = None
+                self._guard(self._poll)
+                self._next_poll = time.monotonic() + self.poll_interval
+            wake = min(t for t in (deadline, self._retry_at, self._next_maintenance, self._next_poll)
+                       if t is not None)
+            timeout = max(0.0, wake - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, dict):
+                batch.append(item)
+                self.dequeued += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.flush_batch and time.monotonic() < deadline:
+                    continue
+            # 超时、批次已满或收到命令时先写出当前批次
+            self._write(batch)
+            batch = []
+            deadline = None
+
+            if item == _CLEAR:
+                # 尚未写入的记录早于清空操作，直接丢弃
+                self._retry, self._retry_at = [], None
+                self._guard(self.store.clear)
+                with self._merged_lock:
+                    self._clears_done += 1
+            elif isinstance(item, tuple) and item[0] == _FLUSH:
+                item[1].set()
+            elif item == _STOP:
+                if self._retry:
+                    self._give_up([record for record, _ in self._retry])
+                break
+
+    def _poll(self):
+        """读入其他实例的新记录；存储被其他实例清空或替换时重建计数"""
+        records, reset = self.store.poll()
+        rebuilt = None
+        if reset:
+            counters = self.store.load_counters()
+            # 等待重试的记录已计入调用方的计数，但尚不在存储中
+            for record, _ in self._retry:
+                counters.add(record)
+            rebuilt = (counters, self.dequeued)
+        if not records and rebuilt is None:
+            return
+        with self._merged_lock:
+            if self._clears_done != self._clears:
+                return  # 读入时尚未执行之后请求的清空
+            if rebuilt is not None:
+                self._foreign, self._rebuilt = [], rebuilt
+            else:
+                self._foreign.extend(records)
+
+    def _write(self, batch):
+        """写入新记录，连同等待重试的记录；失败时整批留待重试"""
+        retry, self._retry = self._retry, []
+        self._retry_at = None
+        if not batch and not retry:
+            return
+        records = [record for record, _ in retry] + batch
+        start = time.perf_counter()
+        try:
+            self.store.append_many(records)
+        except Exception as e:
+            self._metrics['write_errors'] += 1
+            attempts = [count + 1 for _, count in retry] + [1] * len(batch)
+            self._retry = [(record, count) for record, count in zip(records, attempts)
+                           if count <= self.write_retries]
+            self._give_up([record for record, count in zip(records, attempts) if count > self.write_retries])
+            if self._retry:
+                self._retry_at = time.monotonic() + self.flush_interval
+            print(f"[ERROR] 统计记录写入失败，{len(self._retry)} 条稍后重试: {e}")
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self._metrics['written'] += len(records)
+        self._metrics['flushes'] += 1
+        self._metrics['last_flush_ms'] = elapsed_ms
+        self._metrics['total_flush_ms'] += elapsed_ms
+        self._metrics['max_flush_ms'] = max(self._metrics['max_flush_ms'], elapsed_ms)
+
+    def _give_up(self, records):
+        if records:
+            self._metrics['failed'] += len(records)
+            print(f"[ERROR] {len(records)} 条统计记录多次写入失败，已放弃")
+
+    @staticmethod
+    def _guard(func, *args):
+        """写入线程不因单次存储异常退出"""
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"[ERROR] 统计记录写入失败: {e}")
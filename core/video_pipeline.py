@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+基于YOLOv8的垃圾目标检测算法 - 视频流水线模块
+
+解码线程 → 推理阶段 → 绘制/编码线程，阶段之间用有界队列连接，
+解码、推理与编码可以重叠执行。播放节奏按墙钟截止时间控制：
+推理慢于源帧率时不再额外等待，离线处理（paced=False）则全速运行。
+
+摄像头使用实时模式（latest_only=True）：解码线程持续取帧，
+各阶段之间只保留最新一帧，积压的旧帧直接丢弃，保证画面时效性。
+"""
+import time
+import queue
+import threading
+from typing import Callable, Optional
+
+import cv2
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+
+# 队列结束标记
+_END = object()
+
+
+class LatestFrameSlot:
+    """只保留最新元素的单槽缓冲，接口与 queue.Queue 的 put/get 一致"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._has_item = False
+        self._closed = False
+        self.dropped = 0  # 被新元素覆盖而未被取走的数量
+
+    def put(self, item, timeout=None):
+        """放入元素，覆盖尚未取走的旧元素，从不阻塞；结束标记排在最新元素之后"""
+        with self._cond:
+            if item is _END:
+                self._closed = True
+            else:
+                if self._has_item:
+                    self.dropped += 1
+                self._item = item
+                self._has_item = True
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """取出最新元素，已结束时返回结束标记，超时抛出 queue.Empty"""
+        with self._cond:
+            if not self._has_item and not self._closed:
+                self._cond.wait(timeout)
+            if self._has_item:
+                item = self._item
+                self._item = None
+                self._has_item = False
+                return item
+            if self._closed:
+                return _END
+            raise queue.Empty
+
+
+class VideoPipeline:
+    """视频三级处理流水线"""
+
+    def __init__(self, source, detection_service, on_frame: Callable,
+                 paced: bool = True, save_path: Optional[str] = None,
+                 queue_size: int = None, latest_only: bool = False):
+        """
+        :param source: 视频文件路径或摄像头编号
+        :param detection_service: DetectionService 对象
+        :param on_frame: 回调 on_frame(plotted_frame, result, info)，在绘制线程中调用，
+                         info 包含 index、capture_time(perf_counter)、dropped_frames、realtime
+        :param paced: True 按源帧率播放，False 全速处理
+        :param save_path: 标注视频保存路径，None 表示不保存
+        :param queue_size: 阶段之间队列长度，默认 Config.video_queue_size
+        :param latest_only: 实时模式，只处理最新帧并丢弃积压帧
+        """
+        self.source = source
+        self.detection_service = detection_service
+        self.on_frame = on_frame
+        self.paced = paced
+        self.save_path = save_path
+        self.queue_size = queue_size or Config.video_queue_size
+        self.latest_only = latest_only
+        self.running = False
+        self.fps = 30
+        self._errors = []
+        self._slots = []
+
+    def run(self):
+        """运行流水线，推理阶段在调用线程中执行，直到视频结束或 stop()"""
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise IOError(f"无法打开视频源: {self.source}")
+        if self.latest_only:
+            # 尽量减少驱动层缓存的旧帧
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        # 获取视频信息
+        self.fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        video_writer = None
+        if self.save_path:
+            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+            video_writer = cv2.VideoWriter(self.save_path, fourcc, self.fps, (width, height))
+
+        self.running = True
+        if self.latest_only:
+            decode_queue = LatestFrameSlot()
+            render_queue = LatestFrameSlot()
+        else:
+            decode_queue = queue.Queue(maxsize=self.queue_size)
+            render_queue = queue.Queue(maxsize=self.queue_size)
+        self._slots = [q for q in (decode_queue, render_queue) if isinstance(q, LatestFrameSlot)]
+        decoder = threading.Thread(target=self._guard, args=(self._decode, cap, decode_queue),
+                                   name='video-decode', daemon=True)
+        renderer = threading.Thread(target=self._guard, args=(self._render, render_queue, video_writer),
+                                    name='video-render', daemon=True)
+        decoder.start()
+        renderer.start()
+        try:
+            self._guard(self._infer, decode_queue, render_queue)
+        finally:
+            decoder.join()
+            renderer.join()
+            cap.release()
+            if video_writer is not None:
+                video_writer.release()
+
+        if self._errors:
+            raise self._errors[0]
+
+    def stop(self):
+        """请求停止，各阶段在当前帧处理完后退出"""
+        self.running = False
+
+    @property
+    def dropped_frames(self) -> int:
+        """实时模式下累计丢弃的帧数"""
+        return sum(slot.dropped for slot in self._slots)
+
+    def _guard(self, stage, *args):
+        """执行阶段函数，记录异常并通知其余阶段退出"""
+        try:
+            stage(*args)
+        except Exception as e:
+            self._errors.append(e)
+            self.running = False
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """带超时地放入队列，流水线停止时放弃"""
+        while self.running:
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        """带超时地取出队列元素，流水线停止时返回结束标记"""
+        while self.running:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _decode(self, cap, decode_queue):
+        """解码阶段：顺序读取视频帧"""
+        index = 0
+        try:
+            while self.running:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if not self._put(decode_queue, (index, time.perf_counter(), frame)):
+                    return
+                index += 1
+        finally:
+            self._put(decode_queue, _END)
+
+    def _infer(self, decode_queue, render_queue):
+        """推理阶段：逐帧执行检测"""
+        try:
+            while True:
+                item = self._get(decode_queue)
+                if item is _END:
+                    break
+                index, capture_time, frame = item
+                result = self.detection_service.detect(frame)
+                if not self._put(render_queue, (index, capture_time, result)):
+                    break
+        finally:
+            self._put(render_queue, _END)
+
+    def _render(self, render_queue, video_writer):
+        """绘制/编码阶段：绘制检测框、写入视频，并按墙钟截止时间回调"""
+        frame_interval = 1.0 / self.fps
+        start_time = None
+        start_index = 0
+        while True:
+            item = self._get(render_queue)
+            if item is _END:
+                break
+            index, capture_time, result = item
+
+            # 获取绘制后的图像（解码帧仅在本流水线内使用，直接原地绘制）
+            plotted_frame = result.get_plotted_image(inplace=True)
+
+            # 保存视频帧
+            if video_writer is not None:
+                video_writer.write(plotted_frame)
+
+            # 控制帧率：只等待到该帧的截止时间，推理耗时已计入其中
+            if self.paced and not self.latest_only:
+                now = time.perf_counter()
+                if start_time is None:
+                    start_time, start_index = now, index
+                deadline = start_time + (index - start_index) * frame_interval
+                if deadline > now:
+                    time.sleep(deadline - now)
+                elif now - deadline > 1.0:
+                    # 落后超过1秒时重置基准，避免恢复后连续快放追赶
+                    start_time, start_index = now, index
+
+            self.on_frame(plotted_frame, result, {
+                'index': index,
+                'capture_time': capture_time,
+                'dropped_frames': self.dropped_frames,
+                'realtime': self.latest_only,
+            })
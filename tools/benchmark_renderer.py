@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+检测框绘制性能对比脚本
+比较 ultralytics Results.plot() 与 core.renderer.BoxRenderer 在720p/1080p下的单帧耗时
+
+用法:
+    python tools/benchmark_renderer.py --boxes 20 --repeat 200
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+# 项目根目录
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import Config
+from core.detection_service import DetectionResult
+from core.renderer import get_renderer
+
+# 测试分辨率 (名称, 高, 宽)
+RESOLUTIONS = [('720p', 720, 1280), ('1080p', 1080, 1920)]
+
+
+def make_results(height, width, num_boxes, rng):
+    """生成带随机检测框的 ultralytics Results"""
+    image = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    top_left = rng.uniform(0, [width * 0.8, height * 0.8], (num_boxes, 2))
+    size = rng.uniform(40, [width * 0.2, height * 0.2], (num_boxes, 2))
+    conf = rng.uniform(0.25, 1.0, (num_boxes, 1))
+    cls = rng.integers(0, Config.NUM_CLASSES, (num_boxes, 1))
+    boxes = np.hstack([top_left, top_left + size, conf, cls]).astype(np.float32)
+    return Results(image, path='benchmark.jpg', names=Config.names, boxes=torch.from_numpy(boxes))
+
+
+def time_ms(func, repeat):
+    """预热后返回平均耗时(ms)"""
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='检测框绘制性能对比')
+    parser.add_argument('--boxes', type=int, default=20, help='每帧检测框数量')
+    parser.add_argument('--repeat', type=int, default=200, help='重复次数')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    renderer = get_renderer()
+    print(f"字体: {renderer.font_path or 'OpenCV内置（英文标签）'}")
+    print(f"{'分辨率':<8}{'plot()':>12}{'渲染器(复制)':>14}{'渲染器(复用)':>14}{'渲染器(原地)':>14}")
+
+    for name, height, width in RESOLUTIONS:
+        results = make_results(height, width, args.boxes, rng)
+        result = DetectionResult(results, 0.0)
+        image = results.orig_img
+        buffer = np.empty_like(image)
+
+        plot_ms = time_ms(results.plot, args.repeat)
+        copy_ms = time_ms(lambda: renderer.render(image, result), args.repeat)
+        reuse_ms = time_ms(lambda: renderer.render(image, result, out=buffer), args.repeat)
+        # 原地绘制会累积在同一张图上，仅用于衡量绘制本身的耗时
+        inplace_ms = time_ms(lambda: renderer.render(buffer, result, out=buffer), args.repeat)
+
+        print(f"{name:<8}{plot_ms:>10.2f}ms{copy_ms:>12.2f}ms{reuse_ms:>12.2f}ms{inplace_ms:>12.2f}ms"
+              f"   加速 {plot_ms / reuse_ms:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,110 +3,280 @@
 """
 标注文件class_id转换脚本
 将现有数据集的class_id映射到新的厨房垃圾分类配置
+
+训练集和验证集的标注文件在进程池中一次性读取解析，合并为一张标注表
+（文件索引、类别、归一化框 xywh）；类别重映射用查找表一次完成，
+转换前后的类别分布与框范围检查都基于同一张表，不再重复读取文件。
+转换结果按文件分组后由线程池并行写出。
 """
 import os
 import shutil
+import argparse
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
+import yaml
+
 # 项目根目录
 PROJECT_ROOT = Path(__file__).parent.parent
 RESOURCES_DIR = PROJECT_ROOT / 'resources'
 
-# 旧class_id -> 新class_id 映射表
-# 基于现有数据集分析结果
-OLD_TO_NEW_MAPPING = {
-    # 现有数据集中已识别的类别
-    0: None,      # 通用垃圾 (fimg/img) - 跳过或映射到其他垃圾
-    8: 2,         # Fruitpeels 果皮 -> 新配置 fruit_peel (2)
-    10: 10,       # Tealeaves 茶叶 -> 新配置 tea_leaves (10)
-    22: None,     # Oldclothes 旧衣服 -> 不在厨房垃圾分类中，跳过
-    23: 19,       # Zip-topcan 易拉罐 -> 新配置 zip_top_can (19)
-    39: 25,       # Medications 药品 -> 新配置 expired_medicine (25)
-}
-
-# 是否保留未映射的类别（映射到其他垃圾）
+# 旧class_id -> 新class_id 映射表文件
+MAPPING_FILE = Path(__file__).parent / 'label_mapping.yaml'
+
+# 映射表文件未指定时的默认值：是否保留未映射的类别（映射到其他垃圾）
 KEEP_UNMAPPED = True
 UNMAPPED_CLASS_ID = 28  # 其他垃圾
 
-def convert_label_file(input_path, output_path):
-    """转换单个标注文件"""
-    converted_lines = []
-    skipped_count = 0
-    
-    with open(input_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
+# 是否丢弃坐标超出 [0, 1] 或宽高为0的标注（YOLO训练时会因此忽略整张图片的标注）
+DROP_INVALID = True
+
+# 标注解析进程数（None 表示 CPU 核数）；文件数少于 PARALLEL_MIN_FILES 时在当前进程解析
+PARSE_WORKERS = None
+PARALLEL_MIN_FILES = 2000
+
+# 并行写出转换结果的线程数
+WRITE_WORKERS = 8
+
+# 全部标注文件合并成的标注表，每个标注一行
+# paths: 标注文件路径列表；file: 所在文件索引；cls: 类别；box: 归一化 xywh（多边形标注取外接框）；
+# tails: 类别之后的原始字段（写回时保留原精度）；malformed: 字段不足或无法解析的行数；unreadable: 无法读取的文件数
+LabelTable = namedtuple('LabelTable', ['paths', 'file', 'cls', 'box', 'tails', 'malformed', 'unreadable'])
+
+
+def load_mapping(path=None):
+    """
+    读取映射表文件
+    :return: ({旧class_id: 新class_id 或 None}, 是否保留未映射类别, 未映射类别的新class_id)
+    """
+    path = Path(path or MAPPING_FILE)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = yaml.safe_load(f) or {}
+    mapping = {}
+    for old_id, new_id in (data.get('mapping') or {}).items():
+        if int(old_id) < 0 or (new_id is not None and int(new_id) < 0):
+            raise ValueError(f"映射表中的class_id不能为负数: {old_id} -> {new_id}")
+        mapping[int(old_id)] = None if new_id is None else int(new_id)
+    keep_unmapped = bool(data.get('keep_unmapped', KEEP_UNMAPPED))
+    unmapped_class_id = int(data.get('unmapped_class_id', UNMAPPED_CLASS_ID))
+    return mapping, keep_unmapped, unmapped_class_id
+
+
+def parse_label_chunk(task):
+    """
+    读取并解析一批标注文件（在子进程中执行）
+    :param task: (首个文件的索引, [标注文件路径, ...])
+    """
+    start, paths = task
+    file_index, rows, polygons = [], [], []
+    unreadable = 0
+    for offset, path in enumerate(paths):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError):
+            unreadable += 1
+            continue
+        for line in text.splitlines():
+            parts = line.split()
+            if len(parts) >= 5:
+                file_index.append(start + offset)
+                rows.append(parts)
+
+    cls = np.full(len(rows), np.nan)
+    box = np.full((len(rows), 4), np.nan, dtype=np.float32)
+    valid = np.zeros(len(rows), dtype=bool)
+    # 标准的5字段行整批转换，只有转换失败时才逐行处理
+    simple = [i for i, parts in enumerate(rows) if len(parts) == 5]
+    try:
+        values = np.array([rows[i] for i in simple], dtype=np.float64).reshape(-1, 5)
+        cls[simple] = values[:, 0]
+        box[simple] = values[:, 1:]
+        valid[simple] = True
+    except ValueError:
+        polygons = simple
+    polygons += [i for i, parts in enumerate(rows) if len(parts) > 5]
+    for i in polygons:
+        try:
+            values = np.array(rows[i], dtype=np.float64)
+        except ValueError:
             continue
-        
-        parts = line.split()
-        if len(parts) < 5:
+        cls[i] = values[0]
+        valid[i] = True
+        if len(values) == 5:
+            box[i] = values[1:]
             continue
-        
-        old_class_id = int(parts[0])
-        
-        # 查找映射
-        if old_class_id in OLD_TO_NEW_MAPPING:
-            new_class_id = OLD_TO_NEW_MAPPING[old_class_id]
-        elif KEEP_UNMAPPED:
-            new_class_id = UNMAPPED_CLASS_ID
-        else:
-            new_class_id = None
-        
-        if new_class_id is not None:
-            parts[0] = str(new_class_id)
-            converted_lines.append(' '.join(parts))
-        else:
-            skipped_count += 1
-    
-    # 写入转换后的文件
-    if converted_lines:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(converted_lines) + '\n')
-        return True, len(converted_lines), skipped_count
-    return False, 0, skipped_count
+        # 多边形标注：坐标全部在 [0, 1] 内时取外接框，否则保持 NaN 以便检查时判为越界
+        coords = values[1:len(values) - (len(values) - 1) % 2].reshape(-1, 2)
+        if len(coords) >= 3 and ((coords >= 0) & (coords <= 1)).all():
+            (x1, y1), (x2, y2) = coords.min(axis=0), coords.max(axis=0)
+            box[i] = ((x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1)
+
+    keep = np.flatnonzero(valid)
+    return (np.array(file_index, dtype=np.int32)[keep], cls[keep], box[keep],
+            [' '.join(rows[i][1:]) for i in keep], len(rows) - len(keep), unreadable)
+
+
+def load_label_table(paths, workers=None):
+    """一次性并行读取全部标注文件，合并为 LabelTable"""
+    paths = [Path(p) for p in paths]
+    workers = workers or PARSE_WORKERS or os.cpu_count() or 1
+    if workers <= 1 or len(paths) < PARALLEL_MIN_FILES:
+        chunks = [parse_label_chunk((0, paths))]
+    else:
+        size = max(64, len(paths) // (workers * 4))
+        tasks = [(start, paths[start:start + size]) for start in range(0, len(paths), size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(parse_label_chunk, tasks))
+
+    cls = np.concatenate([chunk[1] for chunk in chunks])
+    # 非整数或负数类别记为 -1，检查时判为无效
+    integral = (cls >= 0) & (cls < 2 ** 31) & (cls == np.floor(cls))
+    return LabelTable(
+        paths=paths,
+        file=np.concatenate([chunk[0] for chunk in chunks]),
+        cls=np.where(integral, cls, -1).astype(np.int64),
+        box=np.concatenate([chunk[2] for chunk in chunks]),
+        tails=[tail for chunk in chunks for tail in chunk[3]],
+        malformed=sum(chunk[4] for chunk in chunks),
+        unreadable=sum(chunk[5] for chunk in chunks),
+    )
+
+
+def validate_boxes(table):
+    """有效标注的掩码：类别为非负整数，xywh 均在 [0, 1] 内且宽高大于0"""
+    box = table.box
+    return ((table.cls >= 0)
+            & np.all((box >= 0) & (box <= 1), axis=1)
+            & (box[:, 2] > 0) & (box[:, 3] > 0))
+
+
+def remap_classes(cls, mapping, keep_unmapped, unmapped_class_id):
+    """按查找表把旧class_id映射为新class_id，-1 表示丢弃"""
+    default = unmapped_class_id if keep_unmapped else -1
+    lookup = np.full(max(mapping, default=0) + 1, default, dtype=np.int64)
+    for old_id, new_id in mapping.items():
+        lookup[old_id] = -1 if new_id is None else new_id
+    cls = np.asarray(cls, dtype=np.int64)
+    # 查找表之外的类别都是未映射类别
+    inside = (cls >= 0) & (cls < len(lookup))
+    return np.where(inside, lookup[np.where(inside, cls, 0)], np.where(cls >= 0, default, -1))
+
+
+def class_histogram(cls, mask=None):
+    """{class_id: 标注数}"""
+    cls = cls if mask is None else cls[mask]
+    class_ids, counts = np.unique(cls[cls >= 0], return_counts=True)
+    return dict(zip(class_ids.tolist(), counts.tolist()))
+
 
 def analyze_dataset(labels_dir):
     """分析数据集中的class_id分布"""
-    class_counts = {}
-    
-    for label_file in Path(labels_dir).glob('*.txt'):
-        with open(label_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                parts = line.strip().split()
-                if parts:
-                    class_id = int(parts[0])
-                    class_counts[class_id] = class_counts.get(class_id, 0) + 1
-    
-    return class_counts
+    table = load_label_table(sorted(Path(labels_dir).glob('*.txt')))
+    return class_histogram(table.cls)
+
+
+def write_converted(table, new_cls, keep, output_paths, workers=None):
+    """
+    按文件写出保留的标注，没有保留标注的文件不写出
+    :param new_cls: 各标注的新类别
+    :param keep: 各标注是否写出
+    :param output_paths: 与 table.paths 对应的输出路径
+    :return: 写出的文件数
+    """
+    rows = np.flatnonzero(keep)
+    files = table.file[rows]
+    # 标注表按文件索引有序，每个文件的标注是 rows 中连续的一段
+    bounds = np.searchsorted(files, np.arange(len(table.paths) + 1))
+    labels = new_cls[rows].astype(str).tolist()
+    tails = [table.tails[row] for row in rows.tolist()]
+
+    def write_range(file_range):
+        written = 0
+        for file_id in file_range:
+            begin, end = bounds[file_id], bounds[file_id + 1]
+            if begin == end:
+                continue
+            lines = [f'{labels[j]} {tails[j]}' for j in range(begin, end)]
+            with open(output_paths[file_id], 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+            written += 1
+        return written
+
+    workers = workers or WRITE_WORKERS
+    size = max(256, len(table.paths) // (workers * 4))
+    ranges = [range(start, min(start + size, len(table.paths))) for start in range(0, len(table.paths), size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(write_range, ranges))
+
 
 def main():
+    global PARSE_WORKERS, DROP_INVALID
+
+    parser = argparse.ArgumentParser(description='标注文件class_id转换工具')
+    parser.add_argument('--mapping', type=str, default=str(MAPPING_FILE),
+                        help='旧class_id -> 新class_id 映射表（YAML）')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='标注解析进程数，默认CPU核数')
+    parser.add_argument('--keep-invalid', action='store_true',
+                        help='保留坐标越界或宽高为0的标注（默认丢弃）')
+    args = parser.parse_args()
+
+    PARSE_WORKERS = args.workers
+    DROP_INVALID = not args.keep_invalid
+
     # 数据集路径
     train_labels = RESOURCES_DIR / 'datasets' / 'labels' / 'train'
     val_labels = RESOURCES_DIR / 'datasets' / 'labels' / 'val'
-    
+
     # 备份目录
     backup_dir = RESOURCES_DIR / 'datasets' / 'labels_backup'
-    
+
     # 输出目录（转换后的标注）
     output_train = RESOURCES_DIR / 'datasets' / 'labels_converted' / 'train'
     output_val = RESOURCES_DIR / 'datasets' / 'labels_converted' / 'val'
-    
+
     print("=" * 60)
     print("标注文件class_id转换工具")
     print("=" * 60)
-    
-    # 1. 分析现有数据集
+
+    try:
+        mapping, keep_unmapped, unmapped_class_id = load_mapping(args.mapping)
+    except (OSError, ValueError, TypeError, yaml.YAMLError) as e:
+        print(f"❌ 映射表读取失败: {args.mapping} ({e})")
+        return
+    print(f"映射表: {args.mapping}")
+
+    # 1. 一次读取训练集和验证集的全部标注并分析
     print("\n[1/4] 分析现有数据集...")
-    if train_labels.exists():
-        train_stats = analyze_dataset(train_labels)
+    splits = [(src_dir, dst_dir) for src_dir, dst_dir in [(train_labels, output_train), (val_labels, output_val)]
+              if src_dir.exists()]
+    split_files = [sorted(src_dir.glob('*.txt')) for src_dir, _ in splits]
+    table = load_label_table([path for files in split_files for path in files])
+
+    valid = validate_boxes(table)
+    new_cls = remap_classes(table.cls, mapping, keep_unmapped, unmapped_class_id)
+
+    if splits and splits[0][0] == train_labels:
+        train_rows = table.file < len(split_files[0])
         print(f"训练集class_id分布:")
-        for cid, count in sorted(train_stats.items()):
-            mapping = OLD_TO_NEW_MAPPING.get(cid, UNMAPPED_CLASS_ID if KEEP_UNMAPPED else '跳过')
-            print(f"  class_id {cid}: {count} 个标注 -> 新class_id: {mapping}")
-    
+        train_stats = class_histogram(table.cls, train_rows)
+        new_ids = remap_classes(list(train_stats), mapping, keep_unmapped, unmapped_class_id)
+        for (cid, count), new_id in zip(sorted(train_stats.items()), new_ids):
+            mapping_text = new_id if new_id >= 0 else '跳过'
+            print(f"  class_id {cid}: {count} 个标注 -> 新class_id: {mapping_text}")
+
+    invalid = np.flatnonzero(~valid)
+    if len(invalid) or table.malformed or table.unreadable:
+        print(f"⚠️ 坐标越界或类别无效的标注: {len(invalid)}，无法解析的行: {table.malformed}，"
+              f"无法读取的文件: {table.unreadable}")
+        for file_id in np.unique(table.file[invalid])[:5]:
+            print(f"   {table.paths[file_id].name}")
+        if DROP_INVALID and len(invalid):
+            print("   这些标注不写入转换结果（使用 --keep-invalid 保留）")
+
     # 2. 创建备份
     print("\n[2/4] 创建备份...")
     if not backup_dir.exists():
@@ -117,37 +287,37 @@ def main():
         print(f"备份已创建: {backup_dir}")
     else:
         print(f"备份已存在: {backup_dir}")
-    
-    # 3. 转换标注文件
+
+    # 3. 转换标注文件（训练集和验证集一起并行写出）
     print("\n[3/4] 转换标注文件...")
-    
-    for src_dir, dst_dir in [(train_labels, output_train), (val_labels, output_val)]:
-        if not src_dir.exists():
-            continue
-        
+
+    output_paths = []
+    for (_, dst_dir), files in zip(splits, split_files):
         dst_dir.mkdir(parents=True, exist_ok=True)
-        
-        total_files = 0
-        converted_files = 0
-        total_objects = 0
-        skipped_objects = 0
-        
-        for label_file in src_dir.glob('*.txt'):
-            total_files += 1
-            success, obj_count, skip_count = convert_label_file(
-                label_file, dst_dir / label_file.name
-            )
-            if success:
-                converted_files += 1
-                total_objects += obj_count
-            skipped_objects += skip_count
-        
+        output_paths.extend(dst_dir / path.name for path in files)
+
+    mapped = new_cls >= 0
+    keep = mapped & valid if DROP_INVALID else mapped
+    write_converted(table, new_cls, keep, output_paths)
+
+    file_split = np.repeat(np.arange(len(splits)), [len(files) for files in split_files])
+    row_split = file_split[table.file]
+    written = np.zeros(len(table.paths), dtype=bool)
+    written[table.file[keep]] = True
+    for split_id, (src_dir, _) in enumerate(splits):
+        rows = row_split == split_id
         print(f"\n{src_dir.name}:")
-        print(f"  总文件数: {total_files}")
-        print(f"  转换成功: {converted_files}")
-        print(f"  总标注数: {total_objects}")
-        print(f"  跳过标注: {skipped_objects}")
-    
+        print(f"  总文件数: {len(split_files[split_id])}")
+        print(f"  转换成功: {int(written[file_split == split_id].sum())}")
+        print(f"  总标注数: {int((keep & rows).sum())}")
+        print(f"  跳过标注: {int((~mapped & rows).sum())}")
+        if DROP_INVALID:
+            print(f"  无效标注: {int((mapped & ~valid & rows).sum())}")
+
+    print(f"\n转换后类别分布:")
+    for cid, count in sorted(class_histogram(new_cls, keep).items()):
+        print(f"  class_id {cid}: {count} 个标注")
+
     # 4. 输出结果
     print("\n[4/4] 转换完成!")
     print(f"\n转换后的标注文件位于: datasets/labels_converted/")
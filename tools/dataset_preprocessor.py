@@ -7,15 +7,27 @@
 2. 验证集图片缺失（重新划分）
 3. 类别ID不一致（重映射或扩展配置）
 4. 类别不均衡（统计分析）
+
+目录只用 os.scandir 各遍历一次，建立 文件名主干→图片 索引来匹配标签，
+标签文件在进程池中并行解析；扫描结果由分析、清理、重新划分三个步骤共用。
 """
 
 import os
+import csv
+import sys
+import json
+import errno
 import shutil
-import random
+import sqlite3
+import hashlib
+import threading
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, namedtuple, Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import argparse
 
+import numpy as np
+
 # ============== 配置区 ==============
 
 # 项目根目录
@@ -36,9 +48,29 @@ OUTPUT_DIR = DATASET_ROOT / 'processed'
 # 验证集比例
 VAL_RATIO = 0.2
 
-# 随机种子
+# 随机种子（参与划分哈希，修改后所有样本重新划分）
 RANDOM_SEED = 42
 
+# 预处理清单文件名（位于输出目录）
+MANIFEST_NAME = 'manifest.db'
+
+# 新样本的划分方式：'stratified'（按各图片类别分布做多标签分层，各类别在训练/验证集中比例一致）
+# 或 'hash'（按内容哈希随机划分）
+SPLIT_METHOD = 'stratified'
+
+# 各类别划分报告文件名（位于输出目录）
+SPLIT_REPORT_NAME = 'split_report.csv'
+
+# 标签解析进程数（None 表示CPU核数）；标签少于该数量时不启动进程池
+PARSE_WORKERS = None
+PARALLEL_MIN_LABELS = 2000
+
+# 输出数据集的生成方式：'auto' 依次尝试 reflink → hardlink → symlink → copy，也可指定其中一种
+LINK_MODE = 'auto'
+
+# 生成输出文件的线程数
+COPY_WORKERS = 8
+
 # 实际使用的40个类别（根据标签分析结果）
 FULL_CLASS_NAMES = {
     0: 'vegetable_leaves',      # 菜叶
@@ -104,22 +136,327 @@ def get_image_extensions():
     return ['.jpg', '.jpeg', '.png', '.bmp', '.webp']
 
 
-def find_matching_image(label_path, images_dir):
-    """查找标签对应的图片文件"""
-    stem = label_path.stem
-    for ext in get_image_extensions():
-        img_path = images_dir / (stem + ext)
-        if img_path.exists():
-            return img_path
-    return None
-
-
-def analyze_dataset():
-    """分析当前数据集状态"""
+# 有效的图片-标签对
+# source 为来源集合（'train'/'val'），classes 为标签中各类别的目标数 {class_id: count}，
+# content_hash 为图片与标签内容的哈希，signature 为 (图片大小, 图片修改时间, 标签大小, 标签修改时间)
+LabelPair = namedtuple('LabelPair', ['image', 'label', 'source', 'classes', 'content_hash', 'signature'])
+
+
+def index_images(images_dir):
+    """
+    单次 os.scandir 建立图片索引
+    :return: ({文件名主干: DirEntry}, 目录中带扩展名的文件数)；同名多种扩展名时按 get_image_extensions 顺序优先
+    """
+    rank = {ext: i for i, ext in enumerate(get_image_extensions())}
+    index, best_rank, file_count = {}, {}, 0
+    if not images_dir.exists():
+        return index, file_count
+    with os.scandir(images_dir) as entries:
+        for entry in entries:
+            if '.' not in entry.name or not entry.is_file():
+                continue
+            file_count += 1
+            stem, ext = os.path.splitext(entry.name)
+            ext_rank = rank.get(ext.lower())
+            if ext_rank is not None and ext_rank < best_rank.get(stem, len(rank)):
+                index[stem] = entry
+                best_rank[stem] = ext_rank
+    return index, file_count
+
+
+def list_labels(labels_dir):
+    """单次 os.scandir 列出标签文件（DirEntry）"""
+    if not labels_dir.exists():
+        return []
+    with os.scandir(labels_dir) as entries:
+        return [entry for entry in entries if entry.name.endswith('.txt') and entry.is_file()]
+
+
+def parse_label_classes(label_path):
+    """统计一个标签文件中各类别的目标数，无法解析的行跳过"""
+    counts = Counter()
+    with open(label_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                try:
+                    counts[int(parts[0])] += 1
+                except ValueError:
+                    continue
+    return dict(counts)
+
+
+def process_pair(paths):
+    """解析标签类别并计算图片与标签的内容哈希（进程池中执行）"""
+    image_path, label_path = paths
+    digest = hashlib.blake2b(digest_size=16)
+    with open(image_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(b'\0')
+    with open(label_path, 'rb') as f:
+        digest.update(f.read())
+    return parse_label_classes(label_path), digest.hexdigest()
+
+
+def process_pairs_parallel(pairs, workers=None):
+    """在进程池中并行处理 [(图片, 标签), ...]，返回与输入顺序一致的 (类别计数, 内容哈希) 列表"""
+    workers = workers or PARSE_WORKERS or os.cpu_count() or 1
+    if workers <= 1 or len(pairs) < PARALLEL_MIN_LABELS:
+        return [process_pair(paths) for paths in pairs]
+    chunksize = max(16, len(pairs) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(process_pair, pairs, chunksize=chunksize))
+
+
+def manifest_key(image_path):
+    """清单中样本的键：图片相对数据集根目录的路径"""
+    try:
+        return Path(image_path).relative_to(DATASET_ROOT).as_posix()
+    except ValueError:
+        return Path(image_path).as_posix()
+
+
+class DatasetManifest:
+    """
+    预处理清单（SQLite）：记录每个图片-标签对的文件签名、内容哈希、类别计数与所属划分
+    文件签名未变的样本直接沿用清单中的结果，已划分的样本保持原划分
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS samples (
+            image TEXT PRIMARY KEY,
+            label TEXT NOT NULL,
+            signature TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            classes TEXT NOT NULL,
+            split TEXT NOT NULL
+        );
+    """
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self.rows = {}
+        if self.path.exists():
+            with sqlite3.connect(self.path) as conn:
+                conn.executescript(self.SCHEMA)
+                for image, label, signature, content_hash, classes, split in conn.execute(
+                        'SELECT image, label, signature, content_hash, classes, split FROM samples'):
+                    self.rows[image] = {
+                        'label': label,
+                        'signature': tuple(json.loads(signature)),
+                        'content_hash': content_hash,
+                        'classes': {int(k): v for k, v in json.loads(classes).items()},
+                        'split': split,
+                    }
+    
+    def lookup(self, image_path, label_path, signature):
+        """文件未变时返回清单记录，否则返回 None"""
+        row = self.rows.get(manifest_key(image_path))
+        if row is not None and row['signature'] == signature and row['label'] == manifest_key(label_path):
+            return row
+        return None
+    
+    def split_of(self, image_path):
+        row = self.rows.get(manifest_key(image_path))
+        return row['split'] if row is not None else None
+    
+    def save(self, pairs, splits):
+        """以本次的样本与划分整体替换清单（已删除的样本随之移除）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        records = [
+            (manifest_key(pair.image), manifest_key(pair.label), json.dumps(pair.signature),
+             pair.content_hash, json.dumps(pair.classes), split)
+            for pair, split in zip(pairs, splits)
+        ]
+        with sqlite3.connect(self.path) as conn:
+            conn.executescript(self.SCHEMA)
+            conn.execute('DELETE FROM samples')
+            conn.executemany('INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)', records)
+        self.rows = {record[0]: {'label': record[1], 'signature': pair.signature,
+                                 'content_hash': pair.content_hash, 'classes': pair.classes, 'split': split}
+                     for record, pair, split in zip(records, pairs, splits)}
+
+
+def scan_dataset(workers=None, manifest=None):
+    """
+    扫描训练集与验证集：每个目录遍历一次，匹配图片与标签，
+    清单中文件签名未变的样本直接复用，其余在进程池中解析标签并计算内容哈希
+    :return: {'train'/'val': {'images': 图片文件数, 'labels': 标签数,
+              'pairs': [LabelPair], 'orphan_labels': [孤立标签文件名]}, 'reused': 复用数, 'processed': 处理数}
+    """
+    scan = {}
+    matched = []
+    for split, images_dir, labels_dir in (('train', SRC_IMAGES_TRAIN, SRC_LABELS_TRAIN),
+                                          ('val', SRC_IMAGES_VAL, SRC_LABELS_VAL)):
+        image_index, image_count = index_images(images_dir)
+        labels = list_labels(labels_dir)
+        orphans = []
+        for label_entry in labels:
+            image_entry = image_index.get(os.path.splitext(label_entry.name)[0])
+            if image_entry:
+                matched.append((image_entry, label_entry, split))
+            else:
+                orphans.append(label_entry.name)
+        scan[split] = {'images': image_count, 'labels': len(labels), 'pairs': [], 'orphan_labels': orphans}
+    
+    pairs = []
+    pending = []
+    for image_entry, label_entry, split in matched:
+        image_stat, label_stat = image_entry.stat(), label_entry.stat()
+        signature = (image_stat.st_size, image_stat.st_mtime_ns, label_stat.st_size, label_stat.st_mtime_ns)
+        image, label = Path(image_entry.path), Path(label_entry.path)
+        row = manifest.lookup(image, label, signature) if manifest is not None else None
+        if row is not None:
+            pairs.append(LabelPair(image, label, split, row['classes'], row['content_hash'], signature))
+        else:
+            pending.append(len(pairs))
+            pairs.append(LabelPair(image, label, split, None, None, signature))
+    
+    results = process_pairs_parallel([(str(pairs[i].image), str(pairs[i].label)) for i in pending], workers)
+    for i, (classes, content_hash) in zip(pending, results):
+        pairs[i] = pairs[i]._replace(classes=classes, content_hash=content_hash)
+    for pair in pairs:
+        scan[pair.source]['pairs'].append(pair)
+    scan['reused'] = len(pairs) - len(pending)
+    scan['processed'] = len(pending)
+    return scan
+
+
+def hash_split(content_hash, val_ratio=None):
+    """由内容哈希（加随机种子）确定划分，同一内容每次都落在同一集合"""
+    val_ratio = VAL_RATIO if val_ratio is None else val_ratio
+    digest = hashlib.blake2b(f'{RANDOM_SEED}:{content_hash}'.encode('ascii'), digest_size=8).digest()
+    return 'val' if int.from_bytes(digest, 'big') / 2 ** 64 < val_ratio else 'train'
+
+
+def class_matrix(pairs, num_classes=None):
+    """各图片的类别目标数矩阵 [图片数, 类别数]"""
+    max_class = max((max(pair.classes) for pair in pairs if pair.classes), default=-1)
+    num_classes = max(num_classes or 0, max_class + 1)
+    counts = np.zeros((len(pairs), num_classes), dtype=np.int32)
+    rows = [i for i, pair in enumerate(pairs) for _ in pair.classes]
+    cols = [class_id for pair in pairs for class_id in pair.classes]
+    vals = [count for pair in pairs for count in pair.classes.values()]
+    if rows:
+        counts[rows, cols] = vals
+    return counts
+
+
+def stratified_split(counts, fixed, sizes=None, val_ratio=None, seed=None):
+    """
+    迭代式多标签分层划分（Sechidis 等提出的方法，按类别整批分配的向量化版本）
+    每轮取未划分样本中出现最少的类别，将含该类别的未划分图片按训练/验证集对该类别的
+    剩余需求量成比例分配，再扣减这些图片所含全部类别的需求；稀有类别先分配，
+    不会被常见类别的分配挤到同一集合。
+    :param counts: [N, C] 各样本的类别目标数
+    :param fixed: [N] 已确定的划分（0 训练、1 验证、-1 待划分），已确定的样本计入需求但不移动
+    :param sizes: [N] 各样本包含的图片数（内容相同的图片合为一个样本），默认均为 1
+    :return: [N] 划分结果（0 训练、1 验证）
+    """
+    val_ratio = VAL_RATIO if val_ratio is None else val_ratio
+    rng = np.random.default_rng(RANDOM_SEED if seed is None else seed)
+    sizes = np.ones(len(counts), dtype=np.int64) if sizes is None else np.asarray(sizes)
+    images = (counts > 0) * sizes[:, None]
+    present = counts > 0
+    assign = np.asarray(fixed, dtype=np.int8).copy()
+    free = assign < 0
+    ratios = np.array([1 - val_ratio, val_ratio])
+    
+    # 各集合对各类别（按图片数）及总图片数的剩余需求
+    desired_class = ratios[:, None] * images.sum(axis=0)[None, :] - np.stack(
+        [images[assign == split].sum(axis=0) for split in (0, 1)])
+    desired_total = ratios * sizes.sum() - np.array([sizes[assign == split].sum() for split in (0, 1)])
+    remaining = present[free].sum(axis=0)
+    
+    def allocate(batch, need):
+        """按需求比例把一批图片分到两个集合"""
+        rng.shuffle(batch)
+        need = np.clip(need, 0, None)
+        if need.sum() <= 0:
+            need = np.clip(desired_total, 0, None)
+        if need.sum() <= 0:
+            need = ratios
+        # 取累计图片数最接近验证集应得数量的前若干个样本
+        cumulative = np.concatenate([[0], np.cumsum(sizes[batch])])
+        n_val = int(np.argmin(np.abs(cumulative - cumulative[-1] * need[1] / need.sum())))
+        for split, members in ((1, batch[:n_val]), (0, batch[n_val:])):
+            assign[members] = split
+            desired_class[split] -= images[members].sum(axis=0)
+            desired_total[split] -= sizes[members].sum()
+        free[batch] = False
+    
+    while remaining.any():
+        candidates = np.flatnonzero(remaining)
+        class_id = candidates[np.argmin(remaining[candidates])]
+        batch = np.flatnonzero(free & present[:, class_id])
+        remaining -= present[batch].sum(axis=0)
+        allocate(batch, desired_class[:, class_id].copy())
+    
+    # 没有任何目标的图片按总数需求分配
+    rest = np.flatnonzero(free)
+    if len(rest):
+        allocate(rest, desired_total.copy())
+    return assign
+
+
+def assign_splits(pairs, manifest=None):
+    """清单中已有的样本保持原划分，新样本按 SPLIT_METHOD 划分"""
+    known = [manifest.split_of(pair.image) if manifest is not None else None for pair in pairs]
+    if SPLIT_METHOD == 'hash':
+        return [split or hash_split(pair.content_hash) for pair, split in zip(pairs, known)]
+    
+    # 内容相同的样本作为一组划分，组按内容哈希排序，结果与目录遍历顺序无关
+    hashes = np.array([pair.content_hash for pair in pairs])
+    _, first, group = np.unique(hashes, return_index=True, return_inverse=True)
+    known_codes = np.array([{'train': 0, 'val': 1}.get(split, -1) for split in known], dtype=np.int8)
+    fixed = np.full(len(first), -1, dtype=np.int8)
+    np.maximum.at(fixed, group.ravel(), known_codes)
+    sizes = np.bincount(group.ravel(), minlength=len(first))
+    assign = stratified_split(class_matrix([pairs[i] for i in first]), fixed, sizes)
+    return [split or ('val' if assign[g] else 'train') for split, g in zip(known, group.ravel())]
+
+
+def split_report(pairs, splits, report_path=None):
+    """
+    输出各类别在训练/验证集中的图片数与目标数
+    :param report_path: 同时写出CSV报告的路径
+    """
+    counts = class_matrix(pairs, len(FULL_CLASS_NAMES))
+    is_val = np.array([split == 'val' for split in splits], dtype=bool)
+    present = counts > 0
+    images = np.stack([present[~is_val].sum(axis=0), present[is_val].sum(axis=0)], axis=1)
+    instances = np.stack([counts[~is_val].sum(axis=0), counts[is_val].sum(axis=0)], axis=1)
+    
+    rows = []
+    print(f"\n📊 各类别划分 (图片数 训练/验证, 验证占比):")
+    for class_id in np.flatnonzero(images.sum(axis=1)):
+        name = FULL_CLASS_NAMES.get(int(class_id), f'unknown_{class_id}')
+        train_images, val_images = images[class_id]
+        share = val_images / (train_images + val_images)
+        rows.append([int(class_id), name, int(train_images), int(val_images), f'{share:.3f}',
+                     int(instances[class_id, 0]), int(instances[class_id, 1])])
+        print(f"   {class_id:2d}: {train_images:>6} / {val_images:<6} {share * 100:5.1f}%  ({name})")
+    
+    if report_path is not None:
+        Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.writer(f)
+            writer.writerow(['class_id', 'name', 'train_images', 'val_images', 'val_share',
+                             'train_instances', 'val_instances'])
+            writer.writerows(rows)
+        print(f"   报告已保存: {report_path}")
+    return rows
+
+
+def analyze_dataset(scan=None):
+    """分析当前数据集状态（scan 为 scan_dataset 的结果，未提供时重新扫描）"""
     print("\n" + "=" * 60)
     print("步骤 1: 数据集分析")
     print("=" * 60)
     
+    if scan is None:
+        scan = scan_dataset()
+    
     stats = {
         'train_images': 0,
         'train_labels': 0,
@@ -133,35 +470,17 @@ def analyze_dataset():
         'all_classes': set(),
     }
     
-    # 统计训练集
-    if SRC_IMAGES_TRAIN.exists():
-        stats['train_images'] = len(list(SRC_IMAGES_TRAIN.glob('*.*')))
-    if SRC_LABELS_TRAIN.exists():
-        for label_file in SRC_LABELS_TRAIN.glob('*.txt'):
-            stats['train_labels'] += 1
-            if find_matching_image(label_file, SRC_IMAGES_TRAIN):
-                stats['train_matched'] += 1
-                # 统计类别
-                with open(label_file, 'r', encoding='utf-8') as f:
-                    for line in f:
-                        parts = line.strip().split()
-                        if parts:
-                            class_id = int(parts[0])
-                            stats['class_counts'][class_id] += 1
-                            stats['all_classes'].add(class_id)
-            else:
-                stats['train_orphan_labels'].append(label_file.name)
-    
-    # 统计验证集
-    if SRC_IMAGES_VAL.exists():
-        stats['val_images'] = len(list(SRC_IMAGES_VAL.glob('*.*')))
-    if SRC_LABELS_VAL.exists():
-        for label_file in SRC_LABELS_VAL.glob('*.txt'):
-            stats['val_labels'] += 1
-            if find_matching_image(label_file, SRC_IMAGES_VAL):
-                stats['val_matched'] += 1
-            else:
-                stats['val_orphan_labels'].append(label_file.name)
+    for split in ('train', 'val'):
+        split_scan = scan[split]
+        stats[f'{split}_images'] = split_scan['images']
+        stats[f'{split}_labels'] = split_scan['labels']
+        stats[f'{split}_matched'] = len(split_scan['pairs'])
+        stats[f'{split}_orphan_labels'] = split_scan['orphan_labels']
+        # 统计类别（训练集与验证集合计，重新划分时两者合并）
+        for pair in split_scan['pairs']:
+            for class_id, count in pair.classes.items():
+                stats['class_counts'][class_id] += count
+                stats['all_classes'].add(class_id)
     
     # 输出分析结果
     print(f"\n📊 训练集:")
@@ -178,7 +497,8 @@ def analyze_dataset():
     
     print(f"\n📊 类别统计:")
     print(f"   实际使用类别数: {len(stats['all_classes'])}")
-    print(f"   类别ID范围: {min(stats['all_classes'])} - {max(stats['all_classes'])}")
+    if stats['all_classes']:
+        print(f"   类别ID范围: {min(stats['all_classes'])} - {max(stats['all_classes'])}")
     
     print(f"\n📊 类别分布 (前10):")
     sorted_classes = sorted(stats['class_counts'].items(), key=lambda x: x[1], reverse=True)[:10]
@@ -219,43 +539,153 @@ def clean_orphan_labels(stats, dry_run=True):
     return total_removed
 
 
-def redistribute_dataset(dry_run=True):
-    """重新划分训练集和验证集"""
+# Linux FICLONE ioctl（btrfs/XFS/bcachefs 等支持写时复制的文件系统）
+_FICLONE = 0x40049409
+
+# 表示文件系统或平台不支持某种生成方式的错误码，出现后本次运行不再尝试该方式
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EINVAL, errno.ENOTTY,
+                       getattr(errno, 'EOPNOTSUPP', errno.EINVAL), getattr(errno, 'ENOTSUP', errno.EINVAL),
+                       getattr(errno, 'ENOSYS', errno.EINVAL), errno.EMLINK}
+
+
+class Materializer:
+    """
+    将源文件放入输出目录：优先 reflink（写时复制），其次硬链接、符号链接，最后复制
+    目标已存在且大小、修改时间与源文件一致时跳过，重复运行只处理新增或变化的文件
+    """
+    MODES = ('reflink', 'hardlink', 'symlink', 'copy')
+    
+    def __init__(self, mode='auto', workers=None):
+        if mode != 'auto' and mode not in self.MODES:
+            raise ValueError(f"不支持的生成方式: {mode}，可选: auto, {', '.join(self.MODES)}")
+        self.modes = list(self.MODES) if mode == 'auto' else [mode]
+        if sys.platform != 'linux' and 'reflink' in self.modes and mode == 'auto':
+            self.modes.remove('reflink')
+        self.workers = workers or COPY_WORKERS
+        self.counts = Counter()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _up_to_date(src, dst):
+        """目标（链接则为其指向的文件）与源文件大小、修改时间一致"""
+        try:
+            dst_stat = os.stat(dst)
+        except OSError:
+            return False
+        src_stat = os.stat(src)
+        return dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+    
+    @staticmethod
+    def _reflink(src, dst):
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+    
+    @staticmethod
+    def _hardlink(src, dst):
+        os.link(src, dst)
+    
+    @staticmethod
+    def _symlink(src, dst):
+        os.symlink(os.path.abspath(src), dst)
+    
+    @staticmethod
+    def _copy(src, dst):
+        shutil.copy2(src, dst)
+    
+    def materialize(self, src, dst):
+        """生成单个文件，返回使用的方式或 'skipped'"""
+        if self._up_to_date(src, dst):
+            method = 'skipped'
+        else:
+            # 先删除旧文件：目标若是硬链接，直接覆盖写入会改动源文件
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            method = self._create(src, dst)
+        with self._lock:
+            self.counts[method] += 1
+        return method
+    
+    def _create(self, src, dst):
+        for method in list(self.modes):
+            try:
+                getattr(self, '_' + method)(src, dst)
+                return method
+            except OSError as e:
+                if method == 'copy' or e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                if os.path.lexists(dst):
+                    os.unlink(dst)
+                with self._lock:
+                    if method in self.modes and len(self.modes) > 1:
+                        self.modes.remove(method)
+                        print(f"   {method} 不可用（{e.strerror}），改用 {self.modes[0]}")
+        raise OSError(f"无法生成文件: {dst}")
+    
+    def run(self, jobs):
+        """并行生成 [(源文件, 目标文件), ...]，目标文件不能重复"""
+        seen = Counter(dst for _, dst in jobs)
+        duplicates = [str(dst) for dst, count in seen.items() if count > 1]
+        if duplicates:
+            raise ValueError(f"多个源文件对应同一目标文件: {', '.join(duplicates[:5])}")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for _ in executor.map(lambda job: self.materialize(*job), jobs):
+                pass
+    
+    @staticmethod
+    def remove_stale(directory, keep_names):
+        """删除输出目录中不再属于该划分的文件（样本被划到另一个集合时）"""
+        removed = 0
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name not in keep_names and (entry.is_file() or entry.is_symlink()):
+                    os.unlink(entry.path)
+                    removed += 1
+        return removed
+
+
+def output_stems(pairs):
+    """
+    输出文件名主干：同一划分中来自不同来源集合的同名样本加上来源前缀（如 val_xxx），
+    避免图片或标签互相覆盖；其余样本保持原名
+    """
+    counts = Counter(pair.image.stem for pair in pairs)
+    return [f'{pair.source}_{pair.image.stem}' if counts[pair.image.stem] > 1 else pair.image.stem
+            for pair in pairs]
+
+
+def redistribute_dataset(dry_run=True, scan=None, manifest=None):
+    """
+    重新划分训练集和验证集
+    :param scan: scan_dataset 的结果，未提供时重新扫描
+    :param manifest: DatasetManifest，其中已有的样本保持原划分；实际执行时写回本次结果
+    """
     print("\n" + "=" * 60)
     print("步骤 3: 重新划分数据集" + (" [模拟运行]" if dry_run else ""))
     print("=" * 60)
     
-    # 收集所有有效的图片-标签对
-    valid_pairs = []
-    
-    # 从训练集收集
-    if SRC_LABELS_TRAIN.exists():
-        for label_file in SRC_LABELS_TRAIN.glob('*.txt'):
-            img_file = find_matching_image(label_file, SRC_IMAGES_TRAIN)
-            if img_file:
-                valid_pairs.append((img_file, label_file, 'train'))
+    if scan is None:
+        scan = scan_dataset()
     
-    # 从验证集收集
-    if SRC_LABELS_VAL.exists():
-        for label_file in SRC_LABELS_VAL.glob('*.txt'):
-            img_file = find_matching_image(label_file, SRC_IMAGES_VAL)
-            if img_file:
-                valid_pairs.append((img_file, label_file, 'val'))
+    # 收集所有有效的图片-标签对（已在扫描时匹配）
+    valid_pairs = scan['train']['pairs'] + scan['val']['pairs']
     
     print(f"\n有效图片-标签对总数: {len(valid_pairs)}")
     
-    # 随机打乱并划分
-    random.seed(RANDOM_SEED)
-    random.shuffle(valid_pairs)
+    # 清单中已有样本保持原划分，新样本按类别分层，重复运行结果一致
+    splits = assign_splits(valid_pairs, manifest)
+    train_pairs = [pair for pair, split in zip(valid_pairs, splits) if split == 'train']
+    val_pairs = [pair for pair, split in zip(valid_pairs, splits) if split == 'val']
+    train_count, val_count = len(train_pairs), len(val_pairs)
+    total = max(len(valid_pairs), 1)
     
-    val_count = int(len(valid_pairs) * VAL_RATIO)
-    train_count = len(valid_pairs) - val_count
-    
-    train_pairs = valid_pairs[:train_count]
-    val_pairs = valid_pairs[train_count:]
-    
-    print(f"新训练集: {len(train_pairs)} ({(1-VAL_RATIO)*100:.0f}%)")
-    print(f"新验证集: {len(val_pairs)} ({VAL_RATIO*100:.0f}%)")
+    if manifest is not None:
+        kept = sum(1 for pair in valid_pairs if manifest.split_of(pair.image) is not None)
+        print(f"沿用清单划分: {kept}，新样本: {len(valid_pairs) - kept}")
+    print(f"新训练集: {train_count} ({train_count / total * 100:.0f}%)")
+    print(f"新验证集: {val_count} ({val_count / total * 100:.0f}%)")
+    split_report(valid_pairs, splits, None if dry_run else OUTPUT_DIR / SPLIT_REPORT_NAME)
     
     if not dry_run:
         # 创建输出目录
@@ -267,17 +697,32 @@ def redistribute_dataset(dry_run=True):
         for d in [out_train_images, out_train_labels, out_val_images, out_val_labels]:
             d.mkdir(parents=True, exist_ok=True)
         
-        # 复制训练集
-        print("\n复制训练集...")
-        for img, lbl, _ in train_pairs:
-            shutil.copy2(img, out_train_images / img.name)
-            shutil.copy2(lbl, out_train_labels / lbl.name)
+        jobs = []
+        stale = renamed = 0
+        for pairs, out_images, out_labels in ((train_pairs, out_train_images, out_train_labels),
+                                              (val_pairs, out_val_images, out_val_labels)):
+            stems = output_stems(pairs)
+            image_names = [stem + pair.image.suffix for pair, stem in zip(pairs, stems)]
+            label_names = [stem + pair.label.suffix for pair, stem in zip(pairs, stems)]
+            renamed += sum(1 for pair, stem in zip(pairs, stems) if stem != pair.image.stem)
+            stale += Materializer.remove_stale(out_images, set(image_names))
+            stale += Materializer.remove_stale(out_labels, set(label_names))
+            for pair, image_name, label_name in zip(pairs, image_names, label_names):
+                jobs.append((pair.image, out_images / image_name))
+                jobs.append((pair.label, out_labels / label_name))
+        if renamed:
+            print(f"   ⚠️ {renamed} 个样本在训练集和验证集来源中同名，输出时已加来源前缀")
         
-        # 复制验证集
-        print("复制验证集...")
-        for img, lbl, _ in val_pairs:
-            shutil.copy2(img, out_val_images / img.name)
-            shutil.copy2(lbl, out_val_labels / lbl.name)
+        # 生成训练集与验证集
+        materializer = Materializer(LINK_MODE)
+        print(f"\n生成数据集文件（{LINK_MODE}）...")
+        materializer.run(jobs)
+        summary = ', '.join(f'{method} {count}' for method, count in sorted(materializer.counts.items()))
+        print(f"   {summary}；移除已不属于该划分的文件 {stale} 个")
+        
+        if manifest is not None:
+            manifest.save(valid_pairs, splits)
+            print(f"   清单已更新: {manifest.path}")
         
         print(f"\n✅ 数据已输出到: {OUTPUT_DIR}")
     
@@ -374,15 +819,25 @@ classification_guide = {repr(classification_guide)}
 
 
 def main():
+    global OUTPUT_DIR, VAL_RATIO, PARSE_WORKERS, LINK_MODE, SPLIT_METHOD
+    
     parser = argparse.ArgumentParser(description='数据集预处理工具')
     parser.add_argument('--execute', action='store_true', help='执行实际操作（默认为模拟运行）')
     parser.add_argument('--output', type=str, default='datasets/processed', help='输出目录')
     parser.add_argument('--val-ratio', type=float, default=0.2, help='验证集比例')
+    parser.add_argument('--workers', type=int, default=None, help='标签解析进程数（默认CPU核数）')
+    parser.add_argument('--split-method', type=str, default=SPLIT_METHOD, choices=('stratified', 'hash'),
+                        help='新样本划分方式：stratified 按类别分层，hash 按内容哈希')
+    parser.add_argument('--link-mode', type=str, default=LINK_MODE,
+                        choices=('auto',) + Materializer.MODES,
+                        help='输出文件生成方式，auto 依次尝试 reflink/hardlink/symlink/copy')
     args = parser.parse_args()
     
-    global OUTPUT_DIR, VAL_RATIO
     OUTPUT_DIR = Path(args.output)
     VAL_RATIO = args.val_ratio
+    PARSE_WORKERS = args.workers
+    LINK_MODE = args.link_mode
+    SPLIT_METHOD = args.split_method
     
     dry_run = not args.execute
     
@@ -392,16 +847,20 @@ def main():
     print(f"模式: {'实际执行' if args.execute else '模拟运行 (添加 --execute 执行实际操作)'}")
     print(f"输出目录: {OUTPUT_DIR}")
     print(f"验证集比例: {VAL_RATIO*100:.0f}%")
+    print(f"文件生成方式: {LINK_MODE}")
     
-    # 1. 分析数据集
-    stats = analyze_dataset()
+    # 1. 扫描并分析数据集（清单中未变化的样本不重新处理，后续步骤复用扫描结果）
+    manifest = DatasetManifest(OUTPUT_DIR / MANIFEST_NAME)
+    scan = scan_dataset(manifest=manifest)
+    print(f"\n清单: {manifest.path}（复用 {scan['reused']}，新处理 {scan['processed']}）")
+    stats = analyze_dataset(scan)
     
     # 2. 清理孤立标签
     if stats['train_orphan_labels'] or stats['val_orphan_labels']:
         clean_orphan_labels(stats, dry_run=dry_run)
     
     # 3. 重新划分数据集
-    train_count, val_count = redistribute_dataset(dry_run=dry_run)
+    train_count, val_count = redistribute_dataset(dry_run=dry_run, scan=scan, manifest=manifest)
     
     # 4. 生成配置文件
     if not dry_run: